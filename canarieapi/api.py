@@ -19,32 +19,47 @@ the CANARIE API specification.
 # -- Standard lib ------------------------------------------------------------
 import collections
 import datetime
+import json
 import os
 import sqlite3
-from typing import Dict, Optional
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 from typing_extensions import TypedDict
 
 # -- 3rd party ---------------------------------------------------------------
 from dateutil.parser import parse as dt_parse
-from flask import jsonify, redirect, render_template, request
+from flask import Response, g, jsonify, make_response, redirect, render_template, request, stream_with_context, url_for
 from flask.typing import ResponseReturnValue
-from werkzeug.exceptions import HTTPException
+from werkzeug.exceptions import BadRequest, HTTPException, NotFound
 
 # -- Project specific --------------------------------------------------------
 from canarieapi import __meta__
 from canarieapi.app_object import APP
-from canarieapi.schema import CONFIGURATION_SCHEMA, validate_config_schema
+from canarieapi.config_reload import ConfigWatcher
+from canarieapi.jobs import ACTIVE_JOB_STATUS, SelfTestJob, get_self_test_job, start_self_test_job
+from canarieapi.metrics import METRICS_MIMETYPE, REQUEST_METRICS, generate_metrics
+from canarieapi.monitoring import LatencyInfo, make_latency_info
+from canarieapi.precompiled import get_precompiled_responses, load_precompiled_responses
+from canarieapi.reverse_proxied import time_phase
+from canarieapi.schema import CONFIGURATION_SCHEMA, check_config_schema, start_self_test
+from canarieapi.snapshot import RouteRecords, get_status_snapshot
 from canarieapi.status import Status
+from canarieapi.status_events import STATUS_FEED, STREAM_ENVIRON_KEY, StatusEvent, StatusEventStream
+from canarieapi.storage import StorageError, get_storage
 from canarieapi.utility_rest import (
+    JSON,
     AnyIntConverter,
     APIType,
     get_api_title,
     get_canarie_api_response,
-    get_config,
     get_db,
+    get_not_modified_response,
     make_error_response,
+    make_etag,
+    parse_last_modified,
     request_wants_json,
     retry_db_error_after_init,
+    set_cache_headers,
     set_html_as_default_response,
     validate_route
 )
@@ -56,10 +71,16 @@ from canarieapi.utility_rest import (
 #   request that could fail much later after the application started.
 #   When importing 'canarieapi.api', if the (default/overridden) configuration and
 #   parameters are not valid, this could cause failure to import the module itself.
+#   Responses that only depend on the configuration are precompiled at the same time.
+#   Probing monitored components and parsing the access logs can take much longer,
+#   and are therefore run in background with a time budget to avoid blocking workers.
 if str(os.getenv("CANARIE_API_SKIP_CHECK")).lower() != "true":  # pragma: no cover
-    validate_config_schema(update_db=False)
+    check_config_schema()
     with APP.app_context():
         get_db()
+    with APP.test_request_context():
+        load_precompiled_responses().render_html()
+    start_self_test()
 
 CronAccessStats = TypedDict("CronAccessStats", {
     "invocations": int,  # count | Not monitored
@@ -77,8 +98,14 @@ MonitorStatus = TypedDict("MonitorStatus", {
     "message": str,
 }, total=True)
 MonitorInfo = Dict[str, MonitorStatus]
+MonitorLatency = Dict[str, LatencyInfo]
+RouteReference = Tuple[str, APIType]
 
 START_UTC_TIME = datetime.datetime.utcnow().replace(microsecond=0)
+START_UTC_TIME_AWARE = START_UTC_TIME.replace(tzinfo=datetime.timezone.utc)
+
+CONFIG_WATCHER = ConfigWatcher(APP, os.getenv("CANARIE_API_CONFIG_FN"))
+CONFIG_WATCHER.install_signal_handler()
 
 # REST requests required by CANARIE
 CANARIE_API_TYPE = ["service", "platform"]
@@ -87,6 +114,10 @@ for _api_type in CANARIE_API_TYPE:
     _required = CONFIGURATION_SCHEMA["definitions"][f"{_api_type}_redirect_schema"]["required"]
     CANARIE_API_VALID_REQUESTS |= set(_required)
 
+# Pagination of the aggregated status of all services and platforms
+BULK_STATUS_DEFAULT_LIMIT = 100
+BULK_STATUS_MAX_LIMIT = 1000
+
 # HTML errors for which the application provides a custom error page
 HANDLED_HTML_ERRORS = [400, 404, 405, 500, 503]
 HANDLED_HTML_ERRORS_STR = ", ".join(map(str, HANDLED_HTML_ERRORS))
@@ -134,50 +165,123 @@ def handle_exceptions(exception_instance: Exception) -> ResponseReturnValue:
     return make_error_response(http_status=code, http_status_response=message)
 
 
+@APP.errorhandler(StorageError)
+def handle_storage_error(exception_instance: StorageError) -> ResponseReturnValue:
+    """
+    Generate the error response of an unavailable storage backend, until it can be reached again.
+
+    :param exception_instance: Exception instance.
+    """
+    APP.logger.warning("Storage backend unavailable: %s", exception_instance)
+    body, code = make_error_response(http_status=503)
+    response = make_response(body, code)
+    response.headers["Retry-After"] = "30"
+    return response
+
+
 # -- Flask routes ------------------------------------------------------------
 APP.url_map.converters["any_int"] = AnyIntConverter
 
 
+@APP.before_request
+def start_request_timer() -> None:
+    g.request_start = time.perf_counter()
+
+
+@APP.before_request
+def check_config_reload() -> None:
+    CONFIG_WATCHER.check()
+
+
+def get_config_last_modified() -> datetime.datetime:
+    """
+    Obtain the time since when the active configuration is employed.
+    """
+    return max(START_UTC_TIME_AWARE, CONFIG_WATCHER.last_modified or START_UTC_TIME_AWARE)
+
+
+@APP.after_request
+def record_request_metrics(response: Response) -> Response:
+    """
+    Record the request count and latency metrics of the route that handled the request.
+    """
+    start = g.pop("request_start", None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"  # avoid arbitrary paths as labels
+        REQUEST_METRICS.record(endpoint, request.method, response.status_code, time.perf_counter() - start)
+    return response
+
+
 @APP.route("/")
 def home() -> ResponseReturnValue:
-    def parse_config(name, api_type, conf):
-        # type: (str, str, dict) -> dict
-        hostname = APP.config["MY_SERVER_NAME"]
-        requests = sorted(["info", "stats", "status"] + list(conf.get("redirect", {}).keys()))
-        _content = [
-            (
-                req,
-                f"{hostname}/{name}/{api_type}/{req}"
-            )
-            for req in requests
-        ]
-        return collections.OrderedDict(_content)
-
-    config = APP.config
-    main_title = APP.config.get("SERVER_MAIN_TITLE", __meta__.__title__)
-    content = {
-        "Platforms": {
-            p["info"]["name"]: parse_config(name, "platform", p)
-            for name, p in config["PLATFORMS"].items()
-        },
-        "Services": {
-            s["info"]["name"]: parse_config(name, "service", s)
-            for name, s in config["SERVICES"].items()
-        }
+    return get_precompiled_responses().home.make_response(get_config_last_modified())
+
+
+def format_timestamp(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat()
+
+
+def get_self_test_job_info(job: SelfTestJob) -> JSON:
+    """
+    Obtain the public representation of a self-test job.
+    """
+    return {
+        "jobID": job["id"],
+        "status": job["status"],
+        "created": format_timestamp(job["created"]),
+        "started": format_timestamp(job["started"]),
+        "finished": format_timestamp(job["finished"]),
+        "progress": {"completed": job["completed"], "total": job["total"]},
+        "result": job["result"],
+        "error": job["error"],
+        "location": url_for("self_test_job_status", job_id=job["id"]),
     }
-    if request_wants_json():
-        return jsonify(content)
-    return render_template("home.html", Main_Title=main_title, Title="Home", Content=content)
 
 
 @APP.route("/test")
 def manual_test() -> ResponseReturnValue:
-    validate_config_schema(update_db=True)
-    base = APP.config["MY_SERVER_NAME"]
-    qs = request.query_string.decode()
-    qs = f"?{qs}" if qs else ""
-    url = f"{base}{qs}"
-    return redirect(url)
+    """
+    Request a self-test of the configuration, monitored components and access logs.
+
+    The self-test runs in background. The response refers to the job that handles the request, which could be an
+    ongoing or recent job instead of a new one (see ``SELF_TEST_JOBS`` configuration), and its status is reported
+    by the ``/test/<job_id>`` route.
+    """
+    job, _ = start_self_test_job(database=get_db())
+    info = get_self_test_job_info(job)
+    if not request_wants_json():
+        return redirect(info["location"], code=303)
+    response = jsonify(info)
+    response.status_code = 202 if job["status"] in ACTIVE_JOB_STATUS else 200
+    response.headers["Location"] = info["location"]
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@APP.route("/test/<job_id>")
+def self_test_job_status(job_id: str) -> ResponseReturnValue:
+    """
+    Report the status, progress and result of a self-test job.
+    """
+    job = get_self_test_job(job_id, database=get_db())
+    if job is None:
+        raise NotFound(f"Unknown self-test job: [{job_id}]")
+    info = get_self_test_job_info(job)
+    if request_wants_json():
+        response = jsonify(info)
+    else:
+        content = collections.OrderedDict(
+            (key, value) for key, value in info.items() if key not in ["result", "location"]
+        )
+        content["progress"] = f"{job['completed']} / {job['total']}"
+        content.update(info["result"] or {})
+        main_title = APP.config.get("SERVER_MAIN_TITLE", __meta__.__title__)
+        response = make_response(render_template("default.html", Main_Title=main_title, Title="Self-Test",
+                                                 Tags=content))
+    response.headers["Cache-Control"] = "no-store"
+    return response
 
 
 @APP.route("/<any_int(" + HANDLED_HTML_ERRORS_STR + "):status_code_str>")
@@ -204,87 +308,93 @@ def information(route_name: str, api_type: APIType) -> ResponseReturnValue:
     # JSON is used by default but the Canarie API requires html as default
     set_html_as_default_response()
 
-    validate_route(route_name, api_type)
+    precompiled = get_precompiled_responses().info.get((api_type, route_name))
+    if precompiled is None:
+        validate_route(route_name, api_type)  # raise the appropriate error for the unknown route
+        raise NotFound(f"The request has been made for a {api_type} that is not supported: [{route_name}]")
+    return precompiled.make_response(get_config_last_modified())
 
-    info_schema = f"{api_type}_info_schema"
-    info_categories = CONFIGURATION_SCHEMA["definitions"][info_schema]["required"]
 
-    config = get_config(route_name, api_type).get("info", {})
-    info = []
-    for category in info_categories:
-        cat = config.get(category, "")
-        info.append((category, cat))
+@retry_db_error_after_init
+def query_route_records(route_name: str, *, database: Optional[sqlite3.Connection] = None) -> RouteRecords:
+    """
+    Query the monitoring statuses, latency and access statistics of a service or platform, and the cron jobs times.
+    """
+    storage = get_storage(database or get_db())
+    status_records = [(service, status, message) for _, service, status, message in storage.get_statuses([route_name])]
+    services = {service for service, _, _ in status_records}
+    latency_records = [tuple(record[1:]) for record in storage.get_latency([route_name]) if record[1] in services]
+    stats_records = storage.get_stats([route_name])
+    stats_record = tuple(stats_records[0][1:]) if stats_records else None
+    cron_records = [(job, last_execution) for job, last_execution, _ in storage.get_cron()]
+    return {"status": status_records, "latency": latency_records, "stats": stats_record, "cron": cron_records}
 
-    info = collections.OrderedDict(info)
 
-    if request_wants_json():
-        return jsonify(info)
-    info["tags"] = ", ".join(info["tags"])
-    return render_template("default.html", Main_Title=get_api_title(route_name, api_type), Title="Info", Tags=info)
+def collect_route_records(route_name: str) -> RouteRecords:
+    """
+    Obtain the records of a service or platform from the snapshot published by the cron jobs, or from the database
+    until it is published (or if disabled by ``SNAPSHOT["enabled"]``).
+    """
+    with time_phase("snapshot"):
+        snapshot = get_status_snapshot()
+        if snapshot is not None:
+            return snapshot.get_route_records(route_name)
+    return query_route_records(route_name, database=get_db())
 
 
-@retry_db_error_after_init
-def collect_monitoring_statuses(route_name: str, *, database: Optional[sqlite3.Connection] = None) -> MonitorInfo:
+def make_monitoring_statuses(records: RouteRecords) -> MonitorInfo:
     """
-    Obtain all monitoring statuses for the requested service or platform.
+    Obtain all monitoring statuses of the service or platform from its records.
     """
-    db = database or get_db()
-    cur = db.cursor()
+    return {service: {"status": status, "message": message} for service, status, message in records["status"]}
 
-    # Gather service(s) status
-    all_status = {}
-    query = "select service, status, message from status where route = ?"
-    try:
-        cur.execute(query, [route_name])
-        records = cur.fetchall()
 
-        for record in records:
-            all_status[record[0]] = {"status": record[1], "message": record[2]}
-    except Exception as exc:  # pragma: no cover
-        APP.logger.error(str(exc))
-    cur.close()
+def make_latency_row_info(row: Tuple[Any, ...]) -> LatencyInfo:
+    """
+    Report the latency of a component from its ``status_latency`` record (total, connect, tls, ttfb, bytes, samples).
+    """
+    total, connect, tls, ttfb, size, samples = row
+    timing = {"total": total, "connect": connect, "tls": tls, "ttfb": ttfb, "bytes": size}
+    return make_latency_info(timing, json.loads(samples or "[]"))  # type: ignore
+
 
-    return all_status
+def make_monitoring_latency(records: RouteRecords) -> MonitorLatency:
+    """
+    Obtain the latency of monitored components of the service or platform from its records.
+    """
+    return collections.OrderedDict((row[0], make_latency_row_info(row[1:])) for row in records["latency"])
 
 
-@retry_db_error_after_init
-def collect_cron_access_stats(route_name: str, *, database: Optional[sqlite3.Connection] = None) -> CronAccessStats:
+def format_latency(latency: MonitorLatency) -> Union[MonitorLatency, Dict[str, str]]:
+    """
+    Format the latency of components according to the requested content type.
+    """
+    if request_wants_json():
+        return latency
+    return collections.OrderedDict(
+        (service, f"{info['total']}ms (p50: {info['p50']}ms, p95: {info['p95']}ms, p99: {info['p99']}ms)")
+        for service, info in latency.items()
+    )
+
+
+def make_cron_access_stats(records: RouteRecords) -> CronAccessStats:
     """
-    Obtain access statuses of a service or platform from cron monitoring and logging jobs.
+    Obtain access statuses of a service or platform from cron monitoring and logging jobs records.
     """
     invocations = 0
     last_access = "Never"
-
-    query = "select invocations, last_access from stats where route = ?"
-    db = database or get_db()
-    cur = db.cursor()
-    try:
-        cur.execute(query, [route_name])
-        record = cur.fetchone()
-        if record:
-            invocations = record[0]
-            last_access = dt_parse(record[1]).replace(tzinfo=None).isoformat() + "Z"
-    except Exception as exc:  # pragma: no cover
-        APP.logger.error(str(exc))
+    if records["stats"]:
+        invocations = records["stats"][0]
+        last_access = dt_parse(records["stats"][1]).replace(tzinfo=None).isoformat() + "Z"
 
     # Check last time cron job have run (help to diagnose cron problem)
     last_log_update = "Never"
     last_status_update = "Never"
-    query = "select job, last_execution from cron"
-    try:
-        cur.execute(query)
-        records = cur.fetchall()
-        if records:
-            for record in records:
-                if record[0] == "log":
-                    last_log_update = dt_parse(record[1]).isoformat() + "Z"
-                elif record[0] == "status":
-                    last_status_update = dt_parse(record[1]).isoformat() + "Z"
-
-    except Exception as exc:  # pragma: no cover
-        APP.logger.error(str(exc))
-
-    cur.close()
+    for job, last_execution in records["cron"]:
+        if job == "log":
+            last_log_update = dt_parse(last_execution).isoformat() + "Z"
+        elif job == "status":
+            last_status_update = dt_parse(last_execution).isoformat() + "Z"
 
     info: CronAccessStats = {
         "invocations": invocations,
@@ -295,26 +405,23 @@ def collect_cron_access_stats(route_name: str, *, database: Optional[sqlite3.Con
     return info
 
 
-@retry_db_error_after_init
-def collect_cron_last_status(*, database: Optional[sqlite3.Connection] = None) -> CronLastStatus:
+def make_cron_last_status(cron_records: List[Tuple[str, str]]) -> CronLastStatus:
     """
-    Obtain the last time cron job have run (help to diagnose cron problem).
+    Obtain the last time the monitoring cron job has run from its records (help to diagnose cron problem).
     """
     last_status_update = "Never"
-    query = "select last_execution from cron where job == 'status'"
-    db = database or get_db()
-    cur = db.cursor()
-    try:
-        cur.execute(query)
-        record = cur.fetchone()
-        if record:
-            last_status_update = dt_parse(record[0]).isoformat() + "Z"
-    except Exception as exc:  # pragma: no cover
-        APP.logger.error(str(exc))
+    for job, last_execution in cron_records:
+        if job == "status":
+            last_status_update = dt_parse(last_execution).isoformat() + "Z"
+    return {"last_status_update": last_status_update}
 
-    cur.close()
 
-    return {"last_status_update": last_status_update}
+@retry_db_error_after_init
+def collect_cron_last_status(*, database: Optional[sqlite3.Connection] = None) -> CronLastStatus:
+    """
+    Obtain the last time cron job have run (help to diagnose cron problem).
+    """
+    return make_cron_last_status([(job, last_execution) for job, last_execution, _ in get_storage(database).get_cron()])
 
 
 @APP.route("/<route_name>/<any(" + ",".join(CANARIE_API_TYPE) + "):api_type>/stats")
@@ -327,7 +434,7 @@ def stats(route_name: str, api_type: APIType) -> ResponseReturnValue:
 
     validate_route(route_name, api_type)
 
-    db = get_db()
+    records = collect_route_records(route_name)
 
     service_stats = [
         (api_type, route_name),
@@ -335,7 +442,7 @@ def stats(route_name: str, api_type: APIType) -> ResponseReturnValue:
     ]
 
     # Gather service(s) status
-    all_status = collect_monitoring_statuses(route_name, database=db)
+    all_status = make_monitoring_statuses(records)
 
     # Status can be 'ok', 'bad' or 'down'
     if not all(svc_info["status"] == Status.ok for service, svc_info in all_status.items()):
@@ -363,9 +470,22 @@ def stats(route_name: str, api_type: APIType) -> ResponseReturnValue:
         return error_html, 503
 
     monitor_info = []
-    cron_info = collect_cron_access_stats(route_name, database=db)
+    cron_info = make_cron_access_stats(records)
+
+    # data only changes when cron jobs update it, or when the application is restarted (lastReset)
+    parse_logs = APP.config.get("PARSE_LOGS", True)
+    latency = make_monitoring_latency(records)
+    etag = make_etag(get_api_title(route_name, api_type), parse_logs, START_UTC_TIME, all_status, cron_info, latency)
+    last_modified = parse_last_modified(
+        START_UTC_TIME_AWARE.isoformat(),
+        cron_info["last_log_update"],
+        cron_info["last_status_update"],
+    )
+    not_modified = get_not_modified_response(etag, last_modified, dynamic=True)
+    if not_modified:
+        return not_modified
 
-    if APP.config.get("PARSE_LOGS", True):
+    if parse_logs:
         service_stats.append(("invocations", cron_info["invocations"]))
         monitor_info.append(("lastInvocationsUpdate", cron_info["last_log_update"]))
         monitor_info.append(("lastAccess", cron_info["last_access"]))
@@ -377,18 +497,21 @@ def stats(route_name: str, api_type: APIType) -> ResponseReturnValue:
 
     monitor_info = collections.OrderedDict(monitor_info)
     service_stats.append(("monitoring", monitor_info))
+    if latency:
+        service_stats.append(("latency", format_latency(latency)))
 
     service_stats = collections.OrderedDict(service_stats)
 
     if request_wants_json():
-        return jsonify(service_stats)
-
-    return render_template(
-        "default.html",
-        Main_Title=get_api_title(route_name, api_type),
-        Title="Stats",
-        Tags=service_stats,
-    )
+        response = jsonify(service_stats)
+    else:
+        response = render_template(
+            "default.html",
+            Main_Title=get_api_title(route_name, api_type),
+            Title="Stats",
+            Tags=service_stats,
+        )
+    return set_cache_headers(response, etag, last_modified, dynamic=True)
 
 
 @APP.route("/<route_name>/<any(" + ",".join(CANARIE_API_TYPE) + "):api_type>/status")
@@ -401,13 +524,20 @@ def status(route_name: str, api_type: APIType) -> ResponseReturnValue:
 
     validate_route(route_name, api_type)
 
-    db = get_db()
+    records = collect_route_records(route_name)
 
     # Gather service(s) status
-    all_status = collect_monitoring_statuses(route_name, database=db)
+    all_status = make_monitoring_statuses(records)
 
     # Check last time cron job have run (help to diagnose cron problem)
-    cron_status = collect_cron_last_status(database=db)
+    cron_status = make_cron_last_status(records["cron"])
+
+    latency = make_monitoring_latency(records)
+    etag = make_etag(get_api_title(route_name, api_type), all_status, cron_status, latency)
+    last_modified = parse_last_modified(cron_status["last_status_update"])
+    not_modified = get_not_modified_response(etag, last_modified, dynamic=True)
+    if not_modified:
+        return not_modified
 
     monitor_info = [
         ("lastStatusUpdate", cron_status["last_status_update"])
@@ -419,18 +549,214 @@ def status(route_name: str, api_type: APIType) -> ResponseReturnValue:
             svc_msg = svc_info["message"]
             status_msg += f" : {svc_msg}"
         monitor_info.append((service, status_msg))
+    if latency:
+        monitor_info.append(("latency", format_latency(latency)))
 
     monitor_info = collections.OrderedDict(monitor_info)
 
     if request_wants_json():
-        return jsonify(monitor_info)
+        response = jsonify(monitor_info)
+    else:
+        response = render_template(
+            "default.html",
+            Main_Title=get_api_title(route_name, api_type),
+            Title="Status",
+            Tags=monitor_info,
+        )
+    return set_cache_headers(response, etag, last_modified, dynamic=True)
 
-    return render_template(
-        "default.html",
-        Main_Title=get_api_title(route_name, api_type),
-        Title="Status",
-        Tags=monitor_info,
-    )
+
+@retry_db_error_after_init
+def query_bulk_statuses(
+    route_names: List[str],
+    with_stats: bool = False,
+    *,
+    database: Optional[sqlite3.Connection] = None,
+) -> List[Tuple[Any, ...]]:
+    """
+    Query monitoring statuses, and optionally access statistics, of multiple services and platforms at once.
+
+    Records are returned ordered by route, with the statistics record (if any) following the monitoring statuses
+    and latency, such that they can be iterated and grouped by route.
+    """
+    storage = get_storage(database or get_db())
+    latency = {(record[0], record[1]): tuple(record[2:]) for record in storage.get_latency(route_names)}
+    records: List[Tuple[Any, ...]] = [
+        (route, 0, service, status, message, *latency.get((route, service), (None,) * 6))
+        for route, service, status, message in storage.get_statuses(route_names)
+    ]
+    if with_stats:
+        records.extend(
+            (route, 1, invocations, last_access, *(None,) * 7)
+            for route, invocations, last_access in storage.get_stats(route_names)
+        )
+    records.sort(key=lambda record: (record[0], record[1]))  # statuses are already ordered by service
+    return records
+
+
+def get_bulk_status_routes() -> List[RouteReference]:
+    """
+    Obtain the services and platforms selected by the request query parameters, ordered by route name.
+    """
+    api_types = request.args.getlist("type") or CANARIE_API_TYPE
+    unknown_types = set(api_types) - set(CANARIE_API_TYPE)
+    if unknown_types:
+        raise BadRequest(f"Unknown type(s): {sorted(unknown_types)}")
+    route_filter = set()
+    for route_names in request.args.getlist("route"):
+        route_filter.update(name.strip() for name in route_names.split(",") if name.strip())
+
+    selected_routes = []
+    for api_type in api_types:
+        for route_name in APP.config.get(f"{api_type.upper()}S", {}):
+            if not route_filter or route_name in route_filter:
+                selected_routes.append((route_name, api_type))
+    return sorted(selected_routes)
+
+
+def get_query_int(name: str, default: int, minimum: int, maximum: Optional[int] = None) -> int:
+    """
+    Obtain an integer query parameter within the allowed range.
+    """
+    value = request.args.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"Query parameter '{name}' must be an integer.")
+    if value < minimum or (maximum is not None and value > maximum):
+        upper = f" and {maximum}" if maximum is not None else ""
+        raise BadRequest(f"Query parameter '{name}' must be between {minimum}{upper}.")
+    return value
+
+
+@APP.route("/status")
+def bulk_status() -> ResponseReturnValue:
+    """
+    Extra route to obtain the status of all (or a filtered subset of) services and platforms at once.
+
+    Query parameters:
+
+    - ``type``: ``service`` or ``platform`` to filter by type (all by default).
+    - ``route``: comma-separated route names to filter (all by default). Can be repeated.
+    - ``stats``: ``true`` to include access statistics of each route.
+    - ``limit`` and ``offset``: pagination of the selected routes, ordered by name.
+
+    The JSON response is streamed route by route while iterating over the records of the selected routes.
+    """
+    limit = get_query_int("limit", BULK_STATUS_DEFAULT_LIMIT, 1, BULK_STATUS_MAX_LIMIT)
+    offset = get_query_int("offset", 0, 0)
+    with_stats = str(request.args.get("stats", "")).lower() == "true"
+    with_stats = with_stats and APP.config.get("PARSE_LOGS", True)
+
+    routes = get_bulk_status_routes()
+    total = len(routes)
+    routes = routes[offset:offset + limit]
+
+    def iter_route_statuses(records: Iterator[Tuple[Any, ...]]) -> Iterator[Tuple[RouteReference, JSON]]:
+        # a service and a platform with the same name share records, which are consumed once for both
+        record = next(records, None)
+        group_name = None
+        monitoring = route_stats = {}
+        for route_name, api_type in routes:
+            if route_name != group_name:
+                group_name = route_name
+                monitoring = collections.OrderedDict()
+                route_stats = {"invocations": 0, "lastAccess": "Never"}
+                while record is not None and record[0] == route_name:
+                    if record[1] == 0:
+                        monitoring[record[2]] = {"status": record[3], "message": record[4] or ""}
+                        if record[5] is not None:
+                            monitoring[record[2]]["latency"] = make_latency_row_info(record[5:])
+                    else:
+                        route_stats["invocations"] = record[2]
+                        route_stats["lastAccess"] = dt_parse(record[3]).replace(tzinfo=None).isoformat() + "Z"
+                    record = next(records, None)
+            info = {"route": route_name, "type": api_type, "monitoring": monitoring}
+            if with_stats:
+                info["stats"] = route_stats
+            yield (route_name, api_type), info
+
+    def query_records() -> Iterator[Tuple[Any, ...]]:
+        return iter(query_bulk_statuses([route_name for route_name, _ in routes], with_stats, database=get_db()))
+
+    if not request_wants_json():
+        content = collections.OrderedDict(
+            (
+                f"{api_type}/{route_name}",
+                collections.OrderedDict(
+                    (svc, Status.pretty_msg(svc_info["status"]))
+                    for svc, svc_info in info["monitoring"].items()
+                ),
+            )
+            for (route_name, api_type), info in iter_route_statuses(query_records())
+        )
+        main_title = APP.config.get("SERVER_MAIN_TITLE", __meta__.__title__)
+        return render_template("default.html", Main_Title=main_title, Title="Status", Tags=content)
+
+    def generate() -> Iterator[str]:
+        # the database connection must be obtained while streaming since the request context
+        # is torn down (closing its connection) once the response starts being sent
+        cron_status = collect_cron_last_status(database=get_db())
+        header = {
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "lastStatusUpdate": cron_status["last_status_update"],
+        }
+        yield json.dumps(header)[:-1] + ', "routes": ['
+        for index, (_, info) in enumerate(iter_route_statuses(query_records())):
+            yield ("," if index else "") + json.dumps(info)
+        yield "]}"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+@retry_db_error_after_init
+def query_statuses(route_names: List[str], *, database: Optional[sqlite3.Connection] = None) -> List[StatusEvent]:
+    """
+    Obtain the current status of components of the specified routes.
+    """
+    return [
+        {"route": route, "service": service, "status": status, "message": message}
+        for route, service, status, message in get_storage(database).get_statuses(route_names)
+    ]
+
+
+@APP.route("/status/events")
+def status_events() -> ResponseReturnValue:
+    """
+    Extra route streaming the status changes of monitored components as Server-Sent Events.
+
+    The current status of components is sent first as a ``snapshot`` event, followed by a ``status`` event for every
+    change detected afterwards. Services and platforms can be selected with the ``type`` and ``route`` query
+    parameters, as for the ``/status`` route.
+    """
+    settings = APP.config.get("STATUS_EVENTS", {})
+    if not settings.get("enabled", True):
+        raise NotFound("Status events are disabled.")
+    route_names = sorted({route_name for route_name, _ in get_bulk_status_routes()})
+    heartbeat = settings.get("heartbeat", 15)
+
+    snapshot = query_statuses(route_names, database=get_db())
+    try:
+        # changes committed from now on are obtained by comparing with this snapshot
+        subscription = STATUS_FEED.subscribe(route_names, snapshot=snapshot)
+    except OverflowError as exc:
+        APP.logger.warning(str(exc))
+        return make_error_response(http_status=503)
+
+    stream = StatusEventStream(STATUS_FEED, subscription, snapshot, heartbeat)
+    request.environ[STREAM_ENVIRON_KEY] = stream  # served without holding a thread in ASGI mode
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # avoid buffering by reverse proxies
+    return Response(stream, mimetype="text/event-stream", headers=headers)
+
+
+@APP.route("/metrics")
+def metrics() -> ResponseReturnValue:
+    """
+    Extra route providing application metrics in the Prometheus text exposition format.
+    """
+    return Response(generate_metrics(), content_type=METRICS_MIMETYPE)
 
 
 @APP.route("/<route_name>/<any(" + ",".join(CANARIE_API_TYPE) + "):api_type>/<any(" +
@@ -456,6 +782,7 @@ def close_connection(_: Exception) -> None:
     if db:
         APP.logger.info("Disconnecting from database.")
         db.close()
+        g.pop("_database", None)  # avoid reusing the closed connection if the context is pushed again (streaming)
 
 
 if __name__ == "__main__":
@@ -3,27 +3,37 @@ This module serves the purpose of centralizing the state object of Flask in a si
 """
 
 # -- Standard lib ------------------------------------------------------------
-import logging
-import sys
 from os import environ
+from typing import Any
 
 # -- 3rd party modules -------------------------------------------------------
-from flask import Flask
+from flask import Flask, Response, before_render_template, template_rendered
+from flask.json.provider import DefaultJSONProvider
 
 # -- Project specific --------------------------------------------------------
 from canarieapi import default_configuration
-from canarieapi.reverse_proxied import ReverseProxied
+from canarieapi.reverse_proxied import ReverseProxied, begin_phase, end_phase, time_phase
+from canarieapi.settings import register_application, setup_logger
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that reports the serialization of responses as a phase of the request timings.
+    """
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        with time_phase("serialize"):
+            return super().response(*args, **kwargs)
+
 
 APP = Flask(__name__)
-formatter = logging.Formatter("[%(asctime)s] [%(process)d] [%(levelname)s] %(name)s : %(message)s")
-ch = logging.StreamHandler(sys.stdout)
-ch.setFormatter(formatter)
-APP.logger.handlers.clear()  # backward compatibility to avoid duplicate log entries
-APP.logger.addHandler(ch)
-APP.logger.setLevel(logging.DEBUG)
+APP.json = TimedJSONProvider(APP)
+setup_logger(APP.logger)
 
-# Handle Reverse Proxy setups
-APP.wsgi_app = ReverseProxied(APP.wsgi_app)
+# Handle Reverse Proxy setups, with optional request timings instrumentation
+APP.wsgi_app = ReverseProxied(APP.wsgi_app, config=lambda: APP.config, logger=APP.logger)
+before_render_template.connect(lambda *_, **__: begin_phase("render"), APP, weak=False)
+template_rendered.connect(lambda *_, **__: end_phase("render"), APP, weak=False)
 
 # Config
 APP.config.from_object(default_configuration)
@@ -32,3 +42,6 @@ if "CANARIE_API_CONFIG_FN" in environ:
     APP.logger.info("Loading custom configuration from %s", environ["CANARIE_API_CONFIG_FN"])
 else:
     APP.logger.info("Using default configuration")
+
+# Cron jobs employ the application configuration and logger when they run within it
+register_application(APP)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# coding:utf-8
+"""
+ASGI serving mode.
+
+This module exposes the application as an ASGI ``application``, to be served by an ASGI server, for example::
+
+    uvicorn canarieapi.asgi:application --port 2000
+
+The routes are the same as in WSGI mode. Each request is handled in a thread of a pool (see ``ASGI`` configuration),
+such that database accesses and any other blocking operation are offloaded from the event loop, and streamed responses
+are forwarded chunk by chunk as they are produced. Probes of monitored components are never performed by requests, but
+by cron jobs and background self-test jobs.
+
+The ``/status/events`` route is the only one waiting for an unbounded duration. Its response is prepared in a thread
+like any other, but its events are then awaited in the event loop (see :class:`StatusEventStream`), such that clients
+do not hold threads of the pool for the lifetime of their connection, and their subscription is closed as soon as they
+disconnect. Their number is limited by ``STATUS_EVENTS["max_clients"]`` as in WSGI mode.
+
+Other streamed responses hold their thread until they complete. When their client disconnects, they are stopped on
+their next chunk, and the request completes once their thread is released.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import asyncio
+import contextlib
+import io
+import itertools
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, MutableMapping, Optional, Tuple
+
+# -- Project specific --------------------------------------------------------
+from canarieapi.api import APP
+from canarieapi.status_events import STREAM_ENVIRON_KEY, StatusEventStream
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+# headers combined with a separator other than ',' when repeated (RFC 6265, section 5.4)
+HEADER_SEPARATORS = {"HTTP_COOKIE": "; "}
+
+
+def make_environ(scope: Scope, body: bytes) -> Dict[str, Any]:
+    """
+    Convert an ASGI HTTP connection scope to a WSGI environment.
+    """
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "REMOTE_ADDR": str(client[0]),
+        "REMOTE_PORT": str(client[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").lower()
+        value = value.decode("latin-1")
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+        elif name == "content-length":
+            environ["CONTENT_LENGTH"] = value
+        else:
+            key = f"HTTP_{name.upper().replace('-', '_')}"
+            environ[key] = f"{environ[key]}{HEADER_SEPARATORS.get(key, ',')}{value}" if key in environ else value
+    return environ
+
+
+class WSGIToASGI(object):
+    """
+    Adapter serving a WSGI application as an ASGI application, calling it in a pool of threads.
+    """
+
+    def __init__(
+        self,
+        wsgi_app: Callable[..., Iterable[bytes]],
+        max_workers: Optional[int] = None,
+    ) -> None:
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="canarieapi-asgi")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.handle_request(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: [{scope['type']}]")
+
+    async def lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def handle_request(self, scope: Scope, receive: Receive, send: Send) -> None:
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+
+        environ = make_environ(scope, body)
+        loop = asyncio.get_running_loop()
+        messages: "asyncio.Queue[Optional[Message]]" = asyncio.Queue()
+        stopped = threading.Event()
+        response: Dict[str, Any] = {"written": []}
+
+        def put(message: Optional[Message]) -> None:
+            loop.call_soon_threadsafe(messages.put_nowait, message)
+
+        def start_response(status: str, headers: List[Tuple[str, str]], exc_info: Any = None) -> Callable:
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+            return response["written"].append
+
+        def run_app() -> Optional[Iterable[bytes]]:
+            # the response is produced entirely by the same thread, since database connections cannot be shared
+            result: Iterable[bytes] = []
+            try:
+                result = self.wsgi_app(environ, start_response)
+                put({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+                if isinstance(environ.get(STREAM_ENVIRON_KEY), StatusEventStream):
+                    # events are awaited in the event loop, which closes the response once they end
+                    pending, result = result, []
+                    return pending
+                if any(name == b"content-length" for name, _ in response["headers"]):
+                    # complete response, send it at once instead of chunk by chunk
+                    content = b"".join(response["written"] + list(result))
+                    put({"type": "http.response.body", "body": content, "more_body": False})
+                    return None
+                for chunk in itertools.chain(response["written"], result):
+                    if stopped.is_set():
+                        return None
+                    if chunk:
+                        put({"type": "http.response.body", "body": chunk, "more_body": True})
+                put({"type": "http.response.body", "body": b"", "more_body": False})
+                return None
+            finally:
+                try:
+                    if hasattr(result, "close"):
+                        result.close()
+                finally:
+                    put(None)
+
+        task = loop.run_in_executor(self.executor, run_app)
+        disconnected = asyncio.ensure_future(self.wait_disconnect(receive))
+        try:
+            while True:
+                message = asyncio.ensure_future(messages.get())
+                await asyncio.wait({message, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if not message.done():
+                    # client is gone, the thread stops producing the response on its next chunk
+                    message.cancel()
+                    stopped.set()
+                    break
+                if message.result() is None:
+                    break
+                await send(message.result())
+        except BaseException:
+            stopped.set()
+            raise
+        finally:
+            disconnected.cancel()
+            pending = await task  # only complete the request once the thread is released
+            if pending is not None and stopped.is_set() and hasattr(pending, "close"):
+                pending.close()
+        if pending is not None and not stopped.is_set():
+            await self.send_events(environ[STREAM_ENVIRON_KEY], pending, receive, send)
+
+    async def send_events(
+        self,
+        events: StatusEventStream,
+        response: Iterable[bytes],
+        receive: Receive,
+        send: Send,
+    ) -> None:
+        """
+        Send the status events of a ``/status/events`` response as they occur, until the client disconnects.
+        """
+        async def forward() -> None:
+            chunks = events.iter_async()
+            try:
+                async for chunk in chunks:
+                    await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+            finally:
+                await chunks.aclose()
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+        forwarding = asyncio.ensure_future(forward())
+        disconnected = asyncio.ensure_future(self.wait_disconnect(receive))
+        try:
+            await asyncio.wait({forwarding, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnected.cancel()
+            forwarding.cancel()  # closes the subscription if the client is gone, nothing if the events ended
+            with contextlib.suppress(asyncio.CancelledError):
+                await forwarding
+            if hasattr(response, "close"):
+                response.close()
+
+    @staticmethod
+    async def wait_disconnect(receive: Receive) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+
+
+application = WSGIToASGI(
+    APP,
+    max_workers=APP.config.get("ASGI", {}).get("max_workers"),
+)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# coding:utf-8
+"""
+Hot reload of the configuration.
+
+This module watches the configuration file referenced by the ``CANARIE_API_CONFIG_FN`` environment variable and
+applies its modifications to the running application, without restarting workers (see ``CONFIG_RELOAD``
+configuration). The modification time of the file is checked at most once per interval while handling requests,
+and a reload can also be requested with the ``SIGHUP`` signal.
+
+The new configuration is loaded from the default values and validated entirely before replacing the current one, such
+that requests keep being served meanwhile, an invalid configuration never replaces a valid one and values removed
+from the file do not remain. State derived from the configuration (precompiled responses, cached metrics) is
+regenerated once it is applied.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import datetime
+import os
+import signal
+import threading
+import time
+from typing import Any, Optional
+
+# -- 3rd party ---------------------------------------------------------------
+from flask import Config, Flask
+
+# -- Project specific --------------------------------------------------------
+from canarieapi.metrics import reset_metrics_snapshot
+from canarieapi.precompiled import load_precompiled_responses
+from canarieapi.schema import check_config_schema
+from canarieapi.settings import ROOT_PATH, load_config_file, load_default_config
+
+
+class ConfigWatcher(object):
+    """
+    Reloads the application configuration when its file is modified.
+    """
+
+    def __init__(self, app: Flask, filename: Optional[str]) -> None:
+        self.app = app
+        self.filename = os.path.join(ROOT_PATH, filename) if filename else None
+        self.lock = threading.Lock()
+        self.mtime = self.get_mtime()
+        self.next_check = 0.0
+        self.requested = False
+        self.last_modified: Optional[datetime.datetime] = None  # time of the last applied modification
+
+    def get_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.filename).st_mtime_ns if self.filename else None
+        except OSError:
+            return None
+
+    def request_reload(self, *_: Any) -> None:
+        """
+        Request the configuration to be reloaded on next check, regardless of the modification time of its file.
+        """
+        self.requested = True
+
+    def install_signal_handler(self) -> bool:
+        """
+        Request reloads of the configuration with the ``SIGHUP`` signal, if enabled by the configuration.
+
+        Signal handlers can only be installed from the main thread.
+        """
+        settings = self.app.config.get("CONFIG_RELOAD", {})
+        if not self.filename or not settings.get("signal", False) or not hasattr(signal, "SIGHUP"):
+            return False
+        if threading.current_thread() is not threading.main_thread():
+            self.app.logger.warning("Cannot install configuration reload signal handler outside the main thread.")
+            return False
+        signal.signal(signal.SIGHUP, self.request_reload)
+        return True
+
+    def check(self) -> bool:
+        """
+        Reload the configuration if its file was modified, or if a reload was requested.
+
+        Checks are performed at most once per interval. If another thread is already reloading the configuration,
+        the current one continues with the active configuration instead of waiting.
+
+        :returns: Whether a new configuration was applied.
+        """
+        settings = self.app.config.get("CONFIG_RELOAD", {})
+        if not self.filename or not settings.get("enabled", True):
+            return False
+        now = time.monotonic()
+        if not self.requested and now < self.next_check:
+            return False
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            self.next_check = now + settings.get("interval", 5)
+            mtime = self.get_mtime()
+            if mtime is None or (mtime == self.mtime and not self.requested):
+                return False
+            self.requested = False
+            self.mtime = mtime
+            return self.reload()
+        finally:
+            self.lock.release()
+
+    def load(self) -> Config:
+        """
+        Load and validate the configuration from the default values updated by the file.
+
+        :raises Exception: If the file cannot be loaded or the configuration is invalid.
+        """
+        config = self.app.make_config()
+        load_default_config(config)
+        load_config_file(config, self.filename)
+        check_config_schema(config)
+        return config
+
+    def reload(self) -> bool:
+        """
+        Load the configuration and apply it if valid.
+
+        :returns: Whether the new configuration was applied.
+        """
+        logger = self.app.logger
+        logger.info("Reloading configuration from %s", self.filename)
+        start = time.perf_counter()
+        try:
+            config = self.load()
+        except Exception as exc:  # pylint: disable=W0703
+            logger.error("Invalid configuration from %s is ignored, the current one is kept: %s",
+                         self.filename, exc, exc_info=exc)
+            return False
+
+        self.app.config = config  # replaced at once, requests in progress keep the configuration they obtained
+        self.last_modified = datetime.datetime.fromtimestamp(self.mtime / 1e9, datetime.timezone.utc)
+        reset_metrics_snapshot()
+        load_precompiled_responses()
+        logger.info("Configuration reloaded in %.3fs", time.perf_counter() - start)
+        return True
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# coding:utf-8
+"""
+Database utilities.
+
+This module handles connections to the database and its initialization without any dependency on the :mod:`Flask`
+application, such that cron jobs can employ them directly. The application reuses the same utilities with connections
+cached in its global context (see :func:`canarieapi.utility_rest.get_db`).
+
+Existing databases are migrated to the latest schema by the first connection of every process (see
+:mod:`canarieapi.migrations`).
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import contextlib
+import functools
+import inspect
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, ContextManager, Optional, Set, TypeVar
+from typing_extensions import Protocol
+
+# -- Project specific --------------------------------------------------------
+from canarieapi.migrations import LATEST_SCHEMA_VERSION, get_schema_version, migrate_db
+from canarieapi.reverse_proxied import time_phase
+from canarieapi.settings import ROOT_PATH, get_config, get_logger
+
+SCHEMA_FILENAME = os.path.join(ROOT_PATH, "database_schema.sql")
+
+ReturnType = TypeVar("ReturnType")  # pylint: disable=C0103
+
+_MIGRATED: Set[str] = set()  # databases migrated by this process
+_MIGRATION_LOCK = threading.Lock()
+
+
+def get_database_filename() -> str:
+    """
+    Obtain the absolute path of the configured database file.
+    """
+    database_fn = get_config()["DATABASE"]["filename"]
+    get_logger().debug("Using configured filename: [%s]", database_fn)
+    if not os.path.isabs(database_fn):
+        database_fn = os.path.join(ROOT_PATH, database_fn)
+    return os.path.abspath(database_fn)
+
+
+def connect_db() -> sqlite3.Connection:
+    """
+    Establish a new connection to the configured database.
+
+    If the local sqlite3 file doesn't exist, initialize it using the schema.
+    """
+    logger = get_logger()
+    database_fn = get_database_filename()
+
+    logger.debug("Setup database connection with filename: [%s]", database_fn)
+    db_exists = os.path.isfile(database_fn)  # must resolve before connect otherwise file already created
+    try:
+        with time_phase("db_connect"):
+            database = sqlite3.connect(database_fn)
+    except Exception as exc:
+        logger.error(
+            "Error [%s] occurred during database connection with filename: [%s].",
+            str(exc), database_fn, exc_info=exc
+        )
+        logger.debug("Reraise for error reporting.")
+        raise
+
+    logger.debug("Initialize database with filename: [%s]", database_fn)
+    if db_exists:
+        logger.debug("Skipping database initialization: [%s] (already exists)", database_fn)
+    else:
+        try:
+            with time_phase("db_connect"):
+                init_db(database)
+        except Exception as exc:
+            logger.error(
+                "Error [%s] occurred during database initialization with filename: [%s].",
+                str(exc), database_fn, exc_info=exc
+            )
+            logger.debug("Closing database.")
+            database.close()
+            logger.debug("Deleting database filename (reset for recreation): [%s].", database_fn)
+            os.remove(database_fn)
+            logger.debug("Reraise for error reporting.")
+            raise
+    if database_fn not in _MIGRATED:
+        with _MIGRATION_LOCK:
+            if database_fn not in _MIGRATED:
+                if get_schema_version(database) < LATEST_SCHEMA_VERSION:
+                    logger.info("Migrating database with filename: [%s]", database_fn)
+                    with time_phase("db_connect"):
+                        init_db(database)
+                _MIGRATED.add(database_fn)
+    return database
+
+
+def init_db(database: sqlite3.Connection) -> None:
+    """
+    Initialize a database from a schema, creating what is missing, and apply the pending migrations.
+    """
+    logger = get_logger()
+    logger.debug("Initializing database")
+    logger.debug("Using schema filename : %s", SCHEMA_FILENAME)
+    with open(SCHEMA_FILENAME, mode="r", encoding="utf-8") as schema_f:
+        database.cursor().executescript(schema_f.read())
+    database.commit()
+    migrate_db(database)
+
+
+class DatabaseRetryFunction(Protocol):
+    def __call__(self, *args: Any, database: Optional[sqlite3.Connection] = None, **kwargs: Any) -> ReturnType:
+        ...
+
+
+def make_retry_db_error_after_init(
+    connect: Callable[[], sqlite3.Connection],
+    context: Callable[[], ContextManager[Any]] = contextlib.nullcontext,
+    close: bool = False,
+) -> Callable[[DatabaseRetryFunction], DatabaseRetryFunction]:
+    """
+    Create a decorator that will retry a failing operation if an error related to database initialization occurred.
+
+    :param connect: Obtains the connection to employ when the decorated function is not given one.
+    :param context: Context within which the connection is obtained and the operation is performed.
+    :param close: Close the connection obtained by the decorator once the operation completes, but never the one given
+        to the decorated function, which remains owned by the caller.
+    """
+    def decorator(func: DatabaseRetryFunction) -> DatabaseRetryFunction:
+        db_param = inspect.signature(func).parameters.get("database")
+        use_db = db_param is not None and "sqlite3.Connection" in str(db_param.annotation)
+
+        @functools.wraps(func)
+        def retry(*args: Any, database: sqlite3.Connection = None, **kwargs: Any) -> ReturnType:
+            logger = get_logger()
+            db = None
+            with context():
+                if use_db:
+                    db = database or connect()
+                    kwargs["database"] = db
+                try:
+                    with time_phase("db_query"):
+                        return func(*args, **kwargs)
+                except sqlite3.OperationalError as exc:
+                    mod = getattr(func, "__module__", "")
+                    mod = f"{mod}." if mod else ""
+                    name = f"{mod}.{func.__name__}"
+                    if "no such table" in str(exc):
+                        if not db:
+                            logger.debug(
+                                "Missing database parameter to retry operation [%s] after initialization.",
+                                name,
+                            )
+                        else:
+                            logger.warning(
+                                "Error from database [%s] during [%s] operation. Retrying after initialization.",
+                                name, exc,
+                            )
+                            init_db(db)
+                            return func(*args, **kwargs)
+                    logger.error(
+                        "Error from database: [%s] during [%s] operation. Could not recover.",
+                        name, exc,
+                    )
+                    raise
+                finally:
+                    if close and db is not None and database is None:
+                        db.close()
+
+        return retry
+    return decorator
+
+
+# Decorator for operations performed outside the application (cron jobs), using a new connection when none is given
+retry_db_error_after_init = make_retry_db_error_after_init(connect_db, close=True)
@@ -1,3 +1,6 @@
+-- must precede the creation of tables to be effective, existing databases are converted by the maintenance job
+PRAGMA auto_vacuum = INCREMENTAL;
+
 CREATE TABLE IF NOT EXISTS [stats] (
   [route] VARCHAR(32),
   [invocations] INTEGER,
@@ -5,6 +8,7 @@ CREATE TABLE IF NOT EXISTS [stats] (
 );
 
 CREATE UNIQUE INDEX IF NOT EXISTS [stats_id] ON [stats] ([route]);
+CREATE INDEX IF NOT EXISTS [stats_last_access] ON [stats] ([last_access]);
 
 CREATE TABLE IF NOT EXISTS [status] (
   [route] VARCHAR(32),
@@ -21,3 +25,78 @@ CREATE TABLE IF NOT EXISTS [cron] (
 );
 
 CREATE UNIQUE INDEX IF NOT EXISTS [cron_id] ON [cron] ([job]);
+
+
+CREATE TABLE IF NOT EXISTS [cron_duration] (
+  [job] VARCHAR(32),
+  [duration] REAL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS [cron_duration_id] ON [cron_duration] ([job]);
+
+CREATE TABLE IF NOT EXISTS [status_timing] (
+  [route] VARCHAR(32),
+  [service] VARCHAR(32),
+  [duration] REAL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS [status_timing_id] ON [status_timing] ([route], [service]);
+
+CREATE TABLE IF NOT EXISTS [self_test] (
+  [id] VARCHAR(32),
+  [status] VARCHAR(16),
+  [created] REAL,
+  [started] REAL,
+  [finished] REAL,
+  [updated] REAL,
+  [completed] INTEGER,
+  [total] INTEGER,
+  [result] TEXT,
+  [error] TEXT
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS [self_test_id] ON [self_test] ([id]);
+CREATE INDEX IF NOT EXISTS [self_test_created] ON [self_test] ([created]);
+
+CREATE TABLE IF NOT EXISTS [status_latency] (
+  [route] VARCHAR(32),
+  [service] VARCHAR(32),
+  [total] REAL,
+  [connect] REAL,
+  [tls] REAL,
+  [ttfb] REAL,
+  [bytes] INTEGER,
+  [samples] TEXT
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS [status_latency_id] ON [status_latency] ([route], [service]);
+
+CREATE TABLE IF NOT EXISTS [status_queue] (
+  [route] VARCHAR(32),
+  [service] VARCHAR(32),
+  [wait] REAL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS [status_queue_id] ON [status_queue] ([route], [service]);
+
+CREATE TABLE IF NOT EXISTS [probe_cache] (
+  [probe] VARCHAR(64),
+  [etag] TEXT,
+  [last_modified] TEXT
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS [probe_cache_id] ON [probe_cache] ([probe]);
+
+CREATE TABLE IF NOT EXISTS [monitor_worker] (
+  [worker] VARCHAR(64),
+  [renewed] REAL,
+  [expires] REAL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS [monitor_worker_id] ON [monitor_worker] ([worker]);
+
+CREATE TABLE IF NOT EXISTS [schema_version] (
+  [version] INTEGER PRIMARY KEY,
+  [description] TEXT,
+  [applied] DATETIME
+);
@@ -10,6 +10,123 @@ found in this file, you need to set the environment variable named
 MY_SERVER_NAME = "http://localhost:2000"
 SERVER_MAIN_TITLE = "Canarie API"
 
+# Duration (seconds) that clients may cache responses which only depend on this configuration (info, home, redirects)
+# Responses depending on monitoring and statistics data (stats, status) must always be revalidated using their ETag
+CACHE_MAX_AGE = 60
+
+# If this is True, precompiled responses (info, home) are also kept gzip-compressed for clients that accept it
+COMPRESS_STATIC_RESPONSES = True
+
+# Request timings instrumentation (opt-in)
+#   enabled: time phases of requests (database, rendering, serialization) reported in 'Server-Timing' headers
+#   slow_request_threshold: duration (seconds) above which requests are logged with their timings breakdown
+#   window: number of latest requests per endpoint used to compute latency percentiles
+INSTRUMENTATION = {
+    "enabled": False,
+    "slow_request_threshold": 1.0,
+    "window": 1000
+}
+
+# Self-test run in background when the application starts (the configuration schema is always validated beforehand)
+#   enabled: probe monitored components and parse the access log to report problems in logs
+#   budget: maximum duration (seconds) a component can wait to be probed once its dependencies are probed,
+#           components waiting longer are skipped
+#   log_tail_bytes: amount of data parsed at the end of the access log
+STARTUP_SELF_TEST = {
+    "enabled": True,
+    "budget": 20,
+    "log_tail_bytes": 1048576
+}
+
+# Self-test jobs requested with the '/test' route, run in background while their status is reported by '/test/<job_id>'
+#   min_interval: minimum duration (seconds) between the creation of jobs, the latest job is reported until then
+#   max_duration: duration (seconds) without update after which a job is considered abandoned (e.g.: worker restart),
+#                 running jobs being updated periodically whichever phase they are in
+#   history: number of latest jobs kept in the database
+SELF_TEST_JOBS = {
+    "min_interval": 60,
+    "max_duration": 600,
+    "history": 20
+}
+
+# Monitoring of components
+#   latency_samples: number of latest probe durations kept per component to compute its latency percentiles
+#   latency_threshold: duration (seconds) above which responding components are considered 'bad' (none to disable),
+#                      can be overridden per component with 'max_latency' of its 'response' configuration
+#   cert_expiry_days: minimum number of days before the expiry of certificates of 'tls' probes (none to disable),
+#                     can be overridden per component with 'min_cert_days' of its 'response' configuration
+#   timeouts: default timeout (seconds) of probes per kind, unless specified by the 'request' of the component
+#   conditional_requests: send the validators ('ETag', 'Last-Modified') of the latest successful response of 'http' and
+#                         'http-head' probes, such that unchanged content ('304 Not Modified') is not fetched again
+#   scheduler: parallel probes
+#     max_workers: maximum number of probes in progress
+#     max_per_host: maximum number of probes in progress against the same host and port (none for unlimited)
+#     rate: maximum number of probes started per second (none for unlimited)
+#     burst: number of probes that can be started at once regardless of the rate (none for one)
+#   sharding: share the components among several monitoring workers using the same database, each one probing its own
+#             shard (workers are named by the '--worker' argument of 'python -m canarieapi.monitoring')
+#     enabled: probe only the shard of the worker
+#     worker: name of the worker unless specified (none for the host name), unique among all workers
+#     lease: duration (seconds) after the latest run of a worker until its shard is taken over by the others,
+#            must be longer than the interval between runs
+#     virtual_nodes: number of positions of each worker on the consistent hashing ring
+MONITORING = {
+    "latency_samples": 100,
+    "latency_threshold": None,
+    "cert_expiry_days": 14,
+    "conditional_requests": True,
+    "timeouts": {
+        "http": 5,
+        "http-head": 5,
+        "tcp": 2,
+        "tls": 3
+    },
+    "scheduler": {
+        "max_workers": 16,
+        "max_per_host": 4,
+        "rate": None,
+        "burst": None
+    },
+    "sharding": {
+        "enabled": False,
+        "worker": None,
+        "lease": 300,
+        "virtual_nodes": 64
+    }
+}
+
+# ASGI serving mode (see 'canarieapi.asgi')
+#   max_workers: number of threads handling requests (none for the default of 'concurrent.futures.ThreadPoolExecutor'),
+#                '/status/events' streams only hold one while preparing their response
+ASGI = {
+    "max_workers": 32
+}
+
+# Live status change events provided by the '/status/events' route (Server-Sent Events)
+#   enabled: allow clients to subscribe to status change events
+#   interval: duration (seconds) between checks for database changes by the single watcher of each worker
+#   heartbeat: duration (seconds) without events after which a comment is sent to keep connections alive
+#   max_clients: maximum number of simultaneous subscriptions per worker
+#   queue_size: maximum number of pending changes per client, slower clients are disconnected
+STATUS_EVENTS = {
+    "enabled": True,
+    "interval": 1.0,
+    "heartbeat": 15,
+    "max_clients": 100,
+    "queue_size": 100
+}
+
+# Reload of the configuration file referenced by 'CANARIE_API_CONFIG_FN' without restarting workers
+#   enabled: check the file modification time while handling requests and apply the modified configuration if valid
+#   interval: minimum duration (seconds) between checks of the file modification time
+#   signal: also reload the configuration when receiving the 'SIGHUP' signal
+#           (avoid with servers that employ it for their own purpose, such as Gunicorn when running without workers)
+CONFIG_RELOAD = {
+    "enabled": True,
+    "interval": 5,
+    "signal": False
+}
+
 # If this is True, canarie-api will parse the nginx logs in DATABASE["access_log"] and report statistics
 PARSE_LOGS = True
 
@@ -18,6 +135,61 @@ DATABASE = {
     "access_log": "/logs/nginx-access.log"
 }
 
+# Storage of the access statistics, monitoring statuses and latency, and cron jobs times
+#   backend: "sqlite" (DATABASE filename) or "redis" (server shared by all nodes of a clustered deployment)
+#   url: location of the server of the "redis" backend (redis://[[user]:password@]host[:port][/db])
+#   prefix: prefix of the keys employed by the "redis" backend
+#   timeout: seconds allowed to connect to the server and to obtain its replies
+#   Other data (self-test jobs, cache of probes, queue waits, monitoring workers) remains in the DATABASE file of each
+#   node, such that sharded monitoring (MONITORING["sharding"]) still requires a DATABASE file shared by its workers.
+STORAGE = {
+    "backend": "sqlite",
+    "url": "redis://localhost:6379/0",
+    "prefix": "canarieapi:",
+    "timeout": 5
+}
+
+# Maintenance of the database by the job 'python -m canarieapi.maintenance' (e.g.: run daily by cron)
+#   retention: tables whose rows are deleted once older than 'max_age' (seconds, none to keep them) according to their
+#              'column', whose 'format' is 'epoch' (seconds, default) or 'datetime' (ISO-8601 text in UTC)
+#   chunk_size: maximum number of rows deleted per transaction, such that other connections are never blocked long
+#   chunk_pause: seconds between chunks, letting other connections obtain the lock
+#   incremental_vacuum: release free pages to the file system with 'PRAGMA incremental_vacuum'
+#   convert: convert a database created without 'auto_vacuum=INCREMENTAL' with a full 'VACUUM' (performed once, but
+#            rewriting the whole file while blocking writers), otherwise its free pages are not released
+#   vacuum_pages: maximum number of free pages released per run (none for all, in a single statement)
+#   analyze: update the statistics of the query planner ('ANALYZE' and 'PRAGMA optimize')
+MAINTENANCE = {
+    "retention": {
+        "self_test": {"column": "created", "max_age": 30 * 86400},
+        "monitor_worker": {"column": "expires", "max_age": 86400},
+    },
+    "chunk_size": 1000,
+    "chunk_pause": 0.05,
+    "incremental_vacuum": True,
+    "convert": False,
+    "vacuum_pages": 1000,
+    "analyze": True
+}
+
+# Snapshot of the statuses and statistics published by the cron jobs, from which the status and stats routes are served
+#   enabled: publish the snapshot, and serve the routes from it once published (otherwise, query the database)
+#   filename: location of the snapshot shared with all workers (default: snapshot.bin next to DATABASE filename)
+#   check_interval: seconds between checks of workers for a newly published snapshot
+SNAPSHOT = {
+    "enabled": True,
+    "filename": "",
+    "check_interval": 1.0
+}
+
+# Prometheus metrics (/metrics)
+#   cache_duration: seconds during which metrics obtained from the database are reused between scrapes
+#   directory: location shared by all workers to aggregate their request metrics (default: next to DATABASE filename)
+METRICS = {
+    "cache_duration": 15,
+    "directory": ""
+}
+
 SERVICES = {
     "name": {
         "info": {
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# coding:utf-8
+"""
+Self-test jobs.
+
+This module runs the self-test (configuration validation, monitoring probes and access log parsing) requested through
+the ``/test`` route in background, such that requests do not hold a worker for its whole duration.
+
+Jobs are recorded in the database, which allows any worker to report their status and progress. Requests received
+while a job is in progress are coalesced onto it, and a new job is only created once the minimum interval since the
+latest one has elapsed (see ``SELF_TEST_JOBS`` configuration).
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Optional, Tuple
+from typing_extensions import Literal, TypedDict
+
+# -- Project specific --------------------------------------------------------
+from canarieapi.database import connect_db, retry_db_error_after_init
+from canarieapi.monitoring import MonitorSummary
+from canarieapi.schema import validate_config_schema
+from canarieapi.settings import get_config, get_logger
+from canarieapi.typedefs import JSON
+
+JobStatus = Literal["queued", "running", "succeeded", "failed"]
+ACTIVE_JOB_STATUS = ("queued", "running")
+
+# Minimum duration (seconds) between updates of the job progress in the database
+PROGRESS_UPDATE_INTERVAL = 1.0
+
+# Maximum duration (seconds) between updates marking a running job as alive, whichever phase it is in
+# (limited to a fraction of 'SELF_TEST_JOBS["max_duration"]' such that a running job is never considered abandoned)
+HEARTBEAT_INTERVAL = 30.0
+
+SelfTestJob = TypedDict("SelfTestJob", {
+    "id": str,
+    "status": JobStatus,
+    "created": float,  # timestamps in seconds since epoch
+    "started": Optional[float],
+    "finished": Optional[float],
+    "updated": float,
+    "completed": int,  # number of monitored components probed (including deduplicated probes), pruned or skipped
+    "total": int,  # number of monitored components
+    "result": Optional[JSON],
+    "error": Optional[str],
+}, total=True)
+
+JOB_FIELDS = list(SelfTestJob.__annotations__)
+
+
+def make_job(row: Tuple[Any, ...]) -> SelfTestJob:
+    job = dict(zip(JOB_FIELDS, row))
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job  # type: ignore
+
+
+@retry_db_error_after_init
+def get_self_test_job(job_id: str, *, database: Optional[sqlite3.Connection] = None) -> Optional[SelfTestJob]:
+    """
+    Obtain the self-test job with the given identifier.
+    """
+    cur = database.cursor()
+    cur.execute(f"select {', '.join(JOB_FIELDS)} from self_test where id = ?", [job_id])
+    row = cur.fetchone()
+    return make_job(row) if row else None
+
+
+@retry_db_error_after_init
+def update_self_test_job(job_id: str, *, database: Optional[sqlite3.Connection] = None, **fields: Any) -> None:
+    """
+    Update the fields of the self-test job, also marking it as updated to indicate that it is still alive.
+    """
+    fields["updated"] = time.time()
+    if "result" in fields:
+        fields["result"] = json.dumps(fields["result"])
+    assignments = ", ".join(f"{field} = ?" for field in fields)
+    database.execute(f"update self_test set {assignments} where id = ?", [*fields.values(), job_id])
+    database.commit()
+
+
+@retry_db_error_after_init
+def submit_self_test_job(*, database: Optional[sqlite3.Connection] = None) -> Tuple[SelfTestJob, bool]:
+    """
+    Obtain the self-test job that handles a new request, creating it if required.
+
+    An active job, or the latest one if it was created within the minimum interval, is returned instead of creating a
+    new job. Jobs not updated for their maximum duration are considered abandoned, since running jobs are updated
+    periodically (see :func:`keep_job_alive`) and the worker that ran them most probably stopped.
+
+    :returns: The job, and whether it was created by this request.
+    """
+    settings = get_config().get("SELF_TEST_JOBS", {})
+    min_interval = settings.get("min_interval", 60)
+    max_duration = settings.get("max_duration", 600)
+    history = max(int(settings.get("history", 20)), 1)
+
+    now = time.time()
+    cur = database.cursor()
+    if database.in_transaction:
+        database.commit()
+    cur.execute("begin immediate")  # serialize submissions across workers
+    try:
+        cur.execute(
+            "update self_test set status = 'failed', finished = ?, error = 'Job abandoned.' "
+            f"where status in ({', '.join('?' * len(ACTIVE_JOB_STATUS))}) and updated < ?",
+            [now, *ACTIVE_JOB_STATUS, now - max_duration],
+        )
+        cur.execute(f"select {', '.join(JOB_FIELDS)} from self_test order by created desc limit 1")
+        row = cur.fetchone()
+        latest = make_job(row) if row else None
+        if latest and (latest["status"] in ACTIVE_JOB_STATUS or now - latest["created"] < min_interval):
+            database.commit()
+            return latest, False
+
+        job: SelfTestJob = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "created": now,
+            "started": None,
+            "finished": None,
+            "updated": now,
+            "completed": 0,
+            "total": 0,
+            "result": None,
+            "error": None,
+        }
+        cur.execute(
+            f"insert into self_test ({', '.join(JOB_FIELDS)}) values ({', '.join('?' * len(JOB_FIELDS))})",
+            list(job.values()),
+        )
+        cur.execute(
+            "delete from self_test where id not in (select id from self_test order by created desc limit ?)",
+            [history],
+        )
+        database.commit()
+    except Exception:
+        database.rollback()
+        raise
+    return job, True
+
+
+def keep_job_alive(job_id: str, stop: threading.Event, interval: float) -> None:
+    """
+    Mark the job as updated periodically until stopped, covering phases that do not report their progress.
+    """
+    database = connect_db()
+    try:
+        while not stop.wait(interval):
+            update_self_test_job(job_id, database=database)
+    except Exception as exc:  # pragma: no cover
+        get_logger().warning("Failed to update the heartbeat of self-test job [%s]: %s", job_id, exc)
+    finally:
+        database.close()
+
+
+def run_self_test_job(job_id: str) -> None:
+    """
+    Run the self-test job, recording its progress and result.
+    """
+    logger = get_logger()
+    database = connect_db()
+    last_update = 0.0
+    max_duration = get_config().get("SELF_TEST_JOBS", {}).get("max_duration", 600)
+    heartbeat_stop = threading.Event()
+    heartbeat = threading.Thread(
+        target=keep_job_alive,
+        args=(job_id, heartbeat_stop, min(HEARTBEAT_INTERVAL, max_duration / 3)),
+        name="canarieapi-test-job-heartbeat",
+        daemon=True,
+    )
+
+    def progress(summary: MonitorSummary) -> None:
+        nonlocal last_update
+        if time.perf_counter() - last_update >= PROGRESS_UPDATE_INTERVAL:
+            last_update = time.perf_counter()
+            completed = summary["probes"] + summary["deduplicated"] + summary["skipped"] + summary["pruned"]
+            update_self_test_job(job_id, database=database, completed=completed, total=summary["components"])
+
+    try:
+        logger.info("Starting self-test job [%s]", job_id)
+        update_self_test_job(job_id, database=database, status="running", started=time.time())
+        heartbeat.start()
+        try:
+            result = validate_config_schema(update_db=True, progress=progress)
+        except Exception as exc:
+            logger.error("Self-test job [%s] failed: %s", job_id, exc, exc_info=exc)
+            update_self_test_job(job_id, database=database, status="failed", finished=time.time(), error=str(exc))
+        else:
+            summary = result["monitoring"]
+            update_self_test_job(
+                job_id, database=database, status="succeeded", finished=time.time(), result=result,
+                completed=summary["probes"] + summary["deduplicated"] + summary["skipped"] + summary["pruned"],
+                total=summary["components"],
+            )
+            logger.info("Self-test job [%s] completed", job_id)
+    finally:
+        heartbeat_stop.set()
+        database.close()
+
+
+def start_self_test_job(database: sqlite3.Connection) -> Tuple[SelfTestJob, bool]:
+    """
+    Submit a self-test job and start running it in background if it was created by this request.
+
+    :returns: The job, and whether it was created by this request.
+    """
+    job, created = submit_self_test_job(database=database)
+    if created:
+        thread = threading.Thread(target=run_self_test_job, args=(job["id"],), name="canarieapi-test-job", daemon=True)
+        thread.start()
+    else:
+        get_logger().info("Request coalesced onto self-test job [%s] (%s)", job["id"], job["status"])
+    return job, created
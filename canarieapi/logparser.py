@@ -1,15 +1,16 @@
 # -- Standard lib ------------------------------------------------------------
+import os
 import re
 import sqlite3
+import time
 from datetime import datetime, timezone
-from typing import Dict, Optional, Union
-
-# -- 3rd party ---------------------------------------------------------------
-from dateutil.parser import parse as dt_parse
+from typing import Dict, Iterator, Optional, Union
 
 # -- Project specific --------------------------------------------------------
-from canarieapi.app_object import APP
-from canarieapi.utility_rest import get_db, retry_db_error_after_init
+from canarieapi.database import connect_db, retry_db_error_after_init
+from canarieapi.settings import get_config, get_logger
+from canarieapi.snapshot import publish_snapshot
+from canarieapi.storage import get_storage
 
 RouteStatistics = Dict[str, Dict[str, Union[str, int]]]
 
@@ -18,17 +19,39 @@ def parse_datetime(dt_str: str) -> datetime:
     """
     Parse datetime string from log and return it with TimeZone awareness.
     """
+    from dateutil.parser import parse as dt_parse  # pylint: disable=C0415  # only loaded when logs are parsed
+
     dt = dt_parse(dt_str)
     if dt.tzinfo is None:
         dt = dt.replace(tzinfo=timezone.utc)
     return dt
 
 
-def parse_log(filename: str, database: Optional[sqlite3.Connection] = None) -> RouteStatistics:
+def read_log_lines(filename: str, max_bytes: Optional[int] = None) -> Iterator[str]:
+    """
+    Read lines of the log file, optionally limited to the last bytes of the file.
+
+    When limited, the first (possibly partial) line of the tail is skipped.
+    """
+    with open(filename, mode="rb") as f:
+        if max_bytes is not None:
+            size = os.fstat(f.fileno()).st_size
+            if size > max_bytes:
+                f.seek(size - max_bytes - 1)
+                f.readline()  # skip up to the first complete line (seek one byte earlier in case it was aligned)
+        for line in f:
+            yield line.decode("utf-8", errors="replace")
+
+
+def parse_log(
+    filename: str,
+    database: Optional[sqlite3.Connection] = None,
+    max_bytes: Optional[int] = None,
+) -> RouteStatistics:
     # Load config
-    logger = APP.logger
+    logger = get_logger()
     logger.info("Loading configuration")
-    config = APP.config
+    config = get_config()
     srv_stats = {route: config["SERVICES"][route]["stats"] for route in config["SERVICES"]}
     pf_stats = {route: config["PLATFORMS"][route]["stats"] for route in config["PLATFORMS"]}
     all_stats = srv_stats
@@ -49,27 +72,23 @@ def parse_log(filename: str, database: Optional[sqlite3.Connection] = None) -> R
             raise
 
     # get the last entry from the logs in order to not duplicate entries if the same log file is read multiple times
-    with APP.app_context():
-        db = database or get_db()
-        cur = db.cursor()
-        cur.execute("select last_access from stats order by last_access desc limit 1")
-        records = cur.fetchone()
-        if records:
-            last_access = parse_datetime(records[0])
-        else:
-            last_access = None
+    db = database or connect_db()
+    last_access = get_storage(db).get_last_access()
+    if last_access:
+        last_access = parse_datetime(last_access)
+    if database is None:
+        db.close()
 
     # Load access log
     logger.info("Loading log file : %s", filename)
     log_regex = re.compile(r".*\[(?P<datetime>.*)\] \"(?P<method>[A-Z]+) (?P<route>/.*) .*")  # pylint: disable=C4001
     log_records = []
-    with open(filename, mode="r", encoding="utf-8") as f:
-        for line in f:
-            match = log_regex.match(line)
-            if match:
-                records = match.groupdict()
-                if last_access is None or parse_datetime(records["datetime"]) > last_access:
-                    log_records.append(records)
+    for line in read_log_lines(filename, max_bytes=max_bytes):
+        match = log_regex.match(line)
+        if match:
+            records = match.groupdict()
+            if last_access is None or parse_datetime(records["datetime"]) > last_access:
+                log_records.append(records)
 
     # Compile stats
     logger.info("Compiling stats from %s records", len(log_records))
@@ -83,41 +102,41 @@ def parse_log(filename: str, database: Optional[sqlite3.Connection] = None) -> R
 
 
 @retry_db_error_after_init
-def update_db(route_stats: RouteStatistics, database: Optional[sqlite3.Connection] = None) -> None:
+def update_db(
+    route_stats: RouteStatistics,
+    database: Optional[sqlite3.Connection] = None,
+    duration: Optional[float] = None,
+) -> None:
     # Update stats in database
-    logger = APP.logger
+    logger = get_logger()
     logger.info("Updating database")
-    with APP.app_context():
-        db = database or get_db()
-        cur = db.cursor()
+    db = database
+    storage = get_storage(db)
 
-        for route, value in route_stats.items():
-            if not value["count"]:
-                continue
+    increments = {}
+    for route, value in route_stats.items():
+        if not value["count"]:
+            continue
 
-            logger.info("Adding %s invocations to route %s", value["count"], route)
+        logger.info("Adding %s invocations to route %s", value["count"], route)
+        increments[route] = (value["count"], value["last_access"])
 
-            query = (
-                "insert or replace into stats (route, invocations, last_access) values ("
-                "?, "
-                " ifnull((select invocations from stats where route=?),0) + ?, "
-                "?)"
-            )
-
-            # sqlite can take the date as a string as long as it is formatted using ISO-8601
-            cur.execute(query, [route, route, value["count"], value["last_access"]])
-
-        cur.execute("insert or replace into cron (job, last_execution) values ('log', CURRENT_TIMESTAMP)")
-        db.commit()
-        db.close()
+    storage.increment_stats(increments)
+    storage.update_cron("log", duration)
+    storage.commit()
+    publish_snapshot(db)
+    db.close()
 
 
 def cron_job() -> None:
-    if APP.config.get("PARSE_LOGS", True):
-        logger = APP.logger
+    config = get_config()
+    if config.get("PARSE_LOGS", True):
+        logger = get_logger()
         logger.info("Cron job for parsing server log")
-        access_log_fn = APP.config["DATABASE"]["access_log"]
-        update_db(parse_log(access_log_fn))
+        access_log_fn = config["DATABASE"]["access_log"]
+        job_start = time.perf_counter()
+        route_stats = parse_log(access_log_fn)
+        update_db(route_stats, duration=time.perf_counter() - job_start)
         logger.info("Done")
 
 
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# coding:utf-8
+"""
+Maintenance of the database: retention of its history, release of free space and statistics of the query planner.
+
+Rows older than the retention of their table are deleted in chunks, each one in its own short transaction, such that
+the jobs and web workers are never blocked for long. The space they occupied is then released to the file system a
+limited number of pages at a time with ``incremental_vacuum``, which requires ``auto_vacuum=INCREMENTAL``. Databases
+created before it was enabled by the schema must be converted once with a full ``VACUUM``, which rewrites the whole file
+while holding the write lock: it is only performed by the job when allowed by ``MAINTENANCE["convert"]``.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+from typing_extensions import TypedDict
+
+# -- Project specific --------------------------------------------------------
+from canarieapi.database import get_database_filename, retry_db_error_after_init
+from canarieapi.settings import get_config, get_logger
+from canarieapi.storage import get_storage
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+DEFAULT_MAINTENANCE = {
+    "retention": {},
+    "chunk_size": 1000,
+    "chunk_pause": 0.05,
+    "incremental_vacuum": True,
+    "convert": False,
+    "vacuum_pages": 1000,
+    "analyze": True,
+}
+
+MaintenanceSummary = TypedDict("MaintenanceSummary", {
+    "deleted": Dict[str, int],  # rows deleted per table
+    "chunks": int,
+    "vacuumed_pages": int,
+    "reclaimed_bytes": int,  # reduction of the size of the database file
+    "prune_duration": float,
+    "vacuum_duration": float,
+    "analyze_duration": float,
+    "duration": float,
+}, total=True)
+
+
+def get_page_count(database: sqlite3.Connection) -> int:
+    return database.execute("pragma page_count").fetchone()[0]
+
+
+def get_file_size(database: sqlite3.Connection) -> int:
+    filename = get_database_filename()
+    if not os.path.isfile(filename):  # pragma: no cover
+        return get_page_count(database) * database.execute("pragma page_size").fetchone()[0]
+    return os.path.getsize(filename)
+
+
+def prune_table(
+    database: sqlite3.Connection,
+    table: str,
+    column: str,
+    max_age: float,
+    time_format: str = "epoch",
+    chunk_size: int = 1000,
+    chunk_pause: float = 0.0,
+) -> Dict[str, int]:
+    """
+    Delete the rows of the table older than the maximum age (seconds) according to its column, chunk by chunk.
+
+    :param time_format: ``epoch`` (seconds) or ``datetime`` (ISO-8601 text in UTC, as ``CURRENT_TIMESTAMP``).
+    :returns: Number of deleted rows and of chunks (transactions).
+    """
+    tables = [row[0] for row in database.execute("select name from sqlite_master where type = 'table'")]
+    if table not in tables:
+        raise ValueError(f"Unknown table [{table}] in the retention of the database maintenance.")
+    if column not in [row[1] for row in database.execute(f"pragma table_info([{table}])")]:
+        raise ValueError(f"Unknown column [{column}] of table [{table}] in the retention of the database maintenance.")
+    if time_format not in ["epoch", "datetime"]:
+        raise ValueError(f"Unknown time format [{time_format}] of table [{table}], expecting 'epoch' or 'datetime'.")
+
+    cutoff: Any = time.time() - max_age
+    if time_format == "datetime":
+        cutoff = database.execute("select datetime(?, 'unixepoch')", [cutoff]).fetchone()[0]
+    query = (
+        f"delete from [{table}] where rowid in "
+        f"(select rowid from [{table}] where [{column}] < ? limit ?)"
+    )
+    deleted = chunks = 0
+    while True:
+        # each chunk is its own transaction, such that the write lock is only held briefly
+        count = database.execute(query, [cutoff, max(int(chunk_size), 1)]).rowcount
+        database.commit()
+        if count <= 0:
+            break
+        deleted += count
+        chunks += 1
+        if count < chunk_size:
+            break
+        if chunk_pause:
+            time.sleep(chunk_pause)
+    return {"deleted": deleted, "chunks": chunks}
+
+
+def vacuum_database(database: sqlite3.Connection, pages: Optional[int] = 1000, convert: bool = False) -> int:
+    """
+    Release free pages of the database to the file system, converting it to ``auto_vacuum=INCREMENTAL`` if allowed.
+
+    :param pages: Maximum number of pages released (all free pages if ``None``).
+    :param convert: Allow a full ``VACUUM`` to enable incremental vacuum, otherwise nothing is released without it.
+    :returns: Number of released pages.
+    """
+    logger = get_logger()
+    if database.in_transaction:
+        database.commit()
+    if database.execute("pragma auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        if not convert:
+            logger.warning(
+                "Database does not employ incremental vacuum, free pages are not released. Convert it once with "
+                "MAINTENANCE['convert'] enabled, or manually while the application is stopped: "
+                "sqlite3 %s 'pragma auto_vacuum = incremental; vacuum;'",
+                get_database_filename(),
+            )
+            return 0
+        logger.warning("Converting database to incremental vacuum with a full VACUUM (performed only once).")
+        before = get_page_count(database)
+        database.execute("pragma auto_vacuum = incremental")
+        database.execute("vacuum")
+        return max(before - get_page_count(database), 0)
+    before = get_page_count(database)
+    # one page is released per step of the statement, which 'execute' stops after the first since it has no columns
+    if pages is None:
+        database.executescript("pragma incremental_vacuum")
+    elif int(pages) > 0:  # zero would release all of them
+        database.executescript(f"pragma incremental_vacuum({int(pages)})")
+    return max(before - get_page_count(database), 0)
+
+
+@retry_db_error_after_init
+def maintain(*, database: Optional[sqlite3.Connection] = None) -> MaintenanceSummary:
+    """
+    Apply the retention of tables, release free pages and update the statistics of the query planner.
+    """
+    logger = get_logger()
+    settings = dict(DEFAULT_MAINTENANCE, **get_config().get("MAINTENANCE", {}))
+    job_start = time.perf_counter()
+    size_before = get_file_size(database)
+    summary: MaintenanceSummary = {
+        "deleted": {},
+        "chunks": 0,
+        "vacuumed_pages": 0,
+        "reclaimed_bytes": 0,
+        "prune_duration": 0.0,
+        "vacuum_duration": 0.0,
+        "analyze_duration": 0.0,
+        "duration": 0.0,
+    }
+
+    start = time.perf_counter()
+    for table, retention in (settings["retention"] or {}).items():
+        if retention.get("max_age") is None:
+            continue
+        result = prune_table(
+            database, table, retention["column"], retention["max_age"], retention.get("format", "epoch"),
+            chunk_size=settings["chunk_size"], chunk_pause=settings["chunk_pause"],
+        )
+        summary["deleted"][table] = result["deleted"]
+        summary["chunks"] += result["chunks"]
+        if result["deleted"]:
+            logger.info("Deleted %s rows of table [%s] older than %ss in %s chunks.",
+                        result["deleted"], table, retention["max_age"], result["chunks"])
+    summary["prune_duration"] = time.perf_counter() - start
+
+    if settings["incremental_vacuum"]:
+        start = time.perf_counter()
+        summary["vacuumed_pages"] = vacuum_database(database, settings["vacuum_pages"], settings["convert"])
+        summary["vacuum_duration"] = time.perf_counter() - start
+
+    if settings["analyze"]:
+        start = time.perf_counter()
+        database.execute("analyze")
+        database.execute("pragma optimize")
+        database.commit()
+        summary["analyze_duration"] = time.perf_counter() - start
+
+    summary["reclaimed_bytes"] = max(size_before - get_file_size(database), 0)
+    summary["duration"] = time.perf_counter() - job_start
+    storage = get_storage(database)
+    storage.update_cron("maintenance", summary["duration"])
+    storage.commit()
+    logger.info(
+        "Database maintenance deleted %s rows, released %s pages (%s bytes) in %.3fs "
+        "(prune: %.3fs, vacuum: %.3fs, analyze: %.3fs).",
+        sum(summary["deleted"].values()), summary["vacuumed_pages"], summary["reclaimed_bytes"], summary["duration"],
+        summary["prune_duration"], summary["vacuum_duration"], summary["analyze_duration"],
+    )
+    database.close()
+    return summary
+
+
+def cron_job() -> None:
+    logger = get_logger()
+    logger.info("Cron job for maintenance of the database")
+    maintain()
+    logger.info("Done")
+
+
+if __name__ == "__main__":
+    cron_job()
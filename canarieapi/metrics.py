@@ -0,0 +1,457 @@
+#!/usr/bin/env python
+# coding:utf-8
+"""
+Prometheus metrics.
+
+This module generates the `Prometheus text exposition format`_ of the application metrics:
+
+- invocations and last access of services and platforms, from the statistics of the log parsing job;
+- status and probe duration of monitored components, from the monitoring job;
+- last execution, lag and duration of the cron jobs;
+- request counts and latency histograms of the Flask routes;
+- latency percentiles of the worker answering the scrape, if request instrumentation is enabled.
+
+Metrics obtained from the database are collected in a snapshot refreshed at most once every
+``METRICS["cache_duration"]`` seconds, such that scrapes do not scan the database each time.
+
+Request metrics are accumulated in memory by each worker process and periodically written to a distinct file in
+``METRICS["directory"]``. Every file is aggregated when generating metrics, such that any worker answering the
+scrape reports the totals of all workers. Requests of workers that exited (e.g.: recycled by the WSGI server) are
+folded into a single archive file of the directory, by the worker on exit or otherwise when aggregating, before their
+file is removed. Aggregated counters therefore never decrease while workers come and go, which would otherwise be
+misinterpreted by Prometheus ``rate()`` and ``increase()`` functions.
+
+.. _Prometheus text exposition format: https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import atexit
+import bisect
+import contextlib
+import datetime
+import fcntl
+import glob
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from typing_extensions import TypedDict
+
+# -- 3rd party ---------------------------------------------------------------
+from dateutil.parser import parse as dt_parse
+
+# -- Project specific --------------------------------------------------------
+from canarieapi.app_object import APP
+from canarieapi.snapshot import SHARED_FILE_MODE
+from canarieapi.status import Status
+from canarieapi.storage import get_storage
+from canarieapi.utility_rest import get_db, retry_db_error_after_init
+
+METRICS_MIMETYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRICS_PREFIX = "canarieapi"
+
+# Upper bounds (seconds) of the request latency histogram buckets
+REQUEST_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Minimum delay (seconds) between writes of the request metrics of this worker to its file
+REQUEST_METRICS_FLUSH_INTERVAL = 1.0
+
+# Request metrics file of a worker: "requests-<hostname>-<pid>-<start time>.json"
+# The start time distinguishes workers that obtained the PID of a previous one.
+REQUEST_METRICS_FILE_PATTERN = "requests-*.json"
+# Request metrics of every exited worker, and lock of their archival
+REQUEST_METRICS_ARCHIVE_FILE = "archived.json"
+REQUEST_METRICS_LOCK_FILE = "archived.lock"
+
+MetricsSnapshot = TypedDict("MetricsSnapshot", {
+    "routes": List[Tuple[str, int, Optional[float]]],  # route, invocations, last access timestamp
+    "components": List[Tuple[str, str, str, Optional[float]]],  # route, component, status, probe duration
+    "cron": List[Tuple[str, Optional[float], Optional[float]]],  # job, last execution timestamp, duration
+}, total=True)
+
+# request metrics key: "<endpoint> <method> <status code>"
+RequestMetrics = TypedDict("RequestMetrics", {
+    "count": Dict[str, int],
+    "latency": Dict[str, List[float]],  # endpoint: [bucket counts..., +Inf count, sum]
+}, total=True)
+
+
+def _timestamp(dt_str: Optional[str]) -> Optional[float]:
+    if not dt_str:
+        return None
+    try:
+        dt = dt_parse(dt_str)
+    except (ValueError, OverflowError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+
+def _labels(**labels: str) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f"{name}=\"{_escape(value)}\"" for name, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+@retry_db_error_after_init
+def collect_metrics_snapshot(*, database: Optional[sqlite3.Connection] = None) -> MetricsSnapshot:
+    """
+    Collect the metrics provided by the cron jobs from the database.
+    """
+    db = database or get_db()
+    storage = get_storage(db)
+    routes = [
+        (route, invocations or 0, _timestamp(last_access))
+        for route, invocations, last_access in storage.get_stats()
+    ]
+    durations = {(route, service): duration for route, service, duration in storage.get_timings()}
+    components = [
+        (route, service, status, durations.get((route, service)))
+        for route, service, status, _ in storage.get_statuses()
+    ]
+    cron = [(job, _timestamp(last_execution), duration) for job, last_execution, duration in storage.get_cron()]
+    return {"routes": routes, "components": components, "cron": cron}
+
+
+class RequestMetricsRecorder(object):
+    """
+    Accumulates request counts and latencies of the current worker process.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.metrics: RequestMetrics = {"count": {}, "latency": {}}
+        self.last_flush = 0.0
+        self.pid: Optional[int] = None
+        self.filename: Optional[str] = None
+
+    def record(self, endpoint: str, method: str, status_code: int, duration: float) -> None:
+        """
+        Record a completed request.
+        """
+        count_key = f"{endpoint} {method} {status_code}"
+        bucket = bisect.bisect_left(REQUEST_LATENCY_BUCKETS, duration)
+        with self.lock:
+            counts = self.metrics["count"]
+            counts[count_key] = counts.get(count_key, 0) + 1
+            latency = self.metrics["latency"].setdefault(endpoint, [0] * (len(REQUEST_LATENCY_BUCKETS) + 1) + [0.0])
+            latency[bucket] += 1
+            latency[-1] += duration
+        if time.monotonic() - self.last_flush >= REQUEST_METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def get_filename(self, metrics_dir: str) -> str:
+        """
+        Obtain the request metrics file of this worker, distinct from any previous worker with the same PID.
+        """
+        pid = os.getpid()
+        with self.lock:
+            # first use in this process (e.g.: after being forked by the WSGI server) or since its metrics were archived
+            if self.pid != pid or self.filename is None:
+                if self.pid is None:
+                    atexit.register(self.close)
+                self.pid = pid
+                name = f"requests-{socket.gethostname()}-{pid}-{time.time_ns()}.json"
+                self.filename = os.path.join(metrics_dir, name)
+            return self.filename
+
+    def flush(self) -> None:
+        """
+        Write the request metrics of this worker to its own file for aggregation by any other worker.
+        """
+        metrics_dir = get_metrics_directory()
+        metrics_fn = self.get_filename(metrics_dir)
+        with self.lock:
+            self.last_flush = time.monotonic()
+            content = json.dumps(self.metrics)
+        try:
+            os.makedirs(metrics_dir, exist_ok=True)
+            write_request_metrics(metrics_fn, content)
+        except OSError as exc:  # pragma: no cover
+            APP.logger.warning("Could not write request metrics to [%s]: %s", metrics_dir, exc)
+
+    def close(self) -> None:
+        """
+        Archive the request metrics of this worker when it exits, including those not flushed yet, and remove its file.
+        """
+        if self.pid != os.getpid() or not self.filename:
+            return  # forked worker that never wrote its own file, the parent process owns this one
+        with self.lock:
+            metrics_fn, metrics = self.filename, self.metrics
+            self.filename = None
+            self.metrics = {"count": {}, "latency": {}}
+        try:
+            archive_request_metrics(os.path.dirname(metrics_fn), metrics_fn, metrics)
+        except OSError as exc:  # pragma: no cover
+            APP.logger.warning("Could not archive request metrics of [%s]: %s", metrics_fn, exc)
+
+
+REQUEST_METRICS = RequestMetricsRecorder()
+
+_SNAPSHOT_LOCK = threading.Lock()
+_SNAPSHOT: Optional[MetricsSnapshot] = None
+_SNAPSHOT_TIME = 0.0
+
+
+def get_metrics_directory() -> str:
+    """
+    Obtain the directory where request metrics of every worker are stored.
+
+    Defaults to a ``metrics`` directory next to the database file.
+    """
+    metrics_dir = APP.config.get("METRICS", {}).get("directory")
+    if not metrics_dir:
+        database_fn = APP.config["DATABASE"]["filename"]
+        if not os.path.isabs(database_fn):
+            database_fn = os.path.join(APP.root_path, database_fn)
+        metrics_dir = os.path.join(os.path.dirname(os.path.abspath(database_fn)), "metrics")
+    return metrics_dir
+
+
+def get_metrics_snapshot() -> MetricsSnapshot:
+    """
+    Obtain the database metrics snapshot, refreshing it only if older than the configured cache duration.
+    """
+    global _SNAPSHOT, _SNAPSHOT_TIME  # pylint: disable=W0603
+    cache_duration = APP.config.get("METRICS", {}).get("cache_duration", 15)
+    with _SNAPSHOT_LOCK:
+        if _SNAPSHOT is None or time.monotonic() - _SNAPSHOT_TIME >= cache_duration:
+            _SNAPSHOT = collect_metrics_snapshot()
+            _SNAPSHOT_TIME = time.monotonic()
+        return _SNAPSHOT
+
+
+def reset_metrics_snapshot() -> None:
+    """
+    Discard the cached database metrics snapshot, forcing it to be collected again on next use.
+    """
+    global _SNAPSHOT  # pylint: disable=W0603
+    with _SNAPSHOT_LOCK:
+        _SNAPSHOT = None
+
+
+def is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # pragma: no cover  # process of another user
+        return True
+    return True
+
+
+def is_exited_worker_file(metrics_fn: str) -> bool:
+    """
+    Check if the request metrics file belongs to a worker of this host that is not running anymore.
+
+    Files of workers on other hosts sharing the directory cannot be verified, and are left to their own host.
+    """
+    name = os.path.splitext(os.path.basename(metrics_fn))[0]
+    parts = name[len("requests-"):].rsplit("-", 2)
+    if len(parts) != 3 or parts[0] != socket.gethostname() or not parts[1].isdigit():
+        return False
+    return not is_process_alive(int(parts[1]))
+
+
+def write_request_metrics(metrics_fn: str, content: str) -> None:
+    """
+    Replace the request metrics file atomically, such that readers never obtain a partially written one.
+    """
+    with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(metrics_fn), suffix=".tmp", delete=False) as tmp_file:
+        tmp_file.write(content)
+    os.chmod(tmp_file.name, SHARED_FILE_MODE)
+    os.replace(tmp_file.name, metrics_fn)
+
+
+def read_request_metrics(metrics_fn: str) -> Optional[RequestMetrics]:
+    try:
+        with open(metrics_fn, mode="r", encoding="utf-8") as metrics_file:
+            return json.load(metrics_file)
+    except (OSError, ValueError):  # removed or partially written by another process
+        return None
+
+
+def merge_request_metrics(total: RequestMetrics, metrics: RequestMetrics) -> None:
+    """
+    Add the request metrics to the total.
+    """
+    for key, count in metrics.get("count", {}).items():
+        total["count"][key] = total["count"].get(key, 0) + count
+    for endpoint, latency in metrics.get("latency", {}).items():
+        if len(latency) != len(REQUEST_LATENCY_BUCKETS) + 2:
+            continue  # incompatible buckets from a previous version
+        current = total["latency"].setdefault(endpoint, [0] * (len(REQUEST_LATENCY_BUCKETS) + 1) + [0.0])
+        total["latency"][endpoint] = [cur + val for cur, val in zip(current, latency)]
+
+
+@contextlib.contextmanager
+def lock_request_metrics(metrics_dir: str, exclusive: bool = False) -> Iterator[None]:
+    """
+    Lock the archive of request metrics, exclusively to modify it, or shared to read it with the files of workers.
+    """
+    os.makedirs(metrics_dir, exist_ok=True)
+    with open(os.path.join(metrics_dir, REQUEST_METRICS_LOCK_FILE), mode="a", encoding="utf-8") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def archive_request_metrics(metrics_dir: str, metrics_fn: str, metrics: Optional[RequestMetrics] = None) -> None:
+    """
+    Fold the request metrics of an exited worker into the archive, and remove its file.
+
+    Both are done while holding the lock, such that concurrent aggregations never count them twice or miss them.
+
+    :param metrics: Metrics of the worker, read from its file if not provided.
+    """
+    with lock_request_metrics(metrics_dir, exclusive=True):
+        if metrics is None:
+            metrics = read_request_metrics(metrics_fn)
+            if metrics is None:
+                return  # already archived by another worker
+        archive_fn = os.path.join(metrics_dir, REQUEST_METRICS_ARCHIVE_FILE)
+        archive: RequestMetrics = read_request_metrics(archive_fn) or {"count": {}, "latency": {}}
+        merge_request_metrics(archive, metrics)
+        write_request_metrics(archive_fn, json.dumps(archive))
+        try:
+            os.remove(metrics_fn)
+        except FileNotFoundError:
+            pass
+
+
+def aggregate_request_metrics() -> RequestMetrics:
+    """
+    Aggregate the request metrics files of every worker, and the archive of exited ones.
+    """
+    REQUEST_METRICS.flush()
+    metrics_dir = get_metrics_directory()
+    pattern = os.path.join(metrics_dir, REQUEST_METRICS_FILE_PATTERN)
+    for metrics_fn in sorted(glob.glob(pattern)):
+        if is_exited_worker_file(metrics_fn):
+            archive_request_metrics(metrics_dir, metrics_fn)
+
+    total: RequestMetrics = {"count": {}, "latency": {}}
+    with lock_request_metrics(metrics_dir):
+        metrics_files = sorted(glob.glob(pattern)) + [os.path.join(metrics_dir, REQUEST_METRICS_ARCHIVE_FILE)]
+        for metrics_fn in metrics_files:
+            metrics = read_request_metrics(metrics_fn)
+            if metrics is not None:
+                merge_request_metrics(total, metrics)
+    return total
+
+
+def generate_metrics() -> str:
+    """
+    Generate the metrics in the Prometheus text exposition format.
+    """
+    lines = []
+
+    def add_metric(name: str, metric_type: str, description: str, samples: List[Tuple[str, float]]) -> None:
+        name = f"{METRICS_PREFIX}_{name}"
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for suffix_labels, value in samples:
+            lines.append(f"{name}{suffix_labels} {_number(value)}")
+
+    snapshot = get_metrics_snapshot()
+    now = time.time()
+
+    add_metric(
+        "route_invocations_total", "counter",
+        "Invocations of the service or platform counted from the access logs.",
+        [(_labels(route=route), invocations) for route, invocations, _ in snapshot["routes"]],
+    )
+    add_metric(
+        "route_last_access_timestamp_seconds", "gauge",
+        "Time of the last access to the service or platform found in the access logs.",
+        [(_labels(route=route), last_access) for route, _, last_access in snapshot["routes"] if last_access],
+    )
+    add_metric(
+        "component_up", "gauge",
+        "Whether the monitored component responded as expected (1) or not (0).",
+        [
+            (_labels(route=route, component=component), int(status == Status.ok))
+            for route, component, status, _ in snapshot["components"]
+        ],
+    )
+    add_metric(
+        "component_status", "gauge",
+        "Status of the monitored component, with value 1 for the current status.",
+        [
+            (_labels(route=route, component=component, status=status_value), int(status == status_value))
+            for route, component, status, _ in snapshot["components"]
+            for status_value in (Status.ok, Status.bad, Status.down)
+        ],
+    )
+    add_metric(
+        "component_probe_duration_seconds", "gauge",
+        "Duration of the last probe of the monitored component.",
+        [
+            (_labels(route=route, component=component), duration)
+            for route, component, _, duration in snapshot["components"] if duration is not None
+        ],
+    )
+    add_metric(
+        "cron_last_execution_timestamp_seconds", "gauge",
+        "Time of the last execution of the cron job.",
+        [(_labels(job=job), last_exec) for job, last_exec, _ in snapshot["cron"] if last_exec],
+    )
+    add_metric(
+        "cron_lag_seconds", "gauge",
+        "Time elapsed since the last execution of the cron job.",
+        [(_labels(job=job), max(now - last_exec, 0.0)) for job, last_exec, _ in snapshot["cron"] if last_exec],
+    )
+    add_metric(
+        "cron_duration_seconds", "gauge",
+        "Duration of the last execution of the cron job.",
+        [(_labels(job=job), duration) for job, _, duration in snapshot["cron"] if duration is not None],
+    )
+
+    latency_tracker = getattr(APP.wsgi_app, "latency", None)  # see 'ReverseProxied' instrumentation
+    if APP.config.get("INSTRUMENTATION", {}).get("enabled", False) and latency_tracker is not None:
+        worker = str(os.getpid())
+        add_metric(
+            "http_request_latency_percentile_seconds", "gauge",
+            "Latency percentiles over the latest requests handled by the worker.",
+            [
+                (_labels(endpoint=endpoint, quantile=quantile, worker=worker), value)
+                for endpoint, percentiles in sorted(latency_tracker.percentiles().items())
+                for quantile, value in percentiles.items() if quantile != "count"
+            ],
+        )
+
+    requests = aggregate_request_metrics()
+    count_samples = []
+    for key, count in sorted(requests["count"].items()):
+        endpoint, method, code = key.rsplit(" ", 2)
+        count_samples.append((_labels(endpoint=endpoint, method=method, code=code), count))
+    add_metric("http_requests_total", "counter", "Requests handled by the application.", count_samples)
+
+    latency_samples = []
+    for endpoint, latency in sorted(requests["latency"].items()):
+        cumulative = 0
+        for bound, count in zip(REQUEST_LATENCY_BUCKETS + ("+Inf", ), latency[:-1]):
+            cumulative += count
+            latency_samples.append((f"_bucket{_labels(endpoint=endpoint, le=str(bound))}", cumulative))
+        latency_samples.append((f"_sum{_labels(endpoint=endpoint)}", latency[-1]))
+        latency_samples.append((f"_count{_labels(endpoint=endpoint)}", cumulative))
+    add_metric("http_request_duration_seconds", "histogram", "Latency of requests handled by the application.",
+               latency_samples)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# coding:utf-8
+"""
+Versioned migrations of the database schema.
+
+The schema file (``database_schema.sql``) always describes the latest schema, and only creates what is missing from
+the database. Existing databases are then brought to the latest schema by applying the migrations that were not
+recorded in their ``schema_version`` table yet, in order of version, without losing their data.
+
+Every migration is applied in its own transaction, together with the record of its version, such that a failing
+migration leaves the database at the previous version. The transaction is started immediately with a write lock, such
+that concurrent processes (workers, cron jobs) wait for the migration in progress and then skip it.
+
+Since migrations are also applied to databases just created from the latest schema, their steps must not fail when
+their changes are already present (e.g.: ``CREATE INDEX IF NOT EXISTS``, :func:`add_column`).
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import sqlite3
+import time
+from typing import Callable, List, Sequence, Tuple, Union
+
+# -- Project specific --------------------------------------------------------
+from canarieapi.settings import get_logger
+
+MigrationStep = Union[str, Callable[[sqlite3.Connection], None]]  # SQL statement or function applying the change
+Migration = Tuple[int, str, List[MigrationStep]]  # version, description, steps
+
+
+def add_column(table: str, column: str, definition: str) -> MigrationStep:
+    """
+    Step adding a column to a table, unless it already has it.
+    """
+    def step(database: sqlite3.Connection) -> None:
+        columns = [row[1] for row in database.execute(f"pragma table_info([{table}])")]
+        if column not in columns:
+            database.execute(f"alter table [{table}] add column [{column}] {definition}")
+    return step
+
+
+MIGRATIONS: List[Migration] = [
+    (1, "Index the last access of routes, looked up by the log parsing job", [
+        "CREATE INDEX IF NOT EXISTS [stats_last_access] ON [stats] ([last_access])",
+    ]),
+]
+LATEST_SCHEMA_VERSION = max(version for version, _, _ in MIGRATIONS)
+
+
+def get_schema_version(database: sqlite3.Connection) -> int:
+    """
+    Obtain the version of the latest migration applied to the database (0 if none).
+    """
+    try:
+        return database.execute("select max(version) from schema_version").fetchone()[0] or 0
+    except sqlite3.OperationalError as exc:
+        if "no such table" in str(exc):
+            return 0
+        raise
+
+
+def migrate_db(database: sqlite3.Connection, migrations: Sequence[Migration] = MIGRATIONS) -> List[int]:
+    """
+    Apply the pending migrations to the database.
+
+    :returns: Versions of the migrations applied by this call.
+    """
+    logger = get_logger()
+    migrations = sorted(migrations, key=lambda migration: migration[0])
+    if not migrations or get_schema_version(database) >= migrations[-1][0]:
+        return []
+    if database.in_transaction:
+        database.commit()
+    database.execute(
+        "CREATE TABLE IF NOT EXISTS [schema_version] ([version] INTEGER PRIMARY KEY, [description] TEXT, "
+        "[applied] DATETIME)"
+    )
+    applied = []
+    for version, description, steps in migrations:
+        start = time.perf_counter()
+        database.execute("begin immediate")  # others wait for this migration, then find it applied
+        try:
+            if version <= get_schema_version(database):
+                database.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(database)
+                else:
+                    database.execute(step)
+            database.execute(
+                "insert into schema_version (version, description, applied) values (?, ?, CURRENT_TIMESTAMP)",
+                [version, description],
+            )
+            database.commit()
+        except Exception as exc:
+            database.rollback()
+            logger.error("Failed to migrate the database to version %s (%s): %s", version, description, exc)
+            raise
+        logger.info("Migrated the database to version %s (%s) in %.3fs.",
+                    version, description, time.perf_counter() - start)
+        applied.append(version)
+    return applied
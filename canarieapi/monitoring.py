@@ -1,17 +1,27 @@
 # -- Standard lib ------------------------------------------------------------
+import argparse
+import copy
+import datetime
+import graphlib
+import hashlib
+import json
 import re
+import socket
 import sqlite3
-from typing import Dict, Optional, Tuple, Union
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set, Tuple, Union
 from typing_extensions import Literal, NotRequired, Required, TypedDict
-
-# -- 3rd party modules -------------------------------------------------------
-import requests
-from requests.exceptions import ConnectionError, Timeout  # pylint: disable=W0622
+from urllib.parse import urlsplit, urlunsplit
 
 # -- Project specific --------------------------------------------------------
-from canarieapi.app_object import APP
+from canarieapi.database import retry_db_error_after_init
+from canarieapi.scheduler import ProbeScheduler
+from canarieapi.settings import get_config, get_logger
+from canarieapi.sharding import HashRing, release_worker_lease, renew_worker_lease
+from canarieapi.snapshot import publish_snapshot
 from canarieapi.status import Status
-from canarieapi.utility_rest import JSON, get_db, retry_db_error_after_init
+from canarieapi.storage import StorageBackend, get_storage
+from canarieapi.typedefs import JSON
 
 Number = Union[float, int]
 RequestConfig = TypedDict("RequestConfig", {
@@ -35,100 +45,626 @@ RequestConfig = TypedDict("RequestConfig", {
 ResponseConfig = TypedDict("ResponseConfig", {
     "status_code": NotRequired[Optional[int]],
     "text": NotRequired[Optional[str]],
+    "max_latency": NotRequired[Optional[Number]],
+    "min_cert_days": NotRequired[Optional[Number]],
+}, total=True)
+ProbeKind = Literal["http", "http-head", "tcp", "tls"]
+ProbeTiming = TypedDict("ProbeTiming", {
+    "total": float,  # durations in seconds
+    "connect": float,  # TCP connection
+    "tls": float,  # TLS handshake
+    "ttfb": float,  # time to first byte (response headers), including the connection
+    "bytes": int,  # amount of data read
+}, total=True)
+LatencyInfo = TypedDict("LatencyInfo", {
+    "total": float,  # durations in milliseconds
+    "connect": float,
+    "tls": float,
+    "ttfb": float,
+    "bytes": int,
+    "p50": float,
+    "p95": float,
+    "p99": float,
+    "samples": int,
 }, total=True)
+ProbeCache = TypedDict("ProbeCache", {
+    "etag": Optional[str],  # validators of the latest successful response
+    "last_modified": Optional[str],
+    "not_modified": bool,  # whether the latest probe obtained '304 Not Modified'
+}, total=True)
+MonitorSummary = TypedDict("MonitorSummary", {
+    "components": int,  # number of monitored components
+    "probes": int,  # number of probes performed
+    "deduplicated": int,  # number of components obtaining their status from the identical probe of another one
+    "skipped": int,  # number of components not probed because the time budget was exceeded
+    "pruned": int,  # number of components not probed because one of their dependencies is down
+    "workers": int,  # number of monitoring workers sharing the components
+    "not_modified": int,  # number of probes answered by '304 Not Modified' to their conditional request
+    "queue_wait": float,  # longest duration a probe waited for its turn in the scheduler queue
+    "status": Dict[str, int],  # count of components per resulting status
+    "duration": float,
+    "write_duration": float,  # duration of storing the results in the database
+}, total=True)
+ComponentId = Tuple[str, str]  # route, name
+# request, expected response, kind and components of a distinct probe
+ProbeEntry = Tuple[RequestConfig, ResponseConfig, ProbeKind, List[ComponentId]]
+ProbeResult = Tuple[Status, str, ProbeTiming]
+
+DEFAULT_REQUEST: RequestConfig = {
+    "timeout": 5,
+    "headers": {},
+    "params": None,
+    "data": None,
+    "json": None,
+    "method": "get",
+    "url": "http://google.com"
+}
+DEFAULT_RESPONSE: ResponseConfig = {
+    "status_code": 200,
+    "text": None,
+    "max_latency": None,
+    "min_cert_days": None
+}
+# seconds, unless specified by the request or MONITORING["timeouts"]
+DEFAULT_TIMEOUTS = {"http": 5, "http-head": 5, "tcp": 2, "tls": 3}
+# maximum length of validators kept from responses for conditional requests
+MAX_VALIDATOR_LENGTH = 256
+# unless specified by MONITORING["scheduler"] and MONITORING["sharding"]
+DEFAULT_SCHEDULER = {"max_workers": 16, "max_per_host": 4, "rate": None, "burst": None}
+DEFAULT_SHARDING = {"enabled": False, "worker": None, "lease": 300, "virtual_nodes": 64}
+
+
+def make_monitor_summary(components: int = 0, workers: int = 1) -> MonitorSummary:
+    """
+    Build an empty summary of a monitoring job, before any component is probed.
+    """
+    return {"components": components, "probes": 0, "deduplicated": 0, "skipped": 0, "pruned": 0,
+            "workers": workers, "not_modified": 0, "status": {}, "queue_wait": 0.0, "duration": 0.0,
+            "write_duration": 0.0}
 
 
 @retry_db_error_after_init
-def monitor(*, update_db: bool = True, database: Optional[sqlite3.Connection] = None) -> None:
+def monitor(
+    *,
+    update_db: bool = True,
+    database: Optional[sqlite3.Connection] = None,
+    budget: Optional[float] = None,
+    progress: Optional[Callable[[MonitorSummary], None]] = None,
+    worker: Optional[str] = None,
+) -> MonitorSummary:
+    """
+    Probe every monitored component of services and platforms, and store their status in the database.
+
+    :param update_db: Whether to store the resulting statuses.
+    :param database: Database connection to employ instead of the application one.
+    :param budget:
+        Maximum duration (seconds) a component can wait to be probed once its dependencies are probed.
+        Components waiting longer are skipped (their previous status is preserved).
+    :param progress: Called with the ongoing summary after each probe.
+    :param worker:
+        Name of the monitoring worker when components are shared by several ones (see :mod:`canarieapi.sharding`).
+        Only the components of its shard are probed, and those of the other workers are left untouched.
+
+    Probes are performed in parallel, limited per host and globally by ``MONITORING["scheduler"]`` settings, and the
+    time each one waited for its turn is stored along its duration. Components with ``depends_on`` are only probed
+    once the components they depend on are, and are considered ``down`` without being probed if any of them is.
+    Unless disabled by ``MONITORING["conditional_requests"]``, HTTP probes send conditional requests with the validators
+    of their latest successful response (see :func:`probe_service`), which are stored when updating the database.
+    """
     # Load config
-    logger = APP.logger
-    config = APP.config
+    logger = get_logger()
+    config = get_config()
     logger.info("Loading configuration")
+    settings = config.get("MONITORING", {})
+    latency_threshold = settings.get("latency_threshold")
+    cert_expiry_days = settings.get("cert_expiry_days")
     srv_mon = {route: config["SERVICES"][route]["monitoring"] for route in config["SERVICES"]}
     pf_mon = {route: config["PLATFORMS"][route]["monitoring"] for route in config["PLATFORMS"]}
     all_mon = srv_mon
     all_mon.update(pf_mon)
 
+    # components monitored with identical requests, expected responses and dependencies are probed once
+    component_dependencies = get_component_dependencies(all_mon)
+    probes: Dict[str, ProbeEntry] = {}
+    probe_keys: Dict[ComponentId, str] = {}
+    for route in all_mon:
+        for service, test_dic in all_mon[route].items():
+            kind = test_dic.get("kind", "http")
+            response = dict(test_dic.get("response", {}))
+            response.setdefault("max_latency", latency_threshold)
+            if kind == "tls":
+                response.setdefault("min_cert_days", cert_expiry_days)
+            depends_on = component_dependencies.get((route, service), [])
+            key = get_probe_key(test_dic["request"], response, kind, depends_on)
+            probes.setdefault(key, (test_dic["request"], response, kind, []))[3].append((route, service))
+            probe_keys[(route, service)] = key
+
+    db = database
+    all_probes = probes
+    workers = 1
+    if worker is not None:
+        sharding = dict(DEFAULT_SHARDING, **settings.get("sharding", {}))
+        live_workers = renew_worker_lease(db, worker, sharding["lease"])
+        workers = len(live_workers)
+        ring = HashRing(live_workers, sharding["virtual_nodes"])
+        shard_keys = get_probe_shard_keys(all_probes, probe_keys, component_dependencies)
+        probes = {key: entry for key, entry in all_probes.items() if ring.get_node(shard_keys[key]) == worker}
+        logger.info("Monitoring shard of worker [%s] among %s workers: %s of %s probes.",
+                    worker, workers, len(probes), len(all_probes))
+
     logger.info("Checking status of routes...")
-    with APP.app_context():
-        if update_db:
-            db = database or get_db()
-            cur = db.cursor()
-            query = "insert or replace into status (route, service, status, message) values (?, ?, ?, ?)"
-
-        for route in all_mon:
-            for service, test_dic in all_mon[route].items():
-                try:
-                    status, message = check_service(request=test_dic["request"],
-                                                    response=test_dic.get("response", {}))
-                except Exception:
-                    logger.error("Exception occurs while trying to check status of %s.%s", route, service)
-                    raise
-                logger.info("%s.%s : %s", route, service, Status.pretty_msg(status))
-
-                if update_db:
-                    values = [route, service, status, (message[0:253] + "...") if len(message) > 256 else message]
-                    cur.execute(query, values)
-
-        if update_db:
-            cur.execute("insert or replace into cron (job, last_execution) values ('status', CURRENT_TIMESTAMP)")
-            db.commit()
-            db.close()
-
-
-def check_service(request: RequestConfig, response: ResponseConfig) -> Tuple[Status, str]:
-    default_request: RequestConfig = {
-        "timeout": 5,
-        "headers": {},
-        "params": None,
-        "data": None,
-        "json": None,
-        "method": "get",
-        "url": "http://google.com"
+    job_start = time.perf_counter()
+    components = sum(len(probe_components) for _, _, _, probe_components in probes.values())
+    summary = make_monitor_summary(components=components, workers=workers)
+    # results are written once all components are probed to avoid locking the database while waiting for them
+    status_rows = []
+    timing_rows = []
+    queue_rows = []
+    latency_rows: Dict[Tuple[str, str], ProbeTiming] = {}
+
+    # validators of the latest successful responses of probes, sent as conditional requests
+    probe_cache: Dict[str, ProbeCache] = {}
+    if update_db and settings.get("conditional_requests", True):
+        probe_cache = load_probe_cache(db, probes)
+
+    scheduler_settings = dict(DEFAULT_SCHEDULER, **settings.get("scheduler", {}))
+    scheduler: ProbeScheduler[str, ProbeResult] = ProbeScheduler(**scheduler_settings)
+
+    def probe(key: str) -> ProbeResult:
+        request, response, kind, probe_components = probes[key]
+        try:
+            return probe_service(request=request, response=response, kind=kind, cache=probe_cache.get(key))
+        except Exception:
+            names = ", ".join(f"{route}.{service}" for route, service in probe_components)
+            logger.error("Exception occurs while trying to check status of %s.", names)
+            raise
+
+    # probes of components depending on others are started once those are completed, or not performed if one of them
+    # is down (components of a probe share the same dependencies)
+    probe_index = {key: index for index, key in enumerate(probes)}
+    dependencies = {}
+    for key, (_, _, _, probe_components) in probes.items():
+        parents = {probe_index[probe_keys[parent]] for parent in component_dependencies.get(probe_components[0], [])}
+        dependencies[probe_index[key]] = parents - {probe_index[key]}
+    pruned: Set[str] = set()
+
+    def prune(key: str, parent_key: str, result: ProbeResult) -> Optional[ProbeResult]:
+        if result[0] != Status.down:
+            return None
+        pruned.add(key)
+        depends_on = component_dependencies[probes[key][3][0]]
+        names = ", ".join(
+            f"{route}.{service}" for route, service in probes[parent_key][3] if (route, service) in depends_on
+        )
+        timing: ProbeTiming = {"total": 0.0, "connect": 0.0, "tls": 0.0, "ttfb": 0.0, "bytes": 0}
+        return Status.down, f"Dependency down: {names}", timing
+
+    scheduled = [(get_probe_host(request), key) for key, (request, _, _, _) in probes.items()]
+    for key, result, queue_wait, probe_duration in scheduler.run(scheduled, probe, budget, dependencies, prune):
+        probe_components = probes[key][3]
+        if result is None:
+            summary["skipped"] += len(probe_components)
+            continue
+        status, message, timing = result
+        probed = key not in pruned
+        if probed:
+            summary["probes"] += 1
+            summary["not_modified"] += int(probe_cache.get(key, {}).get("not_modified", False))
+            summary["deduplicated"] += len(probe_components) - 1
+            summary["queue_wait"] = max(summary["queue_wait"], queue_wait)
+        else:
+            summary["pruned"] += len(probe_components)
+
+        for route, service in probe_components:
+            logger.info("%s.%s : %s", route, service, Status.pretty_msg(status))
+            summary["status"][status] = summary["status"].get(status, 0) + 1
+            if update_db:
+                values = [route, service, status, (message[0:253] + "...") if len(message) > 256 else message]
+                status_rows.append(values)
+                if probed:
+                    timing_rows.append([route, service, probe_duration])
+                    queue_rows.append([route, service, queue_wait])
+                    latency_rows[(route, service)] = timing
+        if progress:
+            progress(summary)
+
+    if summary["deduplicated"]:
+        logger.info("Saved %s probes of components monitored with identical requests.", summary["deduplicated"])
+    if summary["pruned"]:
+        logger.warning("Marked %s components down without probing them since a dependency is down.",
+                       summary["pruned"])
+    if summary["skipped"]:
+        logger.warning("Time budget of %ss exceeded, skipped %s components.", budget, summary["skipped"])
+
+    summary["duration"] = time.perf_counter() - job_start
+    if update_db:
+        write_start = time.perf_counter()
+        storage = get_storage(db)
+        storage.update_statuses(status_rows)
+        storage.update_timings(timing_rows)
+        update_latency(storage, latency_rows, max(int(settings.get("latency_samples", 100)), 1))
+        cur = db.cursor()
+        cur.executemany("insert or replace into status_queue (route, service, wait) values (?, ?, ?)", queue_rows)
+        # only entries of the current probes are kept, which bounds the cache to one entry per component
+        cur.execute("select probe from probe_cache")
+        configured = {get_probe_cache_id(key) for key in all_probes}
+        owned = {get_probe_cache_id(key) for key in probes}
+        cur.executemany("delete from probe_cache where probe = ?",
+                        [[probe_id] for probe_id, in cur.fetchall() if probe_id in owned or probe_id not in configured])
+        cur.executemany(
+            "insert or replace into probe_cache (probe, etag, last_modified) values (?, ?, ?)",
+            [[get_probe_cache_id(key), cache["etag"], cache["last_modified"]]
+             for key, cache in probe_cache.items() if cache["etag"] or cache["last_modified"]],
+        )
+        storage.update_cron("status", summary["duration"])
+        storage.commit()
+        db.commit()  # other tables remain in the database with any storage backend
+        summary["write_duration"] = time.perf_counter() - write_start
+        publish_snapshot(db)
+    return summary
+
+
+def update_latency(
+    storage: StorageBackend,
+    timings: Dict[Tuple[str, str], ProbeTiming],
+    max_samples: int,
+) -> None:
+    """
+    Store the latest probe timings of components and add their total duration to their rolling latency samples.
+    """
+    routes = sorted({route for route, _ in timings})
+    samples = {
+        (route, service): json.loads(values or "[]")
+        for route, service, *_, values in (storage.get_latency(routes) if routes else [])
     }
-    default_request.update(request)
+    rows = []
+    for (route, service), timing in timings.items():
+        values = samples.get((route, service), []) + [round(timing["total"], 6)]
+        rows.append((route, service, timing["total"], timing["connect"], timing["tls"], timing["ttfb"],
+                     timing["bytes"], json.dumps(values[-max_samples:])))
+    storage.update_latency(rows)
+
+
+def get_probe_shard_keys(
+    probes: Mapping[str, ProbeEntry],
+    probe_keys: Mapping[ComponentId, str],
+    dependencies: Mapping[ComponentId, List[ComponentId]],
+) -> Dict[str, str]:
+    """
+    Obtain the key of the monitoring shard of every probe, which is the first of its components (``<route>/<name>``).
+
+    Probes of components depending on each other are grouped with the same key, such that the same worker performs
+    them and prunes the ones of components whose dependencies are down.
+    """
+    groups = {key: key for key in probes}
+
+    def find(key: str) -> str:
+        while groups[key] != key:
+            groups[key] = groups[groups[key]]
+            key = groups[key]
+        return key
+
+    for component, depends_on in dependencies.items():
+        for parent in depends_on:
+            groups[find(probe_keys[component])] = find(probe_keys[parent])
+    group_keys: Dict[str, str] = {}
+    for key, (_, _, _, probe_components) in probes.items():
+        group = find(key)
+        shard_key = min(f"{route}/{name}" for route, name in probe_components)
+        group_keys[group] = min(group_keys.get(group, shard_key), shard_key)
+    return {key: group_keys[find(key)] for key in probes}
+
+
+def get_probe_cache_id(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
 
-    default_response: ResponseConfig = {
-        "status_code": 200,
-        "text": None
+
+def load_probe_cache(db: sqlite3.Connection, probes: Mapping[str, ProbeEntry]) -> Dict[str, ProbeCache]:
+    """
+    Obtain the validators of the latest successful responses of the probes that can perform conditional requests.
+    """
+    cur = db.cursor()
+    cur.execute("select probe, etag, last_modified from probe_cache")
+    rows = {probe_id: (etag, last_modified) for probe_id, etag, last_modified in cur.fetchall()}
+    cache: Dict[str, ProbeCache] = {}
+    for key, (request, response, kind, _) in probes.items():
+        if is_conditional_probe(request, response, kind):
+            etag, last_modified = rows.get(get_probe_cache_id(key), (None, None))
+            cache[key] = {"etag": etag, "last_modified": last_modified, "not_modified": False}
+    return cache
+
+
+def get_validator(value: Optional[str]) -> Optional[str]:
+    """
+    Obtain the response validator to keep for conditional requests, ignoring unexpectedly large ones.
+    """
+    return value if value and len(value) <= MAX_VALIDATOR_LENGTH else None
+
+
+def is_conditional_probe(request: RequestConfig, response: ResponseConfig, kind: ProbeKind) -> bool:
+    """
+    Whether the probe can employ conditional requests, such that a ``304 Not Modified`` response indicates that the
+    expected response is unchanged.
+    """
+    method = str(request.get("method", DEFAULT_REQUEST["method"])).upper()
+    headers = {name.lower() for name in request.get("headers") or {}}
+    return (
+        kind in ("http", "http-head")
+        and method in ("GET", "HEAD")
+        and response.get("status_code", DEFAULT_RESPONSE["status_code"]) == 200
+        and not headers & {"if-none-match", "if-modified-since"}
+    )
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+
+def make_latency_info(timing: ProbeTiming, samples: List[float]) -> LatencyInfo:
+    """
+    Report the latest probe timing and the latency percentiles of a component, in milliseconds.
+    """
+    return {
+        "total": round(timing["total"] * 1000, 3),
+        "connect": round(timing["connect"] * 1000, 3),
+        "tls": round(timing["tls"] * 1000, 3),
+        "ttfb": round(timing["ttfb"] * 1000, 3),
+        "bytes": timing["bytes"],
+        "p50": round(percentile(samples, 0.50) * 1000, 3),
+        "p95": round(percentile(samples, 0.95) * 1000, 3),
+        "p99": round(percentile(samples, 0.99) * 1000, 3),
+        "samples": len(samples),
     }
-    default_response.update(response)
 
-    logger = APP.logger
+
+def normalize_url(url: str) -> str:
+    """
+    Normalize the case of the scheme and host of the URL, and remove its default port.
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.rsplit("@", 1)
+    host = netloc[-1].lower()
+    default_port = {"http": ":80", "https": ":443"}.get(scheme)
+    if default_port and host.endswith(default_port):
+        host = host[:-len(default_port)]
+    netloc[-1] = host
+    return urlunsplit((scheme, "@".join(netloc), parts.path or "/", parts.query, parts.fragment))
+
+
+def get_probe_key(
+    request: RequestConfig,
+    response: ResponseConfig,
+    kind: ProbeKind = "http",
+    depends_on: Optional[List[ComponentId]] = None,
+) -> str:
+    """
+    Obtain the canonical representation of a probe, identical for equivalent requests, expected responses and
+    dependencies.
+    """
+    probe_request = dict(DEFAULT_REQUEST, **request)
+    probe_request["method"] = str(probe_request["method"]).upper()
+    probe_request["url"] = normalize_url(probe_request["url"])
+    probe_request["headers"] = {name.lower(): value for name, value in (probe_request["headers"] or {}).items()}
+    probe_response = dict(DEFAULT_RESPONSE, **response)
+    probe = [kind, probe_request, probe_response]
+    if depends_on:
+        probe.append(sorted(depends_on))
+    return json.dumps(probe, sort_keys=True, default=str)
+
+
+def get_component_dependencies(monitoring: Mapping[str, Mapping[str, Any]]) -> Dict[ComponentId, List[ComponentId]]:
+    """
+    Resolve the ``depends_on`` references of monitored components, by route.
+
+    References are either the name of a component of the same route, or ``<route>:<name>`` for components of other
+    services or platforms.
+
+    :raises ValueError: If a referenced component does not exist, or components depend on each other in a cycle.
+    """
+    dependencies: Dict[ComponentId, List[ComponentId]] = {}
+    for route, components in monitoring.items():
+        for name, component in components.items():
+            for reference in component.get("depends_on", []):
+                parent = tuple(reference.split(":", 1)) if ":" in reference else (route, reference)
+                if parent[1] not in monitoring.get(parent[0], {}):
+                    raise ValueError(
+                        f"Monitored component [{route}.{name}] depends on unknown component [{reference}]."
+                    )
+                dependencies.setdefault((route, name), []).append(parent)  # type: ignore
     try:
-        resp = requests.request(**default_request)
-    except (ConnectionError, Timeout) as exc:
-        url = default_request["url"]
-        message = f"Cannot reach {url} : {exc!s}"
-        logger.warning(message)
-        return Status.down, message
+        graphlib.TopologicalSorter(dependencies).prepare()
+    except graphlib.CycleError as exc:
+        cycle = " -> ".join(f"{route}.{name}" for route, name in exc.args[1])
+        raise ValueError(f"Monitored components depend on each other in a cycle: {cycle}.")
+    return dependencies
 
-    if resp.status_code != default_response["status_code"]:
-        message = "Bad return code from {0} (Expecting {1}, Got {2}".format(
-            default_request["url"],
-            default_response["status_code"],
-            resp.status_code)
-        logger.warning(message)
-        return Status.bad, message
-
-    if default_response["text"]:
-        text_regex = re.compile(default_response["text"])
-        if not resp.text or not text_regex.match(resp.text):
-            message = "Bad response content from {0} (Expecting : \n{1}\nGot : \n{2}".format(
-                default_request["url"],
-                default_response["text"],
-                resp.text)
+
+def get_probe_host(request: RequestConfig) -> str:
+    """
+    Obtain the host (and port) probed by the request, whose simultaneous probes are limited by the scheduler.
+    """
+    parts = urlsplit(normalize_url(request.get("url", DEFAULT_REQUEST["url"])))
+    return parts.netloc.rsplit("@", 1)[-1]
+
+
+def check_service(request: RequestConfig, response: ResponseConfig, kind: ProbeKind = "http") -> Tuple[Status, str]:
+    """
+    Probe the component and obtain its status and the message explaining it.
+    """
+    status, message, _ = probe_service(request, response, kind)
+    return status, message
+
+
+def probe_service(
+    request: RequestConfig,
+    response: ResponseConfig,
+    kind: ProbeKind = "http",
+    cache: Optional[ProbeCache] = None,
+) -> Tuple[Status, str, ProbeTiming]:
+    """
+    Probe the component and obtain its status, the message explaining it, and the timing of the probe.
+
+    Probes of kind ``http`` perform the request and validate the response, while ``http-head`` only validate the
+    status of a ``HEAD`` request. Probes of kind ``tcp`` only establish a connection, and ``tls`` also perform the
+    TLS handshake to validate the certificate and its expiry. Their timeout defaults to the one of their kind.
+
+    A component responding as expected is considered ``bad`` if its response took more than ``max_latency`` seconds.
+
+    :param cache:
+        Validators (``ETag``, ``Last-Modified``) of the latest successful response of the probe, sent as a conditional
+        request and updated according to its response. A ``304 Not Modified`` response is then considered as the
+        expected one without validating its content again, since it is unchanged.
+    """
+    default_request: RequestConfig = copy.deepcopy(DEFAULT_REQUEST)
+    timeouts = get_config().get("MONITORING", {}).get("timeouts", {})
+    default_request["timeout"] = timeouts.get(kind, DEFAULT_TIMEOUTS[kind])
+    default_request.update(request)
+
+    default_response: ResponseConfig = copy.deepcopy(DEFAULT_RESPONSE)
+    default_response.update(response)
+
+    logger = get_logger()
+    url = default_request["url"]
+    if kind in ("tcp", "tls"):
+        status, message, timing = probe_connection(default_request, default_response, kind)
+        if status != Status.ok:
             logger.warning(message)
-            return Status.bad, message
-    return Status.ok, ""
+            return status, message, timing
+    else:
+        # only loaded when probing components, importing requests is costly
+        from requests.exceptions import ConnectionError, Timeout  # pylint: disable=C0415,W0622
 
+        from canarieapi.probes import timed_request  # pylint: disable=C0415
 
-def cron_job() -> None:
-    logger = APP.logger
+        if kind == "http-head":
+            default_request["method"] = "head"
+        conditional = False
+        if cache is not None:
+            headers = dict(default_request["headers"] or {})
+            if cache["etag"]:
+                headers["If-None-Match"] = cache["etag"]
+            if cache["last_modified"]:
+                headers["If-Modified-Since"] = cache["last_modified"]
+            conditional = len(headers) > len(default_request["headers"] or {})
+            default_request["headers"] = headers
+            cache.update(etag=None, last_modified=None, not_modified=False)  # unless the response is successful
+        try:
+            resp, timing = timed_request(**default_request)
+        except (ConnectionError, Timeout) as exc:
+            message = f"Cannot reach {url} : {exc!s}"
+            logger.warning(message)
+            return Status.down, message, exc.probe_timing  # type: ignore
+
+        # unchanged since the latest successful response, whose validators are kept unless renewed
+        not_modified = conditional and resp.status_code == 304
+        if not_modified:
+            cache.update(
+                etag=get_validator(resp.headers.get("ETag") or headers.get("If-None-Match")),
+                last_modified=get_validator(resp.headers.get("Last-Modified") or headers.get("If-Modified-Since")),
+                not_modified=True,
+            )
+
+        if resp.status_code != default_response["status_code"] and not not_modified:
+            message = "Bad return code from {0} (Expecting {1}, Got {2}".format(
+                url,
+                default_response["status_code"],
+                resp.status_code)
+            logger.warning(message)
+            return Status.bad, message, timing
+
+        if default_response["text"] and kind == "http" and not not_modified:
+            text_regex = re.compile(default_response["text"])
+            if not resp.text or not text_regex.match(resp.text):
+                message = "Bad response content from {0} (Expecting : \n{1}\nGot : \n{2}".format(
+                    url,
+                    default_response["text"],
+                    resp.text)
+                logger.warning(message)
+                return Status.bad, message, timing
+
+        if cache is not None and not not_modified:
+            cache.update(
+                etag=get_validator(resp.headers.get("ETag")),
+                last_modified=get_validator(resp.headers.get("Last-Modified")),
+            )
+        message = ""
+
+    max_latency = default_response["max_latency"]
+    if max_latency is not None and timing["total"] > max_latency:
+        message = "Slow response from {0} (Expecting at most {1}s, Got {2:.3f}s)".format(
+            url,
+            max_latency,
+            timing["total"])
+        logger.warning(message)
+        return Status.bad, message, timing
+    return Status.ok, message, timing
+
+
+def probe_connection(request: RequestConfig, response: ResponseConfig,
+                     kind: ProbeKind) -> Tuple[Status, str, ProbeTiming]:
+    """
+    Probe the component with a TCP connection, and optionally a TLS handshake.
+
+    The expiry of a valid certificate is reported by the message, and the component is considered ``bad`` if it
+    expires within ``min_cert_days`` days.
+    """
+    import ssl  # pylint: disable=C0415
+
+    from canarieapi.probes import tcp_probe, tls_probe  # pylint: disable=C0415
+
+    url = request["url"]
+    timeout = request["timeout"]
+    timeout = timeout[0] if isinstance(timeout, (list, tuple)) else timeout
+    try:
+        if kind == "tcp":
+            return Status.ok, "", tcp_probe(url, timeout)
+        timing, expiry = tls_probe(url, timeout, request.get("verify", True))
+    except ssl.SSLCertVerificationError as exc:
+        return Status.bad, f"Invalid certificate from {url} : {exc!s}", exc.probe_timing  # type: ignore
+    except OSError as exc:
+        return Status.down, f"Cannot reach {url} : {exc!s}", exc.probe_timing  # type: ignore
+    except ValueError as exc:
+        return Status.down, str(exc), {"total": 0.0, "connect": 0.0, "tls": 0.0, "ttfb": 0.0, "bytes": 0}
+
+    if expiry is None:
+        return Status.ok, "", timing
+    days = (expiry - datetime.datetime.now(datetime.timezone.utc)).total_seconds() / 86400
+    min_days = response["min_cert_days"]
+    if min_days is not None and days < min_days:
+        message = "Certificate of {0} expires in {1:.1f} days (Expecting at least {2})".format(url, days, min_days)
+        return Status.bad, message, timing
+    return Status.ok, f"Certificate expires on {expiry.isoformat()} ({days:.0f} days)", timing
+
+
+def cron_job(worker: Optional[str] = None) -> None:
+    """
+    Probe monitored components, or only the shard of the worker when ``MONITORING["sharding"]`` is enabled.
+
+    :param worker: Name of the monitoring worker, unique among all workers (defaults to the configured or host name).
+    """
+    logger = get_logger()
     logger.info("Cron job for monitoring routes status")
-    monitor()
+    sharding = dict(DEFAULT_SHARDING, **get_config().get("MONITORING", {}).get("sharding", {}))
+    monitor(worker=get_worker_name(worker) if sharding["enabled"] else None)
     logger.info("Done")
 
 
+def get_worker_name(worker: Optional[str] = None) -> str:
+    """
+    Obtain the name of the monitoring worker, unless specified, from the configuration or the host name.
+    """
+    return worker or get_config().get("MONITORING", {}).get("sharding", {}).get("worker") or socket.gethostname()
+
+
 if __name__ == "__main__":
-    cron_job()
+    parser = argparse.ArgumentParser(description="Probe the components monitored by services and platforms.")
+    parser.add_argument("--worker", help="Name of the monitoring worker when sharding is enabled.")
+    parser.add_argument("--release", action="store_true",
+                        help="Release the shard of the worker, to be taken over by others, instead of probing.")
+    args = parser.parse_args()
+    if args.release:
+        release_worker_lease(get_worker_name(args.worker))
+    else:
+        cron_job(worker=args.worker)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# coding:utf-8
+"""
+Precompiled responses.
+
+This module precomputes the responses of routes that only depend on the application configuration
+(home page and ``info`` routes of every service and platform), such that they can be served straight from memory
+without rebuilding their content on every request.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import collections
+import datetime
+import gzip
+import threading
+from typing import Dict, Optional, Tuple
+
+# -- 3rd party ---------------------------------------------------------------
+from flask import Response, render_template, request
+
+# -- Project specific --------------------------------------------------------
+from canarieapi import __meta__
+from canarieapi.app_object import APP
+from canarieapi.schema import CONFIGURATION_SCHEMA
+from canarieapi.utility_rest import (
+    JSON,
+    APIType,
+    get_api_title,
+    get_not_modified_response,
+    hash_content,
+    make_etag,
+    request_wants_json,
+    set_cache_headers
+)
+
+# Maximum number of distinct script roots (see 'X-Script-Name' header) for which rendered HTML is kept in memory.
+# Since the header is provided by the client, this avoids unbounded memory growth from arbitrary values.
+MAX_HTML_SCRIPT_ROOTS = 8
+
+ConfigFingerprint = Tuple[JSON, JSON, Optional[str], Optional[str]]
+
+
+class PrecompiledResponse(object):
+    """
+    Response contents in every supported format, generated once from the configuration.
+
+    JSON content is serialized immediately. Since HTML links depend on the script root of the request, the HTML
+    content is rendered on first use for each script root and kept for following requests.
+    """
+
+    def __init__(self, content: JSON, template: str, compress: bool = True, **template_kwargs: JSON) -> None:
+        self.content = content
+        self.version = hash_content(content, template, template_kwargs)
+        self.compress = compress
+        self.template = template
+        self.template_kwargs = template_kwargs
+        self.json = APP.json.response(content).get_data()
+        self.json_gzip = gzip.compress(self.json) if compress else None
+        self.html: Dict[str, Tuple[bytes, Optional[bytes]]] = {}
+
+    def get_html(self) -> Tuple[bytes, Optional[bytes]]:
+        """
+        Obtain the rendered HTML content, and its compressed variant, for the script root of the current request.
+        """
+        script_root = request.script_root
+        html = self.html.get(script_root)
+        if html is None:
+            body = render_template(self.template, **self.template_kwargs).encode("utf-8")
+            html = (body, gzip.compress(body) if self.compress else None)
+            if len(self.html) < MAX_HTML_SCRIPT_ROOTS:
+                self.html[script_root] = html
+        return html
+
+    def make_response(self, last_modified: Optional[datetime.datetime] = None) -> Response:
+        """
+        Generate the response in the requested format, honouring conditional requests and compression.
+
+        The compressed variant is a distinct representation with its own strong entity tag, but a client holding
+        either variant is still up-to-date.
+        """
+        etag = make_etag(self.version)
+        etags = [etag]
+        use_gzip = False
+        if self.compress:
+            use_gzip = bool(request.accept_encodings["gzip"])
+            etags = [f"{etag}-gzip", etag] if use_gzip else [etag, f"{etag}-gzip"]
+        for candidate in etags:
+            not_modified = get_not_modified_response(candidate, last_modified)
+            if not_modified:
+                return not_modified
+
+        if request_wants_json():
+            body, body_gzip = self.json, self.json_gzip
+            mimetype = "application/json"
+        else:
+            body, body_gzip = self.get_html()
+            mimetype = "text/html"
+
+        response = Response(body, mimetype=mimetype)
+        if body_gzip is not None:
+            response.vary.add("Accept-Encoding")
+            if use_gzip:
+                response.set_data(body_gzip)
+                response.content_encoding = "gzip"
+        return set_cache_headers(response, etags[0], last_modified)
+
+
+class PrecompiledResponses(object):
+    """
+    Collection of precompiled responses for the home page and every service and platform ``info`` route.
+    """
+
+    def __init__(self) -> None:
+        config = APP.config
+        self.fingerprint = get_config_fingerprint()
+        compress = config.get("COMPRESS_STATIC_RESPONSES", True)
+
+        self.info: Dict[Tuple[APIType, str], PrecompiledResponse] = {}
+        home_content = {"Platforms": {}, "Services": {}}
+        for api_type, section in [("platform", "Platforms"), ("service", "Services")]:
+            info_categories = CONFIGURATION_SCHEMA["definitions"][f"{api_type}_info_schema"]["required"]
+            for route_name, route_config in config[f"{api_type.upper()}S"].items():
+                info = route_config.get("info", {})
+                home_content[section][info["name"]] = self._make_home_links(route_name, api_type, route_config)
+                self.info[(api_type, route_name)] = self._make_info(
+                    route_name, api_type, info, info_categories, compress
+                )
+
+        self.home = PrecompiledResponse(
+            home_content,
+            "home.html",
+            compress=compress,
+            Main_Title=config.get("SERVER_MAIN_TITLE", __meta__.__title__),
+            Title="Home",
+            Content=home_content,
+        )
+
+    def render_html(self) -> None:
+        """
+        Render the HTML content of every precompiled response for the script root of the current request.
+        """
+        self.home.get_html()
+        for info in self.info.values():
+            info.get_html()
+
+    @staticmethod
+    def _make_home_links(route_name: str, api_type: APIType, route_config: JSON) -> JSON:
+        hostname = APP.config["MY_SERVER_NAME"]
+        requests = sorted(["info", "stats", "status"] + list(route_config.get("redirect", {}).keys()))
+        return collections.OrderedDict([
+            (req, f"{hostname}/{route_name}/{api_type}/{req}")
+            for req in requests
+        ])
+
+    @staticmethod
+    def _make_info(
+        route_name: str,
+        api_type: APIType,
+        info_config: JSON,
+        info_categories: JSON,
+        compress: bool,
+    ) -> PrecompiledResponse:
+        info = collections.OrderedDict([
+            (category, info_config.get(category, ""))
+            for category in info_categories
+        ])
+        info_html = collections.OrderedDict(info)
+        info_html["tags"] = ", ".join(info_html["tags"])
+        return PrecompiledResponse(
+            info,
+            "default.html",
+            compress=compress,
+            Main_Title=get_api_title(route_name, api_type),
+            Title="Info",
+            Tags=info_html,
+        )
+
+
+def get_config_fingerprint() -> ConfigFingerprint:
+    """
+    Obtain a cheap fingerprint of the configuration objects that precompiled responses depend on.
+
+    Loaded configurations are considered immutable. Replacing them (e.g.: using ``APP.config.update``) changes the
+    fingerprint, which triggers the generation of new precompiled responses. The fingerprint holds references to the
+    configuration objects, rather than their ``id``, such that replaced objects cannot be freed and their ``id``
+    reused by the new ones while the fingerprint is in use.
+    """
+    config = APP.config
+    return (
+        config.get("SERVICES"),
+        config.get("PLATFORMS"),
+        config.get("MY_SERVER_NAME"),
+        config.get("SERVER_MAIN_TITLE"),
+    )
+
+
+def is_same_config_fingerprint(fingerprint: ConfigFingerprint, other: ConfigFingerprint) -> bool:
+    """
+    Compare fingerprints by identity of their configuration objects, avoiding a costly comparison of their contents.
+    """
+    return fingerprint[0] is other[0] and fingerprint[1] is other[1] and fingerprint[2:] == other[2:]
+
+
+_PRECOMPILED_RESPONSES: Optional[PrecompiledResponses] = None
+_PRECOMPILED_LOCK = threading.Lock()
+
+
+def load_precompiled_responses() -> PrecompiledResponses:
+    """
+    Generate the precompiled responses from the current configuration and make them the active ones.
+    """
+    global _PRECOMPILED_RESPONSES  # pylint: disable=W0603
+    with _PRECOMPILED_LOCK:
+        APP.logger.info("Precompiling configuration responses...")
+        _PRECOMPILED_RESPONSES = PrecompiledResponses()
+    return _PRECOMPILED_RESPONSES
+
+
+def get_precompiled_responses() -> PrecompiledResponses:
+    """
+    Obtain the active precompiled responses, generating them if the configuration was replaced since last time.
+    """
+    responses = _PRECOMPILED_RESPONSES
+    if responses is None or not is_same_config_fingerprint(responses.fingerprint, get_config_fingerprint()):
+        responses = load_precompiled_responses()
+    return responses
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# coding:utf-8
+"""
+Timed monitoring probes.
+
+HTTP requests are performed with ``requests`` through connection pools whose connections record the duration of the
+TCP connection and TLS handshake of the probe in progress, in addition to its time to first byte and amount of data
+read. Lightweight probes only establish a TCP connection, or also perform the TLS handshake to obtain the certificate.
+
+This module is only loaded when components are probed, since importing ``requests`` is costly.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import contextvars
+import datetime
+import socket
+import ssl
+import time
+from typing import Any, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+# -- 3rd party ---------------------------------------------------------------
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# -- Project specific --------------------------------------------------------
+from canarieapi.monitoring import ProbeTiming
+
+_PROBE_TIMING: "contextvars.ContextVar[Optional[ProbeTiming]]" = contextvars.ContextVar("probe_timing", default=None)
+
+
+def make_probe_timing() -> ProbeTiming:
+    return {"total": 0.0, "connect": 0.0, "tls": 0.0, "ttfb": 0.0, "bytes": 0}
+
+
+class TimedConnectionMixin(object):
+    """
+    Records the connection durations in the timing of the probe in progress, if any.
+    """
+
+    def _new_conn(self) -> socket.socket:
+        start = time.perf_counter()
+        try:
+            return super()._new_conn()  # type: ignore
+        finally:
+            timing = _PROBE_TIMING.get()
+            if timing is not None:
+                timing["connect"] += time.perf_counter() - start
+
+    def connect(self) -> None:
+        timing = _PROBE_TIMING.get()
+        connected = timing["connect"] if timing is not None else 0.0
+        start = time.perf_counter()
+        try:
+            super().connect()  # type: ignore
+        finally:
+            if timing is not None and isinstance(self, HTTPSConnection):
+                # anything else than the TCP connection is the TLS handshake
+                timing["tls"] += max(time.perf_counter() - start - (timing["connect"] - connected), 0.0)
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+
+def timed_request(**request: Any) -> Tuple[requests.Response, ProbeTiming]:
+    """
+    Perform the request with the parameters of ``requests.request``, and obtain its response and timing.
+
+    The timing is also provided along the exception if the request fails, as its ``probe_timing`` attribute.
+    """
+    timing = make_probe_timing()
+    token = _PROBE_TIMING.set(timing)
+    start = time.perf_counter()
+    try:
+        with requests.Session() as session:
+            adapter = TimedHTTPAdapter()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            try:
+                resp = session.request(**request)
+            except Exception as exc:
+                timing["total"] = time.perf_counter() - start
+                exc.probe_timing = timing  # type: ignore
+                raise
+            timing["ttfb"] = resp.elapsed.total_seconds()
+            content = resp.content
+            timing["total"] = time.perf_counter() - start
+            # amount received from the component, before decoding of its content
+            raw_bytes = resp.raw.tell() if hasattr(resp.raw, "tell") else 0
+            timing["bytes"] = raw_bytes or len(content or b"")
+            return resp, timing
+    finally:
+        _PROBE_TIMING.reset(token)
+
+
+DEFAULT_PORTS = {"http": 80, "https": 443, "tls": 443}
+
+
+def get_probe_address(url: str) -> Tuple[str, int]:
+    """
+    Obtain the host and port to connect to from the URL of the component.
+
+    :raises ValueError: If the URL does not specify the port and its scheme has no default one.
+    """
+    parts = urlsplit(url)
+    port = parts.port or DEFAULT_PORTS.get(parts.scheme.lower())
+    if not parts.hostname or not port:
+        raise ValueError(f"Cannot determine the host and port to probe from [{url}].")
+    return parts.hostname, port
+
+
+def tcp_probe(url: str, timeout: float) -> ProbeTiming:
+    """
+    Establish a TCP connection to the component, and obtain its timing.
+
+    :raises OSError: If the connection fails. The timing is provided as its ``probe_timing`` attribute.
+    """
+    timing = make_probe_timing()
+    start = time.perf_counter()
+    try:
+        with socket.create_connection(get_probe_address(url), timeout=timeout):
+            timing["connect"] = timing["total"] = time.perf_counter() - start
+    except OSError as exc:
+        timing["total"] = time.perf_counter() - start
+        exc.probe_timing = timing  # type: ignore
+        raise
+    return timing
+
+
+def tls_probe(url: str, timeout: float,
+              verify: Union[bool, str] = True) -> Tuple[ProbeTiming, Optional[datetime.datetime]]:
+    """
+    Establish a TCP connection and perform the TLS handshake with the component, and obtain its timing and the
+    expiry of its certificate.
+
+    :param verify:
+        Whether to verify the certificate of the component, or path of the CA bundle to verify it.
+        Its expiry is only known if it is verified.
+    :raises OSError:
+        If the connection or handshake fails (including invalid certificates, as :class:`ssl.SSLCertVerificationError`).
+        The timing is provided as its ``probe_timing`` attribute.
+    """
+    host, port = get_probe_address(url)
+    context = ssl.create_default_context(cafile=verify if isinstance(verify, str) else None)
+    if verify is False:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+
+    timing = make_probe_timing()
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            timing["connect"] = time.perf_counter() - start
+            with context.wrap_socket(sock, server_hostname=host) as tls_sock:
+                timing["tls"] = time.perf_counter() - start - timing["connect"]
+                cert = tls_sock.getpeercert()
+    except OSError as exc:
+        timing["total"] = time.perf_counter() - start
+        exc.probe_timing = timing  # type: ignore
+        raise
+    timing["total"] = time.perf_counter() - start
+    expiry = None
+    if cert and cert.get("notAfter"):
+        expiry = datetime.datetime.fromtimestamp(ssl.cert_time_to_seconds(cert["notAfter"]), datetime.timezone.utc)
+    return timing, expiry
@@ -5,11 +5,137 @@ Middleware for reverse proxy.
 
 This module implements a middleware that makes the Flask application work
 seamlessly behind a reverse proxy.
+
+It also provides an opt-in instrumentation of requests (see ``INSTRUMENTATION`` configuration) timing the phases
+of each request (database connection, queries, template rendering and serialization) to report them with
+``Server-Timing`` response headers, rolling latency percentiles per endpoint and logs of slow requests.
 """
 
-from typing import Any, Callable, Dict
+import collections
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Iterator, List, Mapping, Optional, Union
+
+if TYPE_CHECKING:
+    from flask import Response
+
+# Phases timed during requests, in the order they are reported
+TIMED_PHASES = ["db_connect", "db_query", "snapshot", "render", "serialize"]
+
+
+class RequestTimings(object):
+    """
+    Accumulated durations (seconds) of the timed phases of a single request.
+    """
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.started: Dict[str, float] = {}
+
+    def add(self, phase: str, duration: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + duration
+
+    def begin(self, phase: str) -> None:
+        self.started[phase] = time.perf_counter()
 
-from flask import Response
+    def end(self, phase: str) -> None:
+        start = self.started.pop(phase, None)
+        if start is not None:
+            self.add(phase, time.perf_counter() - start)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def server_timing(self, total: float) -> str:
+        """
+        Generate the ``Server-Timing`` header value with durations in milliseconds.
+        """
+        phases = [phase for phase in TIMED_PHASES if phase in self.phases]
+        phases += sorted(set(self.phases) - set(TIMED_PHASES))
+        entries = [f"{phase};dur={self.phases[phase] * 1000:.3f}" for phase in phases]
+        entries.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(entries)
+
+
+_REQUEST_TIMINGS: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+@contextlib.contextmanager
+def time_phase(phase: str) -> Iterator[None]:
+    """
+    Time the enclosed operations as a phase of the current request.
+
+    Nothing is recorded if instrumentation is disabled or if there is no request being handled (e.g.: cron jobs).
+    """
+    timings = _REQUEST_TIMINGS.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - start)
+
+
+def begin_phase(phase: str) -> None:
+    """
+    Start timing a phase of the current request, for operations that cannot be enclosed by :func:`time_phase`.
+    """
+    timings = _REQUEST_TIMINGS.get()
+    if timings is not None:
+        timings.begin(phase)
+
+
+def end_phase(phase: str) -> None:
+    """
+    Stop timing a phase of the current request started by :func:`begin_phase`.
+    """
+    timings = _REQUEST_TIMINGS.get()
+    if timings is not None:
+        timings.end(phase)
+
+
+class LatencyTracker(object):
+    """
+    Rolling window of the latest request durations of each endpoint, to compute latency percentiles.
+    """
+
+    def __init__(self, window: int = 1000) -> None:
+        self.window = window
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, Deque[float]] = {}
+
+    def record(self, endpoint: str, duration: float) -> None:
+        with self.lock:
+            latencies = self.latencies.get(endpoint)
+            if latencies is None:
+                latencies = self.latencies[endpoint] = collections.deque(maxlen=self.window)
+            latencies.append(duration)
+
+    def percentiles(self, quantiles: Optional[List[float]] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Compute the latency percentiles (seconds) of each endpoint over their rolling window.
+        """
+        quantiles = quantiles or [0.5, 0.95, 0.99]
+        with self.lock:
+            samples = {endpoint: sorted(latencies) for endpoint, latencies in self.latencies.items()}
+        results = {}
+        for endpoint, latencies in samples.items():
+            if not latencies:
+                continue
+            results[endpoint] = {
+                str(quantile): latencies[min(int(quantile * len(latencies)), len(latencies) - 1)]
+                for quantile in quantiles
+            }
+            results[endpoint]["count"] = len(latencies)
+        return results
 
 
 class ReverseProxied(object):
@@ -17,10 +143,18 @@ class ReverseProxied(object):
     Class which implements a middleware so :mod:`Flask` can be used behind a reverse proxy.
     """
 
-    def __init__(self, app: Any) -> None:
+    def __init__(
+        self,
+        app: Any,
+        config: Optional[Union[Mapping[str, Any], Callable[[], Mapping[str, Any]]]] = None,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
         self.app = app
+        self.config = config if config is not None else {}  # callable to obtain the active one on every request
+        self.logger = logger or logging.getLogger(__name__)
+        self.latency = LatencyTracker()
 
-    def __call__(self, environ: Dict[str, str], start_response: Callable) -> Response:
+    def __call__(self, environ: Dict[str, str], start_response: Callable) -> "Response":
         script_name = environ.get("HTTP_X_SCRIPT_NAME", None)
 
         if script_name is not None:
@@ -35,4 +169,57 @@ class ReverseProxied(object):
         if scheme is not None:
             environ["wsgi_url_scheme"] = scheme
 
-        return self.app(environ, start_response)
+        config = self.config() if callable(self.config) else self.config
+        settings = config.get("INSTRUMENTATION", {})
+        if not settings.get("enabled", False):
+            return self.app(environ, start_response)
+        return self.instrumented_call(environ, start_response, settings)
+
+    def instrumented_call(
+        self,
+        environ: Dict[str, str],
+        start_response: Callable,
+        settings: Mapping[str, Any],
+    ) -> "Response":
+        """
+        Call the application while timing the phases of the request.
+        """
+        timings = RequestTimings()
+        self.latency.window = settings.get("window", self.latency.window)
+
+        def timed_start_response(status: str, headers: List[Any], *args: Any) -> Callable:
+            # for non-streamed responses, the content is entirely generated when the response is started
+            total = timings.elapsed()
+            headers.append(("Server-Timing", timings.server_timing(total)))
+            self.record(environ, status, timings, total, settings)
+            return start_response(status, headers, *args)
+
+        token = _REQUEST_TIMINGS.set(timings)
+        try:
+            return self.app(environ, timed_start_response)
+        finally:
+            _REQUEST_TIMINGS.reset(token)
+
+    def record(
+        self,
+        environ: Dict[str, str],
+        status: str,
+        timings: RequestTimings,
+        total: float,
+        settings: Mapping[str, Any],
+    ) -> None:
+        """
+        Record the request latency for its endpoint and log it if considered slow.
+        """
+        request = environ.get("werkzeug.request")
+        url_rule = getattr(request, "url_rule", None)
+        endpoint = url_rule.rule if url_rule else "unmatched"  # avoid arbitrary paths as keys
+        self.latency.record(endpoint, total)
+
+        threshold = settings.get("slow_request_threshold")
+        if threshold is not None and total >= threshold:
+            breakdown = ", ".join(f"{phase}={duration:.3f}s" for phase, duration in timings.phases.items())
+            self.logger.warning(
+                "Slow request [%s %s] (%s) took %.3fs [%s]",
+                environ.get("REQUEST_METHOD"), environ.get("PATH_INFO"), status, total, breakdown or "no phase",
+            )
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# coding:utf-8
+"""
+Scheduling of monitoring probes.
+
+Probes are performed in parallel by a pool of threads, while protecting the monitored backends: the number of probes
+in progress against the same host is limited, and probes are started at a maximum global rate (token bucket).
+Pending probes are queued per host and hosts are served in turn, such that a host referenced by many components does
+not delay the probes of other hosts. The time each probe waited in the queue, from the moment it was ready to start,
+is reported along its result.
+
+Probes can depend on others, in which case they are only started once those are completed, and their result can be
+determined from the one of their dependencies instead (e.g.: components behind a gateway that is down).
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import collections
+import queue
+import threading
+import time
+from typing import Callable, Deque, Dict, Generic, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")  # probed item
+R = TypeVar("R")  # probe result
+
+
+class TokenBucket(object):
+    """
+    Rate limit of ``rate`` operations per second, allowing bursts of ``burst`` operations.
+    """
+
+    def __init__(self, rate: float, burst: float = 1, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Reserve a token, and obtain the delay (seconds) to wait before it is available.
+        """
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.tokens + (now - self.updated) * self.rate, self.burst)
+            self.updated = now
+            self.tokens -= 1
+            return max(-self.tokens / self.rate, 0.0)
+
+
+class ProbeScheduler(Generic[T, R]):
+    """
+    Perform probes in parallel, limited per host and globally.
+
+    :param max_workers: Maximum number of probes in progress.
+    :param max_per_host: Maximum number of probes in progress against the same host (unlimited if ``None``).
+    :param rate: Maximum number of probes started per second (unlimited if ``None``).
+    :param burst: Number of probes that can be started at once without respecting the rate.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 1,
+        max_per_host: Optional[int] = None,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+    ) -> None:
+        self.max_workers = max(int(max_workers or 1), 1)
+        self.max_per_host = max(int(max_per_host), 1) if max_per_host else None
+        self.bucket = TokenBucket(rate, burst or 1) if rate else None
+        self.condition = threading.Condition()
+        self.pending: Dict[str, Deque[int]] = collections.OrderedDict()  # indices of ready probes per host
+        self.in_flight: Dict[str, int] = {}
+        self.cancelled = False
+
+    def next_probe(self) -> Optional[Tuple[str, int]]:
+        """
+        Take the next probe of the first host in turn below its limit, and move that host at the end of the turn.
+
+        Must be called while holding the condition.
+        """
+        for host, probes in self.pending.items():
+            if self.max_per_host is None or self.in_flight.get(host, 0) < self.max_per_host:
+                index = probes.popleft()
+                if probes:
+                    self.pending.move_to_end(host)  # type: ignore
+                else:
+                    del self.pending[host]
+                self.in_flight[host] = self.in_flight.get(host, 0) + 1
+                return host, index
+        return None
+
+    def run(
+        self,
+        probes: Iterable[Tuple[str, T]],
+        probe: Callable[[T], R],
+        budget: Optional[float] = None,
+        dependencies: Optional[Dict[int, Iterable[int]]] = None,
+        prune: Optional[Callable[[T, T, R], Optional[R]]] = None,
+    ) -> Iterator[Tuple[T, Optional[R], float, float]]:
+        """
+        Perform the probes of items against their host, and obtain their results as they complete.
+
+        :param probes: Host and item of every probe.
+        :param probe: Called to probe an item.
+        :param budget:
+            Maximum duration (seconds) a probe can wait in the queue once ready to start (i.e.: its dependencies are
+            completed). Probes waiting longer are skipped, and their result is ``None``.
+        :param dependencies:
+            Indices (in ``probes``) of the probes to complete before each probe, by its own index.
+            Probes are started once their dependencies are completed, independent ones in parallel.
+            Probes depending on each other in a cycle are started regardless of their dependencies.
+        :param prune:
+            Called with the item of a probe, and the item and result of one of its completed dependencies, to obtain
+            the result of the probe without performing it (e.g.: its dependency is down), or ``None`` to perform it.
+        :returns:
+            Item, result, time waited in the queue once ready to start and duration of every probe (in seconds).
+            Pruned probes are not queued, and their waited time is zero.
+            An exception raised by a probe is raised once its result is reached, which cancels the remaining ones.
+        """
+        entries = list(probes)
+        dependencies = dependencies or {}
+        children: Dict[int, List[int]] = {}
+        waiting: Dict[int, int] = {}
+        for index, parents in dependencies.items():
+            for parent in set(parents):
+                children.setdefault(parent, []).append(index)
+                waiting[index] = waiting.get(index, 0) + 1
+        ready: Dict[int, float] = {}  # time at which every queued probe became ready to start
+
+        def enqueue(index: int) -> None:
+            # must be called while holding the condition (except before starting the workers)
+            ready[index] = time.perf_counter()
+            self.pending.setdefault(entries[index][0], collections.deque()).append(index)
+
+        for index in range(len(entries)):
+            if index not in waiting:
+                enqueue(index)
+        remaining = len(entries)  # neither started nor pruned
+        results: "queue.Queue[Tuple[T, Optional[R], Optional[Exception], float, float]]" = queue.Queue()
+
+        def complete(index: int, result: Optional[R]) -> None:
+            # must be called while holding the condition
+            nonlocal remaining
+            for child in children.get(index, []):
+                if child not in waiting:
+                    continue  # already started or pruned
+                pruned = prune(entries[child][1], entries[index][1], result) if prune and result is not None else None
+                if pruned is not None:
+                    del waiting[child]
+                    remaining -= 1
+                    results.put((entries[child][1], pruned, None, 0.0, 0.0))
+                    complete(child, pruned)
+                    continue
+                waiting[child] -= 1
+                if not waiting[child]:
+                    del waiting[child]
+                    enqueue(child)
+            self.condition.notify_all()
+
+        def work() -> None:
+            nonlocal remaining
+            while True:
+                with self.condition:
+                    scheduled = None
+                    while not scheduled and remaining:
+                        scheduled = self.next_probe()
+                        if scheduled:
+                            remaining -= 1
+                        elif not self.pending and not any(self.in_flight.values()):
+                            # only probes depending on each other in a cycle remain
+                            for index in list(waiting):
+                                del waiting[index]
+                                enqueue(index)
+                        else:
+                            self.condition.wait()
+                    if not scheduled:
+                        return
+                host, index = scheduled
+                item = entries[index][1]
+                result, error, duration = None, None, 0.0
+                try:
+                    if self.bucket and not self.cancelled:
+                        time.sleep(self.bucket.reserve())
+                    probe_start = time.perf_counter()
+                    waited = probe_start - ready[index]
+                    if not self.cancelled and (budget is None or waited < budget):
+                        try:
+                            result = probe(item)
+                        except Exception as exc:
+                            error = exc
+                        duration = time.perf_counter() - probe_start
+                finally:
+                    with self.condition:
+                        self.in_flight[host] -= 1
+                        results.put((item, result, error, waited, duration))
+                        complete(index, result)
+
+        workers: List[threading.Thread] = []
+        for _ in range(min(self.max_workers, len(entries))):
+            worker = threading.Thread(target=work, daemon=True)
+            worker.start()
+            workers.append(worker)
+        try:
+            for _ in range(len(entries)):
+                item, result, error, waited, duration = results.get()
+                if error is not None:
+                    raise error
+                yield item, result, waited, duration
+        finally:
+            self.cancelled = True
+            for worker in workers:
+                worker.join()
@@ -1,57 +1,234 @@
 # -- Standard lib ------------------------------------------------------------
 import copy
+import functools
+import hashlib
 import json
 import logging
 import os
-
-# -- 3rd party ---------------------------------------------------------------
-import jsonschema
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Mapping, Optional, Set, Tuple
+from typing_extensions import TypedDict
 
 # -- Project specific --------------------------------------------------------
 from canarieapi.app_object import APP
-from canarieapi.logparser import parse_log
-from canarieapi.monitoring import monitor
+from canarieapi.status import Status
+
+if TYPE_CHECKING:
+    import jsonschema
+
+    from canarieapi.monitoring import MonitorSummary
 
 # The schema that must be respected by the config
 with open(os.path.join(os.path.dirname(__file__), "schema.json"), mode="r", encoding="utf-8") as schema_file:
     CONFIGURATION_SCHEMA = json.load(schema_file)
 
 
-def validate_config_schema(update_db: bool, run_jobs: bool = True) -> None:
-    config = APP.config
-    logger: logging.Logger = APP.logger
+SelfTestLogs = TypedDict("SelfTestLogs", {
+    "files_checked": int,
+    "invocations": Dict[str, int],  # invocations found per route
+}, total=True)
+SelfTestResult = TypedDict("SelfTestResult", {
+    "monitoring": "MonitorSummary",
+    "logs": Optional[SelfTestLogs],  # not parsed when PARSE_LOGS is disabled
+}, total=True)
+
+# Sections of the configuration where each entry is validated individually, with their definition in the schema
+CONFIGURATION_ENTRY_SECTIONS = {
+    "SERVICES": "service_description_schema",
+    "PLATFORMS": "platform_description_schema",
+}
 
-    logger.info("Testing configuration...")
+# Hashes of configuration entries that were successfully validated, by schema variant and section
+_VALID_CONFIG_ENTRIES: Set[Tuple[bool, str, str]] = set()
+_VALID_CONFIG_ENTRIES_LOCK = threading.Lock()
 
+
+def get_configuration_schema(parse_logs: bool) -> Dict[str, Any]:
+    """
+    Obtain the configuration schema variant according to the ``PARSE_LOGS`` configuration option.
+    """
     configuration_schema = copy.deepcopy(CONFIGURATION_SCHEMA)
-    if config.get("PARSE_LOGS", True):
+    if parse_logs:
         configuration_schema["definitions"]["service_description_schema"]["required"].append("stats")
         configuration_schema["definitions"]["platform_description_schema"]["required"].append("stats")
+    return configuration_schema
+
+
+@functools.lru_cache(maxsize=None)
+def get_config_validators(parse_logs: bool) -> Tuple["jsonschema.protocols.Validator", Dict[str, Any]]:
+    """
+    Compile the validators of the configuration schema variant, once per ``PARSE_LOGS`` value.
+
+    :returns:
+        Validator of the configuration, excluding the content of entries in :data:`CONFIGURATION_ENTRY_SECTIONS`,
+        and validators of these entries by section.
+    """
+    import jsonschema  # pylint: disable=C0415  # only loaded when validating, importing it is costly
+
+    configuration_schema = get_configuration_schema(parse_logs)
+    validator_cls = jsonschema.validators.validator_for(configuration_schema)
+    validator_cls.check_schema(configuration_schema)
+
+    root_schema = copy.deepcopy(configuration_schema)
+    entry_validators = {}
+    for section, definition in CONFIGURATION_ENTRY_SECTIONS.items():
+        root_schema["properties"][section].pop("patternProperties", None)
+        # reference the definition from a copy of the full schema to resolve its nested references
+        entry_schema = dict(configuration_schema, **{"$ref": f"#/definitions/{definition}"})
+        entry_validators[section] = validator_cls(entry_schema)
+    return validator_cls(root_schema), entry_validators
+
+
+def hash_config_entry(entry: Any) -> str:
+    """
+    Compute a hash of the configuration entry content.
+    """
+    content = json.dumps(entry, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def check_config_schema(config: Optional[Mapping[str, Any]] = None) -> None:
+    """
+    Validate the application configuration, or the specified one, against the schema.
+
+    Validators are compiled once and services or platforms entries are validated individually. Entries that were
+    already validated with the same content are skipped, such that only modified entries are validated again.
+    Dependencies between monitored components are then resolved across all entries.
+
+    :raises jsonschema.ValidationError: If the configuration is invalid.
+    """
+    import jsonschema  # pylint: disable=C0415  # only loaded when validating, importing it is costly
+
+    config = APP.config if config is None else config
+    parse_logs = bool(config.get("PARSE_LOGS", True))
+    root_validator, entry_validators = get_config_validators(parse_logs)
     try:
-        jsonschema.validate(config, configuration_schema)
+        root_validator.validate(config)
     except jsonschema.ValidationError as exc:
         raise jsonschema.ValidationError(f"The configuration is invalid : {exc!s}")
 
-    if run_jobs:
-        monitor(update_db=update_db)
-
-        if config.get("PARSE_LOGS", True):
-            access_log_fn = config["DATABASE"]["access_log"]
-            route_invocations = {}
-            file_checked = 0
-            try:
-                route_stats = parse_log(access_log_fn)
-            except IOError:
-                logger.warning("Unable to read logs from %s", access_log_fn)
+    valid_entries = set()
+    for section, entry_validator in entry_validators.items():
+        for name, entry in config[section].items():
+            key = (parse_logs, section, hash_config_entry(entry))
+            if key not in _VALID_CONFIG_ENTRIES:
+                try:
+                    entry_validator.validate(entry)
+                except jsonschema.ValidationError as exc:
+                    raise jsonschema.ValidationError(f"The configuration is invalid : [{section}.{name}] {exc!s}")
+            valid_entries.add(key)
+
+    from canarieapi.monitoring import get_component_dependencies  # pylint: disable=C0415
+
+    monitoring = {route: entry["monitoring"] for route, entry in config["SERVICES"].items()}
+    monitoring.update({route: entry["monitoring"] for route, entry in config["PLATFORMS"].items()})
+    try:
+        get_component_dependencies(monitoring)
+    except ValueError as exc:
+        raise jsonschema.ValidationError(f"The configuration is invalid : {exc!s}")
+
+    # only keep the current entries to avoid growing indefinitely with reloaded configurations
+    with _VALID_CONFIG_ENTRIES_LOCK:
+        _VALID_CONFIG_ENTRIES.clear()
+        _VALID_CONFIG_ENTRIES.update(valid_entries)
+
+
+def run_self_test(
+    update_db: bool,
+    budget: Optional[float] = None,
+    log_tail_bytes: Optional[int] = None,
+    progress: Optional[Callable[["MonitorSummary"], None]] = None,
+) -> SelfTestResult:
+    """
+    Run the monitoring and log parsing jobs to report problems with monitored components and access logs.
+
+    :param update_db: Whether to store the monitoring results in the database.
+    :param budget: Maximum duration (seconds) a component can wait to be probed, components waiting longer are skipped.
+    :param log_tail_bytes: Only parse the specified amount of data at the end of the access log.
+    :param progress: Called with the ongoing monitoring summary after each component is probed.
+    """
+    # pylint: disable=C0415  # avoid loading the jobs and their dependencies unless needed
+    from canarieapi.logparser import parse_log
+    from canarieapi.monitoring import monitor
+
+    config = APP.config
+    logger: logging.Logger = APP.logger
+
+    summary = monitor(update_db=update_db, budget=budget, progress=progress)
+    result: SelfTestResult = {"monitoring": summary, "logs": None}
+    logger.info(
+        "Monitoring results: %s probes, %s deduplicated, %s pruned, %s skipped, %s",
+        summary["probes"], summary["deduplicated"], summary["pruned"], summary["skipped"],
+        ", ".join(f"{Status.pretty_msg(status)}: {count}" for status, count in summary["status"].items()) or "none",
+    )
+
+    if config.get("PARSE_LOGS", True):
+        access_log_fn = config["DATABASE"]["access_log"]
+        route_invocations = {}
+        file_checked = 0
+        try:
+            route_stats = parse_log(access_log_fn, max_bytes=log_tail_bytes)
+        except IOError:
+            logger.warning("Unable to read logs from %s", access_log_fn)
+        else:
+            file_checked = 1
+            for route, value in route_stats.items():
+                route_invocations[route] = route_invocations.get(route, 0) + value["count"]
+
+        for route, invocs in route_invocations.items():
+            if invocs > 0:
+                logger.info("Found %s invocations to route %s in %s log files", invocs, route, file_checked)
             else:
-                for route, value in route_stats.items():
-                    route_invocations[route] = route_invocations.get(route, 0) + value["count"]
-
-            for route, invocs in route_invocations.items():
-                if invocs > 0:
-                    logger.info("Found %s invocations to route %s in %s log files", invocs, route, file_checked)
-                else:
-                    logger.warning("Found no invocations to route %s in %s log files", route, file_checked)
-            if not route_invocations:
-                logger.warning("Found no invocations at all in %s log files", file_checked)
-    logger.info("Tests completed!")
+                logger.warning("Found no invocations to route %s in %s log files", route, file_checked)
+        if not route_invocations:
+            logger.warning("Found no invocations at all in %s log files", file_checked)
+        result["logs"] = {"files_checked": file_checked, "invocations": route_invocations}
+    return result
+
+
+def validate_config_schema(
+    update_db: bool,
+    run_jobs: bool = True,
+    progress: Optional[Callable[["MonitorSummary"], None]] = None,
+) -> Optional[SelfTestResult]:
+    """
+    Validate the application configuration against the schema, and optionally run the self-test jobs.
+    """
+    APP.logger.info("Testing configuration...")
+    check_config_schema()
+    result = None
+    if run_jobs:
+        result = run_self_test(update_db=update_db, progress=progress)
+    APP.logger.info("Tests completed!")
+    return result
+
+
+def start_self_test() -> Optional[threading.Thread]:
+    """
+    Start the self-test jobs in background, limited according to the ``STARTUP_SELF_TEST`` configuration.
+
+    This allows the application to serve requests immediately, while probe results and log statistics are logged
+    once they are ready. The configuration schema should be validated beforehand using :func:`check_config_schema`.
+    """
+    settings = APP.config.get("STARTUP_SELF_TEST", {})
+    if not settings.get("enabled", True):
+        APP.logger.info("Startup self-test disabled.")
+        return None
+
+    budget = settings.get("budget")
+    log_tail_bytes = settings.get("log_tail_bytes")
+
+    def self_test() -> None:
+        start = time.perf_counter()
+        try:
+            run_self_test(update_db=False, budget=budget, log_tail_bytes=log_tail_bytes)
+        except Exception as exc:  # pragma: no cover
+            APP.logger.error("Startup self-test failed: %s", exc, exc_info=exc)
+        else:
+            APP.logger.info("Startup self-test completed in %.3fs", time.perf_counter() - start)
+
+    APP.logger.info("Starting self-test in background (budget: %ss, log tail: %s bytes).", budget, log_tail_bytes)
+    thread = threading.Thread(target=self_test, name="canarieapi-self-test", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# coding:utf-8
+"""
+Configuration and logger shared by the web application and the cron jobs.
+
+Cron jobs (log parsing and monitoring) only need the configuration, a logger and the database. This module provides
+them without building the :mod:`Flask` application, which avoids importing the web framework and its dependencies
+on every cron tick. Once the application is created (see :mod:`canarieapi.app_object`), it registers itself such that
+its configuration and logger are employed instead, keeping both contexts consistent.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import copy
+import logging
+import os
+import sys
+import types
+from typing import Any, Dict, Optional
+
+# -- Project specific --------------------------------------------------------
+from canarieapi import default_configuration
+
+LOG_FORMAT = "[%(asctime)s] [%(process)d] [%(levelname)s] %(name)s : %(message)s"
+
+# Same logger as the one of the Flask application (named after its import name), so both contexts share it.
+LOGGER_NAME = "canarieapi.app_object"
+
+# Relative configuration file paths are resolved from the package directory, as done by the Flask application.
+ROOT_PATH = os.path.dirname(os.path.abspath(__file__))
+
+_APPLICATION: Optional[Any] = None
+_CONFIG: Optional[Dict[str, Any]] = None
+_LOGGER: Optional[logging.Logger] = None
+
+
+def setup_logger(logger: logging.Logger) -> logging.Logger:
+    """
+    Apply the common log format and level to the logger.
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.handlers.clear()  # backward compatibility to avoid duplicate log entries
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+def load_config_object(config: Dict[str, Any], obj: Any) -> None:
+    """
+    Update the configuration with uppercase attributes of the object, as done by ``Flask.config.from_object``.
+    """
+    for key in dir(obj):
+        if key.isupper():
+            config[key] = getattr(obj, key)
+
+
+# Default configuration values, captured before any configuration file modifies them (see 'load_default_config')
+_DEFAULT_CONFIG: Dict[str, Any] = {}
+load_config_object(_DEFAULT_CONFIG, default_configuration)
+_DEFAULT_CONFIG = copy.deepcopy(_DEFAULT_CONFIG)
+
+
+def load_default_config(config: Dict[str, Any]) -> None:
+    """
+    Update the configuration with new copies of the default values, without executing the default configuration again.
+
+    Since configuration files commonly import and modify the default values, the default configuration module is also
+    provided with these copies, such that a configuration file can be loaded again from the same default values.
+    """
+    defaults = copy.deepcopy(_DEFAULT_CONFIG)
+    for key, value in defaults.items():
+        setattr(default_configuration, key, value)
+    config.update(defaults)
+
+
+def load_config_file(config: Dict[str, Any], filename: str) -> None:
+    """
+    Update the configuration from a Python file, as done by ``Flask.config.from_pyfile``.
+    """
+    filename = os.path.join(ROOT_PATH, filename)
+    module = types.ModuleType("config")
+    module.__file__ = filename
+    with open(filename, mode="rb") as config_file:
+        exec(compile(config_file.read(), filename, "exec"), module.__dict__)  # nosec: B102 # pylint: disable=W0122
+    load_config_object(config, module)
+
+
+def register_application(app: Any) -> None:
+    """
+    Employ the configuration and logger of the application instead of standalone ones.
+    """
+    global _APPLICATION  # pylint: disable=W0603
+    _APPLICATION = app
+
+
+def get_config() -> Dict[str, Any]:
+    """
+    Obtain the active configuration.
+
+    Without a registered application, the default configuration is loaded, updated by the file referenced by the
+    ``CANARIE_API_CONFIG_FN`` environment variable if defined.
+    """
+    global _CONFIG  # pylint: disable=W0603
+    if _APPLICATION is not None:
+        return _APPLICATION.config
+    if _CONFIG is None:
+        config: Dict[str, Any] = {}
+        load_config_object(config, default_configuration)
+        config_fn = os.environ.get("CANARIE_API_CONFIG_FN")
+        if config_fn:
+            load_config_file(config, config_fn)
+            get_logger().info("Loading custom configuration from %s", config_fn)
+        else:
+            get_logger().info("Using default configuration")
+        _CONFIG = config
+    return _CONFIG
+
+
+def get_logger() -> logging.Logger:
+    """
+    Obtain the active logger.
+    """
+    global _LOGGER  # pylint: disable=W0603
+    if _APPLICATION is not None:
+        return _APPLICATION.logger
+    if _LOGGER is None:
+        _LOGGER = setup_logger(logging.getLogger(LOGGER_NAME))
+    return _LOGGER
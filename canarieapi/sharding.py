@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# coding:utf-8
+"""
+Sharded monitoring across several workers.
+
+Each monitoring worker holds a lease in the shared database, renewed on every run. The workers with a valid lease
+share the probes through consistent hashing: every worker owns the probes whose shard key (a monitored component)
+falls in its portions of the hash ring. Workers obtain the same assignment from the same configuration and leases,
+without any other coordination. When a worker disappears, its lease expires and its probes are taken over by the
+remaining workers, while the probes of other workers are not moved.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import bisect
+import hashlib
+import sqlite3
+import time
+from typing import Iterable, List, Optional
+
+# -- Project specific --------------------------------------------------------
+from canarieapi.database import retry_db_error_after_init
+
+
+def get_hash(value: str) -> int:
+    return int.from_bytes(hashlib.sha256(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing(object):
+    """
+    Consistent hashing of keys onto nodes, each one placed on the ring as several virtual nodes.
+    """
+
+    def __init__(self, nodes: Iterable[str], virtual_nodes: int = 64) -> None:
+        ring = sorted((get_hash(f"{node}#{index}"), node) for node in nodes for index in range(max(virtual_nodes, 1)))
+        self.hashes = [point for point, _ in ring]
+        self.nodes = [node for _, node in ring]
+
+    def get_node(self, key: str) -> str:
+        """
+        Obtain the node owning the key, which is the first one following it on the ring.
+        """
+        index = bisect.bisect(self.hashes, get_hash(key)) % len(self.hashes)
+        return self.nodes[index]
+
+
+def renew_worker_lease(db: sqlite3.Connection, worker: str, lease: float) -> List[str]:
+    """
+    Register or renew the lease of the monitoring worker, and obtain the workers currently holding a valid lease.
+
+    Expired leases are removed. The transaction is committed immediately, such that the database is not locked while
+    probing components.
+    """
+    now = time.time()
+    cur = db.cursor()
+    if db.in_transaction:
+        db.commit()
+    cur.execute("begin immediate")
+    try:
+        cur.execute("delete from monitor_worker where expires <= ?", [now])
+        cur.execute("insert or replace into monitor_worker (worker, renewed, expires) values (?, ?, ?)",
+                    [worker, now, now + lease])
+        cur.execute("select worker from monitor_worker order by worker")
+        workers = [row[0] for row in cur.fetchall()]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return workers
+
+
+@retry_db_error_after_init
+def release_worker_lease(worker: str, *, database: Optional[sqlite3.Connection] = None) -> None:
+    """
+    Release the lease of the monitoring worker, such that its probes are taken over by others on their next run.
+    """
+    database.execute("delete from monitor_worker where worker = ?", [worker])
+    database.commit()
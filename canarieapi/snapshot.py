@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# coding:utf-8
+"""
+Snapshot of the monitoring statuses, statistics and cron job times published by the cron jobs for the web workers.
+
+The data served by the ``stats`` and ``status`` routes only changes when a cron job completes. Instead of querying the
+database on every request, the jobs publish an immutable snapshot file once they updated the database, and web
+workers memory-map it and serve lookups from it. The file is written aside and atomically renamed, such that workers
+always see a complete snapshot. Workers check its generation number at most every ``SNAPSHOT["check_interval"]``
+seconds, and only map the new file when it changed.
+
+Layout of the file: a fixed header (magic, generation number, size of the index), the index of routes (compact JSON
+holding the cron job times and the offset and size of the records of every route), and the records of every route
+(compact JSON of their statuses, latency and statistics rows), which are only decoded when looked up.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from typing_extensions import TypedDict
+
+# -- Project specific --------------------------------------------------------
+from canarieapi.database import get_database_filename
+from canarieapi.settings import get_config, get_logger
+from canarieapi.storage import StorageError, get_storage
+
+SNAPSHOT_MAGIC = b"CANSNAP1"
+SNAPSHOT_HEADER = struct.Struct("<8sQI")  # magic, generation, size of the index
+
+# Permissions of published files, which 'tempfile' restricts to their owner, such that they are readable by workers
+# running as other users (unless restricted by the umask, read once since it can only be obtained by replacing it)
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+SHARED_FILE_MODE = 0o666 & ~_UMASK
+
+RouteRecords = TypedDict("RouteRecords", {
+    "status": List[Tuple[str, str, str]],  # service, status, message
+    "latency": List[Tuple[Any, ...]],  # service, total, connect, tls, ttfb, bytes, samples
+    "stats": Optional[Tuple[int, str]],  # invocations, last access
+    "cron": List[Tuple[str, str]],  # job, last execution
+}, total=True)
+
+
+def get_snapshot_filename() -> str:
+    """
+    Obtain the path of the snapshot file, next to the database unless configured.
+    """
+    filename = get_config().get("SNAPSHOT", {}).get("filename")
+    return filename or os.path.join(os.path.dirname(get_database_filename()), "snapshot.bin")
+
+
+def publish_snapshot(database: sqlite3.Connection) -> Optional[int]:
+    """
+    Write the snapshot of the database and replace the published one.
+
+    Failures are logged without interrupting the job, web workers then keep serving the previous snapshot.
+
+    :returns: Generation number of the published snapshot, if published.
+    """
+    if not get_config().get("SNAPSHOT", {}).get("enabled", True):
+        return None
+    logger = get_logger()
+    filename = get_snapshot_filename()
+    start = time.perf_counter()
+    storage = get_storage(database)
+    try:
+        statuses = storage.get_statuses()
+        latency_records = storage.get_latency()
+        stats = storage.get_stats()
+        cron_records = storage.get_cron()
+    except StorageError as exc:
+        logger.warning("Could not publish the status snapshot [%s]: %s", filename, exc)
+        return None
+    routes: Dict[str, Dict[str, Any]] = {}
+
+    def get_route(route: str) -> Dict[str, Any]:
+        return routes.setdefault(route, {"status": [], "latency": [], "stats": None})
+
+    # same order as the queries of the routes, such that responses are identical
+    components = set()
+    for route, service, status, message in statuses:
+        get_route(route)["status"].append([service, status, message])
+        components.add((route, service))
+    for route, service, *latency in latency_records:
+        if (route, service) in components:
+            routes[route]["latency"].append([service, *latency])
+    for route, invocations, last_access in stats:
+        get_route(route)["stats"] = [invocations, last_access]
+    cron = [[job, last_execution] for job, last_execution, _ in cron_records]
+
+    records = []
+    index: Dict[str, Any] = {"cron": cron, "routes": {}}
+    offset = 0
+    for route, route_records in routes.items():
+        data = json.dumps(route_records, separators=(",", ":")).encode("utf-8")
+        index["routes"][route] = [offset, len(data)]
+        records.append(data)
+        offset += len(data)
+    index_data = json.dumps(index, separators=(",", ":")).encode("utf-8")
+
+    # any change of generation triggers a reload, unique even if jobs publish concurrently
+    generation = time.time_ns()
+    tmp_name = None
+    try:
+        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(filename), suffix=".tmp", delete=False) as tmp_file:
+            tmp_name = tmp_file.name
+            tmp_file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, generation, len(index_data)))
+            tmp_file.write(index_data)
+            for data in records:
+                tmp_file.write(data)
+        os.chmod(tmp_name, SHARED_FILE_MODE)
+        os.replace(tmp_name, filename)
+    except OSError as exc:
+        logger.warning("Could not publish the status snapshot [%s]: %s", filename, exc)
+        if tmp_name and os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        return None
+    reset_status_snapshot()  # workers of this process (e.g.: jobs started by the application) see it immediately
+    logger.info("Published status snapshot [%s] (generation %s) in %.3fs.",
+                filename, generation, time.perf_counter() - start)
+    return generation
+
+
+def read_snapshot_generation(filename: str) -> Optional[int]:
+    """
+    Obtain the generation number of the snapshot file, if it exists and is valid.
+    """
+    try:
+        with open(filename, mode="rb") as snapshot_file:
+            header = snapshot_file.read(SNAPSHOT_HEADER.size)
+    except OSError:
+        return None
+    if len(header) != SNAPSHOT_HEADER.size:
+        return None
+    magic, generation, _ = SNAPSHOT_HEADER.unpack(header)
+    return generation if magic == SNAPSHOT_MAGIC else None
+
+
+class StatusSnapshot(object):
+    """
+    Memory-mapped snapshot file, whose route records are decoded when looked up.
+    """
+
+    def __init__(self, filename: str) -> None:
+        with open(filename, mode="rb") as snapshot_file:
+            # the mapping remains valid once the file is closed, and even once it is replaced by a new snapshot
+            self.data = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.generation, index_size = SNAPSHOT_HEADER.unpack_from(self.data)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"Invalid status snapshot file [{filename}].")
+        index = json.loads(self.data[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + index_size])
+        self.cron = [tuple(row) for row in index["cron"]]
+        self.routes = index["routes"]
+        self.records_offset = SNAPSHOT_HEADER.size + index_size
+
+    def get_route_records(self, route_name: str) -> RouteRecords:
+        """
+        Obtain the records of the route, as returned by the database queries.
+        """
+        records: RouteRecords = {"status": [], "latency": [], "stats": None, "cron": list(self.cron)}
+        if route_name in self.routes:
+            offset, size = self.routes[route_name]
+            start = self.records_offset + offset
+            route_records = json.loads(self.data[start:start + size])
+            records["status"] = [tuple(row) for row in route_records["status"]]  # type: ignore
+            records["latency"] = [tuple(row) for row in route_records["latency"]]
+            records["stats"] = tuple(route_records["stats"]) if route_records["stats"] else None  # type: ignore
+        return records
+
+
+_SNAPSHOT_LOCK = threading.Lock()
+_SNAPSHOT: Optional[StatusSnapshot] = None
+_SNAPSHOT_FILENAME: Optional[str] = None
+_SNAPSHOT_CHECKED = 0.0
+
+
+def get_status_snapshot() -> Optional[StatusSnapshot]:
+    """
+    Obtain the latest snapshot published by the cron jobs, unless disabled or not published yet.
+    """
+    global _SNAPSHOT, _SNAPSHOT_FILENAME, _SNAPSHOT_CHECKED  # pylint: disable=W0603
+
+    settings = get_config().get("SNAPSHOT", {})
+    if not settings.get("enabled", True):
+        return None
+    filename = get_snapshot_filename()
+    check_interval = settings.get("check_interval", 1.0)
+    now = time.monotonic()
+    if filename == _SNAPSHOT_FILENAME and now - _SNAPSHOT_CHECKED < check_interval:
+        return _SNAPSHOT
+    with _SNAPSHOT_LOCK:
+        if filename == _SNAPSHOT_FILENAME and now - _SNAPSHOT_CHECKED < check_interval:
+            return _SNAPSHOT
+        generation = read_snapshot_generation(filename)
+        if generation is None:
+            _SNAPSHOT = None
+        elif _SNAPSHOT is None or _SNAPSHOT_FILENAME != filename or _SNAPSHOT.generation != generation:
+            try:
+                _SNAPSHOT = StatusSnapshot(filename)
+                get_logger().debug("Loaded status snapshot [%s] (generation %s).", filename, _SNAPSHOT.generation)
+            except (OSError, ValueError) as exc:
+                get_logger().warning("Could not load the status snapshot [%s]: %s", filename, exc)
+                _SNAPSHOT = None
+        _SNAPSHOT_FILENAME = filename
+        _SNAPSHOT_CHECKED = now
+    return _SNAPSHOT
+
+
+def reset_status_snapshot() -> None:
+    """
+    Forget the loaded snapshot, such that the published one is checked on the next lookup.
+    """
+    global _SNAPSHOT, _SNAPSHOT_FILENAME, _SNAPSHOT_CHECKED  # pylint: disable=W0603
+
+    with _SNAPSHOT_LOCK:
+        _SNAPSHOT = None
+        _SNAPSHOT_FILENAME = None
+        _SNAPSHOT_CHECKED = 0.0
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# coding:utf-8
+"""
+Live status change events.
+
+This module publishes changes of monitored components status, as recorded in the storage by the monitoring job,
+to clients subscribed with the ``/status/events`` route (Server-Sent Events).
+
+A single watcher per worker detects modifications of the statuses using the version of their storage (the data version
+of the database, which changes whenever another connection commits), and only reads the statuses when it changed.
+Changes are then dispatched to the queue of every subscriber, such that the storage load does not grow with the number
+of clients. The first changes of a subscriber are computed from the statuses sent to its client when it subscribed.
+The watcher runs in a thread, which becomes a greenlet when served by ``gevent`` workers.
+
+Streams sent to clients are iterated synchronously by WSGI servers, holding their thread (or greenlet) while waiting for
+changes, or asynchronously by the ASGI adapter (see :mod:`canarieapi.asgi`), which waits for them in its event loop.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import asyncio
+import json
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from typing_extensions import TypedDict
+
+# -- Project specific --------------------------------------------------------
+from canarieapi.database import connect_db
+from canarieapi.settings import get_config, get_logger
+from canarieapi.storage import StorageError, get_storage
+
+StatusKey = Tuple[str, str]  # route, service
+StatusEvent = TypedDict("StatusEvent", {
+    "route": str,
+    "service": str,
+    "status": Optional[str],  # none when the component is not monitored anymore
+    "message": Optional[str],
+}, total=True)
+
+# WSGI environment entry of the stream of a '/status/events' response, served asynchronously by the ASGI adapter
+STREAM_ENVIRON_KEY = "canarieapi.status_events"
+
+
+class StatusSubscription(object):
+    """
+    Queue of status change events for a single client, optionally limited to some routes.
+    """
+
+    def __init__(
+        self,
+        routes: Optional[List[str]] = None,
+        queue_size: int = 100,
+        snapshot: Optional[List[StatusEvent]] = None,
+    ) -> None:
+        self.routes = set(routes) if routes else None
+        self.queue: "queue.Queue[Optional[List[StatusEvent]]]" = queue.Queue(maxsize=queue_size)
+        self.closed = False
+        self.notify: Optional[Callable[[], None]] = None  # called from the watcher thread whenever the queue changes
+        # statuses sent to the client, from which its first events are computed (see 'StatusWatcher.poll')
+        self.baseline: Optional[Dict[StatusKey, StatusEvent]] = None
+        if snapshot is not None:
+            self.baseline = {(status["route"], status["service"]): status for status in snapshot}
+
+    def accepts(self, event: StatusEvent) -> bool:
+        return self.routes is None or event["route"] in self.routes
+
+    def publish(self, events: List[StatusEvent]) -> None:
+        events = [event for event in events if self.accepts(event)]
+        if not events or self.closed:
+            return
+        try:
+            self.queue.put_nowait(events)
+        except queue.Full:
+            # the client does not keep up, stop its stream rather than buffering indefinitely
+            self.close()
+            return
+        self.wake()
+
+    def close(self) -> None:
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self.wake()
+
+    def wake(self) -> None:
+        notify = self.notify
+        if notify is not None:
+            notify()
+
+    def get(self, timeout: float) -> Optional[List[StatusEvent]]:
+        """
+        Wait for the next events.
+
+        :returns: Events, an empty list if none occurred within the timeout, or nothing once the subscription closed.
+        """
+        if self.closed and self.queue.empty():
+            return None
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return []
+
+
+def format_status_event(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    """
+    Format a Server-Sent Event.
+    """
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class StatusEventStream(object):
+    """
+    Server-Sent Events of a subscription, starting with the snapshot of statuses sent to the client.
+
+    The subscription is closed once the iteration ends or the stream is closed, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        feed: "StatusFeed",
+        subscription: StatusSubscription,
+        snapshot: List[StatusEvent],
+        heartbeat: float,
+    ) -> None:
+        self.feed = feed
+        self.subscription = subscription
+        self.snapshot = snapshot
+        self.heartbeat = heartbeat
+
+    def close(self) -> None:
+        self.feed.unsubscribe(self.subscription)
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        Produce the events, waiting for them in the calling thread.
+        """
+        try:
+            yield format_status_event("snapshot", self.snapshot, event_id=0)
+            event_id = 0
+            while True:
+                events = self.subscription.get(timeout=self.heartbeat)
+                if events is None:
+                    break
+                if not events:
+                    yield ": keep-alive\n\n"
+                for event in events:
+                    event_id += 1
+                    yield format_status_event("status", event, event_id=event_id)
+        finally:
+            self.close()
+
+    async def iter_async(self) -> AsyncIterator[str]:
+        """
+        Produce the events, waiting for them in the running event loop instead of a thread.
+        """
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+
+        def notify() -> None:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                pass  # event loop closed along with the stream
+
+        self.subscription.notify = notify
+        try:
+            yield format_status_event("snapshot", self.snapshot, event_id=0)
+            event_id = 0
+            while True:
+                wakeup.clear()
+                events = self.subscription.get(timeout=0)  # only events already queued, those to come set the wakeup
+                if events is None:
+                    break
+                if not events:
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), timeout=self.heartbeat)
+                    except asyncio.TimeoutError:
+                        yield ": keep-alive\n\n"
+                    continue
+                for event in events:
+                    event_id += 1
+                    yield format_status_event("status", event, event_id=event_id)
+        finally:
+            self.subscription.notify = None
+            self.close()
+
+
+def compare_statuses(
+    previous: Dict[StatusKey, StatusEvent],
+    statuses: Dict[StatusKey, StatusEvent],
+) -> List[StatusEvent]:
+    """
+    Obtain the events of statuses modified, added or removed since the previous ones.
+    """
+    events = [status for key, status in statuses.items() if previous.get(key) != status]
+    events.extend(
+        {"route": route, "service": service, "status": None, "message": None}
+        for route, service in previous.keys() - statuses.keys()
+    )
+    return events
+
+
+class StatusWatcher(object):
+    """
+    Connection and statuses read by a single watcher thread.
+    """
+
+    def __init__(self) -> None:
+        self.database: Optional[sqlite3.Connection] = None
+        self.data_version: Any = None
+        self.statuses: Optional[Dict[StatusKey, StatusEvent]] = None  # unknown until first poll
+
+    def close(self) -> None:
+        if self.database is not None:
+            self.database.close()
+            self.database = None
+            self.data_version = None  # only comparable for the same connection, statuses are read again
+
+    def poll(self, subscriptions: List[StatusSubscription]) -> List[StatusEvent]:
+        """
+        Read the statuses if the database changed since the last poll and publish the modified ones.
+
+        New subscriptions obtain the changes since the statuses sent to their client instead, which covers
+        modifications committed between their snapshot and the statuses read by the watcher.
+        """
+        if self.database is None:
+            self.database = connect_db()
+        storage = get_storage(self.database)
+        events: List[StatusEvent] = []
+        data_version = storage.get_status_version()
+        if data_version != self.data_version or self.statuses is None:
+            statuses = {
+                (route, service): {"route": route, "service": service, "status": status, "message": message}
+                for route, service, status, message in storage.get_statuses()
+            }
+            self.data_version = data_version
+            if self.statuses is not None:
+                events = compare_statuses(self.statuses, statuses)
+            self.statuses = statuses
+
+        for subscription in subscriptions:
+            if subscription.baseline is not None:
+                baseline, subscription.baseline = subscription.baseline, None
+                subscription.publish(compare_statuses(baseline, self.statuses))
+            elif events:
+                subscription.publish(events)
+        return events
+
+
+class StatusFeed(object):
+    """
+    Watches the ``status`` table and dispatches its changes to subscribers.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.subscriptions: List[StatusSubscription] = []
+        self.thread: Optional[threading.Thread] = None
+
+    def subscribe(
+        self,
+        routes: Optional[List[str]] = None,
+        snapshot: Optional[List[StatusEvent]] = None,
+    ) -> StatusSubscription:
+        """
+        Register a new subscription, starting the watcher if it is not already running.
+
+        :param snapshot: Statuses already sent to the client, such that changes made since then are not missed.
+        :raises OverflowError: If the maximum number of subscriptions is reached.
+        """
+        settings = get_config().get("STATUS_EVENTS", {})
+        subscription = StatusSubscription(routes, queue_size=settings.get("queue_size", 100), snapshot=snapshot)
+        with self.lock:
+            if len(self.subscriptions) >= settings.get("max_clients", 100):
+                raise OverflowError("Too many status events subscriptions.")
+            self.subscriptions.append(subscription)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.watch, name="canarieapi-status-events", daemon=True)
+                self.thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: StatusSubscription) -> None:
+        with self.lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+        subscription.closed = True
+
+    def watch(self) -> None:
+        """
+        Poll the database for changes until there are no more subscriptions.
+
+        The connection and statuses belong to this thread only, such that a new watcher started once this one stops
+        (see :meth:`subscribe`) is not affected by its cleanup.
+        """
+        logger = get_logger()
+        logger.info("Starting status events watcher.")
+        watcher = StatusWatcher()
+        try:
+            while True:
+                with self.lock:
+                    subscriptions = list(self.subscriptions)
+                    if not subscriptions:
+                        self.thread = None
+                        break
+                try:
+                    watcher.poll(subscriptions)
+                except (sqlite3.Error, StorageError) as exc:
+                    logger.warning("Failed to poll status changes: %s", exc)
+                    watcher.close()
+                time.sleep(get_config().get("STATUS_EVENTS", {}).get("interval", 1.0))
+        finally:
+            watcher.close()
+            logger.info("Stopped status events watcher.")
+
+
+STATUS_FEED = StatusFeed()
@@ -0,0 +1,556 @@
+#!/usr/bin/env python
+# coding:utf-8
+"""
+Storage backends of the access statistics, monitoring statuses, latency and cron jobs bookkeeping.
+
+These records are written by the cron jobs and read by every web worker. They are stored in the SQLite database by
+default, which limits clustered deployments to a database file shared by all nodes. The ``redis`` backend stores them
+on a server speaking the Redis protocol instead, shared by all nodes, such that web nodes serve every route from it.
+
+Other data remains in the local SQLite database of the node employing it: self-test jobs of the web workers, and the
+cache of probes, queue waits and sharding leases of the monitoring job. Monitoring shards (``MONITORING["sharding"]``)
+therefore require their workers to share the database file, otherwise the monitoring job must run on a single node.
+
+Modifications are applied by :meth:`StorageBackend.commit`: in the same transaction as other changes of the database
+for SQLite, and as a single pipelined ``MULTI``/``EXEC`` transaction for Redis, such that counters are incremented
+atomically with a single round-trip to the server.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import abc
+import datetime
+import json
+import os
+import socket
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+from urllib.parse import unquote, urlsplit
+
+# -- Project specific --------------------------------------------------------
+from canarieapi.settings import get_config
+
+StatusRecord = Tuple[str, str, str, str]  # route, service, status, message
+StatsRecord = Tuple[str, int, str]  # route, invocations, last access
+CronRecord = Tuple[str, str, Optional[float]]  # job, last execution, duration
+StatsIncrement = Tuple[int, str]  # invocations, last access
+# route, service, total, connect, tls, ttfb, bytes, samples (JSON list of total durations)
+LatencyRecord = Tuple[str, str, float, float, float, float, int, str]
+TimingRecord = Tuple[str, str, float]  # route, service, probe duration
+
+
+class StorageError(Exception):
+    """
+    Error of a storage backend other than the SQLite database.
+    """
+
+
+class StorageBackend(abc.ABC):
+    """
+    Operations on the access statistics, monitoring statuses, latency and cron jobs bookkeeping.
+
+    Routes are returned ordered by name, and statuses and latency by route and service.
+    """
+
+    @abc.abstractmethod
+    def increment_stats(self, increments: Mapping[str, StatsIncrement]) -> None:
+        """
+        Add invocations to the statistics of routes and update their last access.
+        """
+
+    @abc.abstractmethod
+    def get_stats(self, routes: Optional[Iterable[str]] = None) -> List[StatsRecord]:
+        """
+        Obtain the statistics of the specified routes (all by default).
+        """
+
+    @abc.abstractmethod
+    def get_last_access(self) -> Optional[str]:
+        """
+        Obtain the latest access of any route.
+        """
+
+    @abc.abstractmethod
+    def update_statuses(self, statuses: Iterable[StatusRecord]) -> None:
+        """
+        Insert or replace the statuses of monitored components.
+        """
+
+    @abc.abstractmethod
+    def get_statuses(self, routes: Optional[Iterable[str]] = None) -> List[StatusRecord]:
+        """
+        Obtain the statuses of monitored components of the specified routes (all by default).
+        """
+
+    @abc.abstractmethod
+    def get_status_version(self) -> Any:
+        """
+        Obtain a value that changes whenever statuses are modified by another connection.
+        """
+
+    @abc.abstractmethod
+    def update_latency(self, latency: Iterable[LatencyRecord]) -> None:
+        """
+        Insert or replace the latency of monitored components.
+        """
+
+    @abc.abstractmethod
+    def get_latency(self, routes: Optional[Iterable[str]] = None) -> List[LatencyRecord]:
+        """
+        Obtain the latency of monitored components of the specified routes (all by default).
+        """
+
+    @abc.abstractmethod
+    def update_timings(self, timings: Iterable[TimingRecord]) -> None:
+        """
+        Insert or replace the duration of the last probe of monitored components.
+        """
+
+    @abc.abstractmethod
+    def get_timings(self) -> List[TimingRecord]:
+        """
+        Obtain the duration of the last probe of every monitored component.
+        """
+
+    @abc.abstractmethod
+    def update_cron(self, job: str, duration: Optional[float] = None) -> None:
+        """
+        Record the execution of a cron job now, and its duration if provided.
+        """
+
+    @abc.abstractmethod
+    def get_cron(self) -> List[CronRecord]:
+        """
+        Obtain the last execution and duration of every cron job, ordered by job.
+        """
+
+    @abc.abstractmethod
+    def commit(self) -> None:
+        """
+        Apply the modifications.
+        """
+
+
+def _route_filter(routes: Optional[Iterable[str]]) -> Tuple[str, List[str]]:
+    if routes is None:
+        return "", []
+    return " and route in (select value from json_each(?))", [json.dumps(list(routes))]
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Storage in the ``stats``, ``status``, ``status_latency``, ``status_timing``, ``cron`` and ``cron_duration`` tables
+    of the SQLite database.
+
+    Modifications are part of the current transaction of the connection, which remains owned by the caller.
+    """
+
+    def __init__(self, database: sqlite3.Connection) -> None:
+        self.database = database
+
+    def increment_stats(self, increments: Mapping[str, StatsIncrement]) -> None:
+        # sqlite can take the date as a string as long as it is formatted using ISO-8601
+        self.database.executemany(
+            "insert or replace into stats (route, invocations, last_access) values ("
+            "?, ifnull((select invocations from stats where route = ?), 0) + ?, ?)",
+            [[route, route, invocations, last_access] for route, (invocations, last_access) in increments.items()],
+        )
+
+    def get_stats(self, routes: Optional[Iterable[str]] = None) -> List[StatsRecord]:
+        condition, params = _route_filter(routes)
+        cur = self.database.execute(
+            f"select route, invocations, last_access from stats where route is not null{condition} order by route",
+            params,
+        )
+        return cur.fetchall()
+
+    def get_last_access(self) -> Optional[str]:
+        record = self.database.execute("select last_access from stats order by last_access desc limit 1").fetchone()
+        return record[0] if record else None
+
+    def update_statuses(self, statuses: Iterable[StatusRecord]) -> None:
+        self.database.executemany(
+            "insert or replace into status (route, service, status, message) values (?, ?, ?, ?)", statuses
+        )
+
+    def get_statuses(self, routes: Optional[Iterable[str]] = None) -> List[StatusRecord]:
+        condition, params = _route_filter(routes)
+        cur = self.database.execute(
+            f"select route, service, status, message from status where 1{condition} order by route, service", params
+        )
+        return cur.fetchall()
+
+    def get_status_version(self) -> Any:
+        return self.database.execute("pragma data_version").fetchone()[0]
+
+    def update_latency(self, latency: Iterable[LatencyRecord]) -> None:
+        self.database.executemany(
+            "insert or replace into status_latency (route, service, total, connect, tls, ttfb, bytes, samples) "
+            "values (?, ?, ?, ?, ?, ?, ?, ?)",
+            latency,
+        )
+
+    def get_latency(self, routes: Optional[Iterable[str]] = None) -> List[LatencyRecord]:
+        condition, params = _route_filter(routes)
+        cur = self.database.execute(
+            "select route, service, total, connect, tls, ttfb, bytes, samples from status_latency "
+            f"where 1{condition} order by route, service",
+            params,
+        )
+        return cur.fetchall()
+
+    def update_timings(self, timings: Iterable[TimingRecord]) -> None:
+        self.database.executemany(
+            "insert or replace into status_timing (route, service, duration) values (?, ?, ?)", timings
+        )
+
+    def get_timings(self) -> List[TimingRecord]:
+        return self.database.execute("select route, service, duration from status_timing").fetchall()
+
+    def update_cron(self, job: str, duration: Optional[float] = None) -> None:
+        self.database.execute("insert or replace into cron (job, last_execution) values (?, CURRENT_TIMESTAMP)", [job])
+        if duration is not None:
+            self.database.execute("insert or replace into cron_duration (job, duration) values (?, ?)", [job, duration])
+
+    def get_cron(self) -> List[CronRecord]:
+        cur = self.database.execute(
+            "select cron.job, cron.last_execution, cron_duration.duration from cron "
+            "left join cron_duration on cron_duration.job = cron.job "
+            "order by cron.job"
+        )
+        return cur.fetchall()
+
+    def commit(self) -> None:
+        self.database.commit()
+
+
+class RedisError(StorageError):
+    """
+    Error reply of the server or failure to communicate with it.
+    """
+
+
+class RedisClient(object):
+    """
+    Minimal client of the Redis serialization protocol (RESP2), sending commands in pipelines.
+
+    :param url: Location of the server (``redis://[[user]:password@]host[:port][/db]``).
+    :param timeout: Seconds allowed to connect to the server and to obtain its replies.
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0) -> None:
+        parts = urlsplit(url)
+        if parts.scheme != "redis":
+            raise ValueError(f"Unsupported storage URL [{url}], expecting 'redis://host:port/db'.")
+        self.address = (parts.hostname or "localhost", parts.port or 6379)
+        self.username = unquote(parts.username) if parts.username else None
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.strip("/") or 0)
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.sock: Optional[socket.socket] = None
+        self.reader: Any = None
+
+    def connect(self) -> None:
+        self.sock = socket.create_connection(self.address, timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+        setup = []
+        if self.password:
+            setup.append(["AUTH", self.username, self.password] if self.username else ["AUTH", self.password])
+        if self.db:
+            setup.append(["SELECT", self.db])
+        if setup:
+            self.check_replies(self.send(setup))
+
+    def close(self) -> None:
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+            self.sock = self.reader = None
+
+    @staticmethod
+    def encode(command: Sequence[Any]) -> bytes:
+        parts = [f"*{len(command)}\r\n".encode()]
+        for arg in command:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def read_reply(self) -> Any:
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise RedisError("Connection closed by the storage server.")
+        kind, value = line[:1], line[1:-2]
+        if kind == b"+":
+            return value.decode("utf-8")
+        if kind == b":":
+            return int(value)
+        if kind == b"$":
+            if int(value) < 0:
+                return None
+            data = self.reader.read(int(value) + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            if int(value) < 0:
+                return None
+            return [self.read_reply() for _ in range(int(value))]
+        if kind == b"-":
+            return RedisError(value.decode("utf-8"))
+        raise RedisError(f"Invalid reply from the storage server: {line!r}")
+
+    def send(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        # must be called while holding the lock once connected
+        self.sock.sendall(b"".join(self.encode(command) for command in commands))
+        return [self.read_reply() for _ in commands]
+
+    @staticmethod
+    def check_replies(replies: List[Any]) -> List[Any]:
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def execute(self, *commands: Sequence[Any]) -> List[Any]:
+        """
+        Send all commands at once and obtain their replies, in a single round-trip.
+
+        :raises RedisError: If any command failed, or the server could not be reached.
+        """
+        with self.lock:
+            try:
+                if self.sock is None:
+                    self.connect()
+                replies = self.send(commands)
+            except OSError as exc:
+                self.close()
+                raise RedisError(f"Failed to communicate with the storage server {self.address}: {exc}") from exc
+            except RedisError:
+                self.close()  # connection closed by the server, or out of sync after an invalid reply
+                raise
+        # every reply was read, the connection remains usable after error replies
+        return self.check_replies(replies)
+
+
+class RedisPool(object):
+    """
+    Connections to a server shared by every thread (or greenlet) of the process, reused across operations.
+
+    Each operation employs an idle connection, or a new one if all of them are in use.
+
+    :param max_idle: Maximum number of idle connections kept open.
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0, max_idle: int = 16) -> None:
+        self.url = url
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.lock = threading.Lock()
+        self.idle: List[RedisClient] = []
+        self.pid = os.getpid()
+
+    def execute(self, *commands: Sequence[Any]) -> List[Any]:
+        """
+        Send all commands at once with an idle connection and obtain their replies, in a single round-trip.
+
+        :raises RedisError: If any command failed, or the server could not be reached.
+        """
+        with self.lock:
+            if self.pid != os.getpid():  # connections inherited from the parent process must not be shared with it
+                self.idle, self.pid = [], os.getpid()
+            client = self.idle.pop() if self.idle else RedisClient(self.url, timeout=self.timeout)
+        try:
+            return client.execute(*commands)
+        finally:
+            with self.lock:
+                if len(self.idle) < self.max_idle:
+                    self.idle.append(client)
+                else:
+                    client.close()
+
+    def close(self) -> None:
+        """
+        Close the idle connections.
+        """
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for client in idle:
+            client.close()
+
+
+def _pairs(values: Optional[List[str]]) -> Dict[str, str]:
+    values = values or []
+    return dict(zip(values[::2], values[1::2]))
+
+
+class RedisStorage(StorageBackend):
+    """
+    Storage on a server speaking the Redis protocol, shared by all nodes of a deployment.
+
+    Keys (prefixed):
+
+    - ``stats:<route>``: hash of ``invocations`` and ``last_access`` of the route, routes listed in ``stats``.
+    - ``status:<route>``: hash of the JSON ``[status, message]`` of each component, routes listed in ``status``,
+      with ``status_version`` incremented on every modification.
+    - ``latency:<route>``: hash of the JSON ``[total, connect, tls, ttfb, bytes, samples]`` of each component, routes
+      listed in ``latency``.
+    - ``timing:<route>``: hash of the last probe duration of each component, routes listed in ``timing``.
+    - ``cron`` and ``cron_duration``: hashes of the last execution and duration of each job.
+
+    Modifications are queued until committed.
+    """
+
+    def __init__(self, pool: RedisPool, prefix: str = "canarieapi:") -> None:
+        self.pool = pool
+        self.prefix = prefix
+        self.queued: List[List[Any]] = []
+
+    def key(self, *parts: str) -> str:
+        return self.prefix + ":".join(parts)
+
+    def get_routes(self, kind: str, routes: Optional[Iterable[str]]) -> List[str]:
+        if routes is None:
+            routes = self.pool.execute(["SMEMBERS", self.key(kind)])[0]
+        return sorted(set(routes))
+
+    def increment_stats(self, increments: Mapping[str, StatsIncrement]) -> None:
+        for route, (invocations, last_access) in increments.items():
+            self.queued.append(["HINCRBY", self.key("stats", route), "invocations", invocations])
+            self.queued.append(["HSET", self.key("stats", route), "last_access", last_access])
+            self.queued.append(["SADD", self.key("stats"), route])
+
+    def get_stats(self, routes: Optional[Iterable[str]] = None) -> List[StatsRecord]:
+        routes = self.get_routes("stats", routes)
+        if not routes:
+            return []
+        replies = self.pool.execute(*[
+            ["HMGET", self.key("stats", route), "invocations", "last_access"] for route in routes
+        ])
+        return [
+            (route, int(invocations or 0), last_access)
+            for route, (invocations, last_access) in zip(routes, replies)
+            if invocations is not None or last_access is not None
+        ]
+
+    def get_last_access(self) -> Optional[str]:
+        last_accesses = [last_access for _, _, last_access in self.get_stats() if last_access]
+        return max(last_accesses) if last_accesses else None
+
+    def update_statuses(self, statuses: Iterable[StatusRecord]) -> None:
+        routes = set()
+        for route, service, status, message in statuses:
+            self.queued.append(["HSET", self.key("status", route), service, json.dumps([status, message])])
+            routes.add(route)
+        if routes:
+            self.queued.append(["SADD", self.key("status"), *sorted(routes)])
+            self.queued.append(["INCR", self.key("status_version")])
+
+    def get_statuses(self, routes: Optional[Iterable[str]] = None) -> List[StatusRecord]:
+        routes = self.get_routes("status", routes)
+        if not routes:
+            return []
+        replies = self.pool.execute(*[["HGETALL", self.key("status", route)] for route in routes])
+        statuses = []
+        for route, reply in zip(routes, replies):
+            for service, value in sorted(_pairs(reply).items()):
+                status, message = json.loads(value)
+                statuses.append((route, service, status, message))
+        return statuses
+
+    def get_status_version(self) -> Any:
+        return self.pool.execute(["GET", self.key("status_version")])[0]
+
+    def update_latency(self, latency: Iterable[LatencyRecord]) -> None:
+        routes = set()
+        for route, service, *values in latency:
+            self.queued.append(["HSET", self.key("latency", route), service, json.dumps(values)])
+            routes.add(route)
+        if routes:
+            self.queued.append(["SADD", self.key("latency"), *sorted(routes)])
+
+    def get_latency(self, routes: Optional[Iterable[str]] = None) -> List[LatencyRecord]:
+        routes = self.get_routes("latency", routes)
+        if not routes:
+            return []
+        replies = self.pool.execute(*[["HGETALL", self.key("latency", route)] for route in routes])
+        return [
+            (route, service, *json.loads(value))  # type: ignore
+            for route, reply in zip(routes, replies)
+            for service, value in sorted(_pairs(reply).items())
+        ]
+
+    def update_timings(self, timings: Iterable[TimingRecord]) -> None:
+        routes = set()
+        for route, service, duration in timings:
+            self.queued.append(["HSET", self.key("timing", route), service, repr(float(duration))])
+            routes.add(route)
+        if routes:
+            self.queued.append(["SADD", self.key("timing"), *sorted(routes)])
+
+    def get_timings(self) -> List[TimingRecord]:
+        routes = self.get_routes("timing", None)
+        if not routes:
+            return []
+        replies = self.pool.execute(*[["HGETALL", self.key("timing", route)] for route in routes])
+        return [
+            (route, service, float(duration))
+            for route, reply in zip(routes, replies)
+            for service, duration in sorted(_pairs(reply).items())
+        ]
+
+    def update_cron(self, job: str, duration: Optional[float] = None) -> None:
+        # same format as CURRENT_TIMESTAMP of SQLite
+        now = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        self.queued.append(["HSET", self.key("cron"), job, now])
+        if duration is not None:
+            self.queued.append(["HSET", self.key("cron_duration"), job, repr(float(duration))])
+
+    def get_cron(self) -> List[CronRecord]:
+        executions, durations = self.pool.execute(["HGETALL", self.key("cron")],
+                                                  ["HGETALL", self.key("cron_duration")])
+        durations = _pairs(durations)
+        return [
+            (job, last_execution, float(durations[job]) if job in durations else None)
+            for job, last_execution in sorted(_pairs(executions).items())
+        ]
+
+    def commit(self) -> None:
+        if not self.queued:
+            return
+        queued, self.queued = self.queued, []
+        results = self.pool.execute(["MULTI"], *queued, ["EXEC"])[-1]
+        if results is None:
+            raise RedisError("Transaction aborted by the storage server.")
+        for result in results:
+            if isinstance(result, RedisError):
+                raise result
+
+
+_REDIS_POOLS: Dict[Tuple[str, float], RedisPool] = {}
+_REDIS_POOLS_LOCK = threading.Lock()
+
+
+def get_redis_pool(url: str, timeout: float) -> RedisPool:
+    """
+    Obtain the connections pool of the process for the server.
+    """
+    with _REDIS_POOLS_LOCK:
+        if (url, timeout) not in _REDIS_POOLS:
+            _REDIS_POOLS[(url, timeout)] = RedisPool(url, timeout=timeout)
+        return _REDIS_POOLS[(url, timeout)]
+
+
+def get_storage(database: sqlite3.Connection) -> StorageBackend:
+    """
+    Obtain the configured storage backend (``STORAGE["backend"]``).
+
+    :param database: Connection employed by the ``sqlite`` backend.
+    """
+    settings = get_config().get("STORAGE", {})
+    backend = settings.get("backend", "sqlite")
+    if backend == "sqlite":
+        return SQLiteStorage(database)
+    if backend == "redis":
+        pool = get_redis_pool(settings.get("url", "redis://localhost:6379/0"), settings.get("timeout", 5))
+        return RedisStorage(pool, prefix=settings.get("prefix", "canarieapi:"))
+    raise ValueError(f"Unknown storage backend [{backend}], expecting 'sqlite' or 'redis'.")
@@ -0,0 +1,24 @@
+"""
+Type definitions shared across modules, kept free of heavy dependencies so any module can import them.
+"""
+
+from typing import Dict, List, Union
+from typing_extensions import TypeAlias
+
+_JSON: TypeAlias = "JSON"  # pylint: disable=C0103
+JSON = Union[  # pylint: disable=C0103
+    Dict[
+        str,
+        Union[
+            Dict[str, _JSON],
+            List[_JSON],
+            _JSON,
+            float,
+            int,
+            str,
+            bool,
+            None
+        ]
+    ],
+    _JSON
+]
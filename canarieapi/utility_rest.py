@@ -9,45 +9,31 @@ module and which are placed here to keep the rest_route module as clean as possi
 
 # -- Standard lib ------------------------------------------------------------
 import configparser
-import functools
+import datetime
+import hashlib
 import http.client
-import inspect
-import os
+import json
 import re
 import sqlite3
-from typing import Any, Dict, List, Optional, Tuple, TypeVar, Union
-from typing_extensions import Literal, Protocol, TypeAlias
+from typing import Any, Optional, Tuple, Union
+from typing_extensions import Literal
 
 # -- 3rd party ---------------------------------------------------------------
-from flask import Response, current_app, g, jsonify, redirect, render_template, request
+from dateutil.parser import parse as dt_parse
+from flask import Response, g, jsonify, make_response, redirect, render_template, request
 from flask.typing import ResponseReturnValue
 from werkzeug.datastructures import MIMEAccept
 from werkzeug.exceptions import BadRequest, HTTPException, NotFound
+from werkzeug.http import is_resource_modified
 from werkzeug.routing import BaseConverter, Map
 
 # -- Project specific --------------------------------------------------------
 from canarieapi.app_object import APP
+from canarieapi.database import init_db  # noqa: F401  # pylint: disable=W0611  # backward compatibility
+from canarieapi.database import connect_db, make_retry_db_error_after_init
+from canarieapi.typedefs import JSON
 
 APIType = Literal["platform", "service"]
-_JSON: TypeAlias = "JSON"  # pylint: disable=C0103
-JSON = Union[  # pylint: disable=C0103
-    Dict[
-        str,
-        Union[
-            Dict[str, _JSON],
-            List[_JSON],
-            _JSON,
-            float,
-            int,
-            str,
-            bool,
-            None
-        ]
-    ],
-    _JSON
-]
-
-ReturnType = TypeVar("ReturnType")  # pylint: disable=C0103
 
 
 def request_wants_json() -> bool:
@@ -158,7 +144,9 @@ def get_canarie_api_response(route_name: str, api_type: APIType, api_request: st
     try:
         cfg_val = get_config(route_name, api_type)["redirect"][api_request]
         if cfg_val.find("http") == 0:
-            return redirect(cfg_val)
+            response = redirect(cfg_val)
+            response.headers["Cache-Control"] = get_cache_control(dynamic=False)
+            return response
     except KeyError:
         pass
 
@@ -169,6 +157,94 @@ def get_canarie_api_response(route_name: str, api_type: APIType, api_request: st
     raise configparser.Error(msg)
 
 
+def get_cache_control(dynamic: bool) -> str:
+    """
+    Obtain the ``Cache-Control`` header value to apply to a response.
+
+    :param dynamic:
+        Whether the response content depends on data updated by cron jobs (``stats``, ``status``), in which case
+        clients must always revalidate it using the entity tag, or only on the configuration (``info``, home page,
+        redirects), in which case it can be cached for ``CACHE_MAX_AGE`` seconds.
+    """
+    if dynamic:
+        return "no-cache"
+    max_age = int(APP.config.get("CACHE_MAX_AGE", 0))
+    return f"public, max-age={max_age}"
+
+
+def hash_content(*parts: Any) -> str:
+    """
+    Compute a version hash of the JSON representation of the given content parts.
+    """
+    content = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Generate a strong entity tag from the content version parts that a response depends on.
+
+    The requested representation (JSON or HTML) is included such that each format obtains a distinct tag.
+    The script root is also considered since rendered HTML links depend on it when served behind a reverse proxy.
+    """
+    return hash_content(request_wants_json(), request.script_root, parts)
+
+
+def parse_last_modified(*datetimes: Optional[str]) -> Optional[datetime.datetime]:
+    """
+    Obtain the most recent datetime amongst ISO-8601 strings, ignoring any ``Never`` or missing values.
+    """
+    last_modified = None
+    for dt_str in datetimes:
+        if not dt_str or dt_str == "Never":
+            continue
+        dt = dt_parse(dt_str)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=datetime.timezone.utc)
+        if last_modified is None or dt > last_modified:
+            last_modified = dt
+    return last_modified
+
+
+def get_not_modified_response(
+    etag: str,
+    last_modified: Optional[datetime.datetime] = None,
+    dynamic: bool = False,
+) -> Optional[Response]:
+    """
+    Generate a ``304 Not Modified`` response if the conditional request headers match the current content version.
+
+    Both ``If-None-Match`` and ``If-Modified-Since`` are considered, with precedence given to the entity tag.
+    Returns nothing if the content must be generated, allowing to skip the rendering cost otherwise.
+    """
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    response = Response(status=304)
+    return set_cache_headers(response, etag, last_modified, dynamic=dynamic)
+
+
+def set_cache_headers(
+    response: ResponseReturnValue,
+    etag: str,
+    last_modified: Optional[datetime.datetime] = None,
+    dynamic: bool = False,
+) -> Response:
+    """
+    Apply the validation and caching headers to the response.
+
+    .. seealso::
+        - :func:`get_cache_control`
+        - :func:`get_not_modified_response`
+    """
+    response = make_response(response)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = get_cache_control(dynamic)
+    response.vary.add("Accept")
+    return response
+
+
 def make_error_response(
     http_status: Optional[int] = None,
     http_status_response: Optional[str] = None,
@@ -223,107 +299,12 @@ def get_db(allow_cache: bool = True, connect: bool = True) -> sqlite3.Connection
         APP.logger.info("Database found. Reusing cached connection...")
     elif connect:
         APP.logger.info("Database not defined. Establishing connection...")
-
-        database_fn = APP.config["DATABASE"]["filename"]
-        APP.logger.debug("Using configured filename: [%s]", database_fn)
-        if not os.path.isabs(database_fn):
-            database_fn = os.path.join(APP.root_path, database_fn)
-        database_fn = os.path.abspath(database_fn)
-
-        APP.logger.debug("Setup database connection with filename: [%s]", database_fn)
-        db_exists = os.path.isfile(database_fn)  # must resolve before connect otherwise file already created
-        try:
-            database = g._database = sqlite3.connect(database_fn)
-        except Exception as exc:
-            APP.logger.error(
-                "Error [%s] occurred during database connection with filename: [%s].",
-                str(exc), database_fn, exc_info=exc
-            )
-            APP.logger.debug("Reraise for error reporting.")
-            raise
-
-        APP.logger.debug("Initialize database with filename: [%s]", database_fn)
-        if db_exists:
-            APP.logger.debug("Skipping database initialization: [%s] (already exists)", database_fn)
-        else:
-            try:
-                init_db(database)
-            except Exception as exc:
-                APP.logger.error(
-                    "Error [%s] occurred during database initialization with filename: [%s].",
-                    str(exc), database_fn, exc_info=exc
-                )
-                APP.logger.debug("Closing database.")
-                database.close()
-                APP.logger.debug("Deleting database filename (reset for recreation): [%s].", database_fn)
-                os.remove(database_fn)
-                APP.logger.debug("Reraise for error reporting.")
-                raise
-
+        database = g._database = connect_db()
     return database
 
 
-def init_db(database: sqlite3.Connection) -> None:
-    """
-    Initialize a database from a schema.
-    """
-    APP.logger.debug("Initializing database")
-    with current_app.app_context():
-        dbs_fn = "database_schema.sql"
-        if os.path.isabs(dbs_fn):
-            schema_fn = dbs_fn
-        else:
-            schema_fn = os.path.join(APP.root_path, dbs_fn)
-
-        APP.logger.debug("Using schema filename : %s", schema_fn)
-        with current_app.open_resource(schema_fn, mode="r") as schema_f:
-            database.cursor().executescript(schema_f.read())
-        database.commit()
-
-
-class DatabaseRetryFunction(Protocol):
-    def __call__(self, *args: Any, database: Optional[sqlite3.Connection] = None, **kwargs: Any) -> ReturnType:
-        ...
-
-
-def retry_db_error_after_init(func: DatabaseRetryFunction) -> DatabaseRetryFunction:
-    """
-    Decorator that will retry a failing operation if an error related to database initialization occurred.
-    """
-    @functools.wraps(func)
-    def retry(*args: Any, database: sqlite3.Connection = None, **kwargs: Any) -> ReturnType:
-        db_param = inspect.signature(func).parameters.get("database")
-        db = None
-        with APP.app_context():
-            if db_param and "sqlite3.Connection" in str(db_param.annotation):
-                db = database or get_db()
-                kwargs["database"] = db
-            try:
-                return func(*args, **kwargs)
-            except sqlite3.OperationalError as exc:
-                mod = getattr(func, "__module__", "")
-                mod = f"{mod}." if mod else ""
-                name = f"{mod}.{func.__name__}"
-                if "no such table" in str(exc):
-                    if not db:
-                        APP.logger.debug(
-                            "Missing database parameter to retry operation [%s] after initialization.",
-                            name,
-                        )
-                    else:
-                        APP.logger.warning(
-                            "Error from database [%s] during [%s] operation. Retrying after initialization.",
-                            name, exc,
-                        )
-                        init_db(db)
-                        return func(*args, **kwargs)
-                APP.logger.error(
-                    "Error from database: [%s] during [%s] operation. Could not recover.",
-                    name, exc,
-                )
-                raise
-
-    return retry
+# Decorator for operations performed by the application, using its cached connection when none is given
+retry_db_error_after_init = make_retry_db_error_after_init(get_db, APP.app_context)
 
 
 class AnyIntConverter(BaseConverter):
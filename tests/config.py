@@ -21,5 +21,8 @@ for name, svc in SERVICES.items():
     svc["info"]["name"] = name
     svc["stats"]["route"] = f"/{name}/.*"
 
+# allow every test to start its own self-test job
+SELF_TEST_JOBS["min_interval"] = 0
+
 # avoid errors triggered by sample config during tests
 PLATFORMS.clear()
@@ -9,11 +9,16 @@ from tests import config as test_config
 @pytest.fixture()
 def tmp_config():
     from canarieapi.api import APP
+    from canarieapi.snapshot import reset_status_snapshot
 
     APP.config.from_object(test_config)
+    logger = APP.logger
 
     yield
 
+    APP.logger = logger  # restore in case a test replaced it
+    reset_status_snapshot()
+
     tmp_dir = os.path.dirname(test_config.DATABASE["filename"])
     if "tmp" in tmp_dir and os.path.isdir(tmp_dir):
         shutil.rmtree(tmp_dir)
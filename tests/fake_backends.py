@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Farm of local HTTP servers emulating monitored components, to exercise the monitoring job at scale without network.
+
+Each component is served on its own path by one of the servers of the farm, with a configurable latency, response
+status and body size. Blackhole components accept connections and read requests, but never respond, such that probes
+only end with their timeout.
+"""
+import asyncio
+import copy
+import os
+import random
+import ssl
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from canarieapi.status import Status
+from tests import config as test_config
+
+# self-signed certificate (and its key) of 'localhost' and '127.0.0.1', valid until 2126
+TLS_CERTIFICATE = os.path.join(os.path.dirname(__file__), "data", "localhost.pem")
+
+
+class FakeComponent(object):
+    def __init__(
+        self,
+        latency: float = 0.0,
+        status: int = 200,
+        body_size: int = 2,
+        blackhole: bool = False,
+        etag: Optional[str] = None,
+    ) -> None:
+        self.latency = latency
+        self.status = status
+        self.body_size = body_size
+        self.blackhole = blackhole
+        self.etag = etag
+
+    @property
+    def expected_status(self) -> str:
+        if self.blackhole:
+            return Status.down
+        return Status.ok if self.status == 200 else Status.bad
+
+
+class FakeBackendFarm(object):
+    """
+    Local HTTP servers running in the event loop of a background thread.
+    """
+
+    def __init__(self, hosts: int = 1, tls: bool = False) -> None:
+        self.hosts = hosts
+        self.tls = tls
+        self.ports: List[int] = []
+        self.components: Dict[str, FakeComponent] = {}
+        self.requests = 0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stopped: Optional[asyncio.Event] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "FakeBackendFarm":
+        self.start()
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.stop()
+
+    def add(self, component: FakeComponent) -> str:
+        """
+        Register the component and obtain its URL.
+        """
+        path = f"/component/{len(self.components)}"
+        self.components[path] = component
+        port = self.ports[len(self.components) % len(self.ports)]
+        return f"{'https' if self.tls else 'http'}://127.0.0.1:{port}{path}"
+
+    def start(self) -> None:
+        started = threading.Event()
+
+        async def run() -> None:
+            self.stopped = asyncio.Event()
+            context = None
+            if self.tls:
+                context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+                context.load_cert_chain(TLS_CERTIFICATE)
+            servers = [await asyncio.start_server(self.handle, "127.0.0.1", 0, ssl=context) for _ in range(self.hosts)]
+            self.ports = [server.sockets[0].getsockname()[1] for server in servers]
+            started.set()
+            await self.stopped.wait()
+            for server in servers:
+                server.close()
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(run(),), daemon=True)
+        self.thread.start()
+        started.wait(timeout=10)
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.stopped.set)
+        self.thread.join(timeout=10)
+        self.loop.close()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while not self.stopped.is_set():
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                if_none_match = None
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    name, value = line.decode("latin-1").split(":", 1)
+                    if name.strip().lower() == "content-length":
+                        length = int(value)
+                    elif name.strip().lower() == "if-none-match":
+                        if_none_match = value.strip()
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+
+                method, target = request_line.decode("latin-1").split(" ")[:2]
+                path = target.split("?", 1)[0]
+                component = self.components.get(path, FakeComponent(status=404))
+                if component.blackhole:
+                    await self.stopped.wait()
+                    break
+                if component.latency:
+                    await asyncio.sleep(component.latency)
+                status, body = component.status, b"x" * component.body_size
+                if component.status == 200 and component.etag and if_none_match == component.etag:
+                    status, body = 304, b""
+                headers = f"HTTP/1.1 {status} Fake\r\nContent-Length: {len(body)}\r\n"
+                if component.etag:
+                    headers += f"ETag: {component.etag}\r\n"
+                headers = (headers + "\r\n").encode()
+                writer.write(headers if method == "HEAD" else headers + body)
+                await writer.drain()
+        except (ConnectionError, ssl.SSLError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def make_monitored_services(
+    farm: FakeBackendFarm,
+    components: int,
+    components_per_service: int = 1,
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    blackhole_rate: float = 0.0,
+    body_size: int = 2,
+    timeout: float = 1.0,
+    seed: int = 0,
+) -> Dict[str, dict]:
+    """
+    Generate the ``SERVICES`` configuration monitoring the given number of components served by the farm.
+
+    Components fail (status 500) or never respond according to the given rates, drawn reproducibly from the seed.
+    """
+    rng = random.Random(seed)
+    services = {}
+    for index in range(components):
+        name = f"service-{index // components_per_service}"
+        if name not in services:
+            services[name] = copy.deepcopy(test_config.TEST_SERVICE_CONFIG)
+            services[name]["info"]["name"] = name
+            services[name]["stats"]["route"] = f"/{name}/.*"
+            services[name]["monitoring"] = {}
+        draw = rng.random()
+        component = FakeComponent(
+            latency=latency,
+            status=500 if blackhole_rate <= draw < blackhole_rate + error_rate else 200,
+            body_size=body_size,
+            blackhole=draw < blackhole_rate,
+        )
+        services[name]["monitoring"][f"Component-{index}"] = {
+            "request": {"url": farm.add(component), "timeout": timeout},
+        }
+    return services
+
+
+def count_expected_status(farm: FakeBackendFarm) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for component in farm.components.values():
+        counts[component.expected_status] = counts.get(component.expected_status, 0) + 1
+    return counts
+
+
+class FakeRedisServer(object):
+    """
+    Local server speaking the Redis protocol (RESP2), implementing the commands employed by the storage backend.
+
+    Commands received at once (pipelined) are counted as a single round-trip.
+    """
+
+    def __init__(self, password: Optional[str] = None) -> None:
+        self.password = password
+        self.data: Dict[str, Any] = {}
+        self.round_trips = 0
+        self.commands: List[List[str]] = []
+        self.port = 0
+        self.writers: List[asyncio.StreamWriter] = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stopped: Optional[asyncio.Event] = None
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}127.0.0.1:{self.port}/1"
+
+    def __enter__(self) -> "FakeRedisServer":
+        started = threading.Event()
+
+        async def run() -> None:
+            self.stopped = asyncio.Event()
+            server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+            self.port = server.sockets[0].getsockname()[1]
+            started.set()
+            await self.stopped.wait()
+            server.close()
+            for writer in self.writers:
+                writer.close()  # connections kept open by clients
+            await asyncio.sleep(0.01)
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(run(),), daemon=True)
+        self.thread.start()
+        started.wait(timeout=10)
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.loop.call_soon_threadsafe(self.stopped.set)
+        self.thread.join(timeout=10)
+        self.loop.close()
+
+    @staticmethod
+    def parse(buffer: bytes) -> Tuple[Optional[List[str]], bytes]:
+        # obtain the first complete command of the buffer, if any, and the remaining data
+        lines = buffer.split(b"\r\n")
+        if len(lines) < 2 or not lines[0].startswith(b"*"):
+            return None, buffer
+        count = int(lines[0][1:])
+        if len(lines) < 2 + count * 2:
+            return None, buffer
+        args = [lines[2 + index * 2].decode() for index in range(count)]
+        return args, b"\r\n".join(lines[1 + count * 2:])
+
+    @staticmethod
+    def encode(reply: Any) -> bytes:
+        if isinstance(reply, Exception):
+            return f"-ERR {reply}\r\n".encode()
+        if reply is True:
+            return b"+OK\r\n"
+        if isinstance(reply, int):
+            return f":{reply}\r\n".encode()
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, list):
+            return f"*{len(reply)}\r\n".encode() + b"".join(FakeRedisServer.encode(item) for item in reply)
+        data = str(reply).encode()
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+    def execute(self, name: str, *args: str) -> Any:
+        data = self.data
+        if name == "PING":
+            return "PONG"
+        if name == "SELECT":
+            return True
+        if name == "GET":
+            return data.get(args[0])
+        if name == "INCR":
+            data[args[0]] = str(int(data.get(args[0], 0)) + 1)
+            return int(data[args[0]])
+        if name == "HSET":
+            values = data.setdefault(args[0], {})
+            added = len([field for field in args[1::2] if field not in values])
+            values.update(zip(args[1::2], args[2::2]))
+            return added
+        if name == "HINCRBY":
+            values = data.setdefault(args[0], {})
+            values[args[1]] = str(int(values.get(args[1], 0)) + int(args[2]))
+            return int(values[args[1]])
+        if name == "HMGET":
+            return [data.get(args[0], {}).get(field) for field in args[1:]]
+        if name == "HGETALL":
+            return [item for pair in data.get(args[0], {}).items() for item in pair]
+        if name == "SADD":
+            members = data.setdefault(args[0], set())
+            added = len(set(args[1:]) - members)
+            members.update(args[1:])
+            return added
+        if name == "SMEMBERS":
+            return sorted(data.get(args[0], set()))
+        raise ValueError(f"unknown command '{name}'")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.writers.append(writer)
+        buffer = b""
+        authenticated = not self.password
+        transaction: Optional[List[List[str]]] = None
+        try:
+            while not self.stopped.is_set():
+                data = await reader.read(65536)
+                if not data:
+                    break
+                buffer += data
+                replies = []
+                while True:
+                    command, buffer = self.parse(buffer)
+                    if command is None:
+                        break
+                    self.commands.append(command)
+                    name = command[0].upper()
+                    if name == "AUTH":
+                        authenticated = command[-1] == self.password
+                        replies.append(True if authenticated else ValueError("invalid password"))
+                    elif not authenticated:
+                        replies.append(ValueError("NOAUTH Authentication required."))
+                    elif name == "MULTI":
+                        transaction = []
+                        replies.append(True)
+                    elif name == "EXEC":
+                        results = []
+                        for queued in transaction or []:
+                            try:
+                                results.append(self.execute(queued[0].upper(), *queued[1:]))
+                            except ValueError as exc:
+                                results.append(exc)
+                        transaction = None
+                        replies.append(results)
+                    elif transaction is not None:
+                        transaction.append(command)
+                        replies.append("QUEUED")
+                    else:
+                        try:
+                            replies.append(self.execute(name, *command[1:]))
+                        except ValueError as exc:
+                            replies.append(exc)
+                if replies:
+                    self.round_trips += 1
+                    writer.write(b"".join(self.encode(reply) for reply in replies))
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Utilities of load tests, running the application in-process or in separate server processes and driving them with
+many concurrent HTTP/1.1 persistent connections.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from werkzeug.serving import make_server
+
+from canarieapi.database import SCHEMA_FILENAME
+
+LOAD_CONFIG = """
+import copy
+
+from canarieapi.default_configuration import *  # noqa
+
+DATABASE = {{"filename": {database!r}, "access_log": {access_log!r}}}
+PARSE_LOGS = False
+STARTUP_SELF_TEST = {{"enabled": False}}
+CONFIG_RELOAD = {{"enabled": False}}
+
+_TEMPLATE = SERVICES.pop(list(SERVICES)[0])
+for _index in range({services}):
+    _name = f"service-{{_index}}"
+    SERVICES[_name] = copy.deepcopy(_TEMPLATE)
+    SERVICES[_name]["info"]["name"] = _name
+    SERVICES[_name]["stats"]["route"] = f"/{{_name}}/.*"
+PLATFORMS.clear()
+"""
+
+# seconds, waiting for a server process to accept requests
+SERVER_START_TIMEOUT = 30
+
+# results stored in baselines, relatively to the calibration (see 'calibration_app')
+BASELINE_METRICS = ["rps", "p50", "p95", "p99"]
+
+
+def make_load_config(directory: str, services: int = 10) -> str:
+    """
+    Write a configuration with the given number of services and a database populated with their statistics and status.
+
+    :returns: Path of the configuration file.
+    """
+    database = os.path.join(directory, "stats.db")
+    config_path = os.path.join(directory, "config.py")
+    with open(config_path, mode="w", encoding="utf-8") as config_file:
+        config_file.write(LOAD_CONFIG.format(
+            database=database, access_log=os.path.join(directory, "nginx.log"), services=services,
+        ))
+
+    db = sqlite3.connect(database)
+    with open(SCHEMA_FILENAME, mode="r", encoding="utf-8") as schema:
+        db.executescript(schema.read())
+    names = [f"service-{index}" for index in range(services)]
+    db.executemany("insert into stats values (?, ?, ?)",
+                   [(name, index * 10, "2024-01-01T00:00:00Z") for index, name in enumerate(names)])
+    db.executemany("insert into status values (?, ?, ?, ?)",
+                   [(name, "Component", "ok", "") for name in names])
+    db.executemany("insert into cron values (?, ?)",
+                   [(job, "2024-01-01 00:00:00") for job in ["status", "log"]])
+    db.executemany("insert into cron_duration values (?, ?)", [("status", 1.5), ("log", 0.5)])
+    db.commit()
+    db.close()
+    return config_path
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode: str, config_path: str, port: int) -> subprocess.Popen:
+    """
+    Start the application in a separate process, served either by ``gunicorn`` with a ``gevent`` worker (``wsgi``), as
+    in the provided Docker image, or by ``uvicorn`` (``asgi``).
+    """
+    if mode == "wsgi":
+        command = [sys.executable, "-m", "gunicorn", "-b", f"127.0.0.1:{port}", "--workers", "1",
+                   "-k", "gevent", "--log-level", "warning", "canarieapi.wsgi"]
+    elif mode == "asgi":
+        command = [sys.executable, "-m", "uvicorn", "--host", "127.0.0.1", "--port", str(port),
+                   "--log-level", "warning", "canarieapi.asgi:application"]
+    else:
+        raise ValueError(f"Unknown serving mode: [{mode}]")
+    env = dict(os.environ, CANARIE_API_CONFIG_FN=config_path, CANARIE_API_SKIP_CHECK="true")
+    proc = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server [{mode}] stopped:\n{proc.stderr.read().decode()}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/?f=json", timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.1)
+    stop_server(proc)
+    raise RuntimeError(f"Server [{mode}] did not start within {SERVER_START_TIMEOUT}s.")
+
+
+def stop_server(proc: subprocess.Popen) -> None:
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+    proc.stderr.close()
+
+
+async def http_get(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, path: str) -> Tuple[int, bytes]:
+    """
+    Send a GET request over a persistent connection and read its complete response.
+    """
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nAccept: application/json\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    status = int((await reader.readline()).split(b" ", 2)[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, value = line.decode("latin-1").split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+    if "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        body = b""
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            chunk = await reader.readexactly(size + 2)
+            if not size:
+                break
+            body += chunk[:-2]
+    else:
+        body = await reader.read()
+    if headers.get("connection", "").lower() == "close":
+        writer.close()
+    return status, body
+
+
+LoadSamples = Dict[str, List[Tuple[float, bool]]]  # path: (latency in seconds, success)
+
+
+async def generate_load(port: int, paths: List[str], concurrency: int, duration: float,
+                        expected_status: Optional[int] = None) -> LoadSamples:
+    """
+    Send requests on the given paths in turn with concurrent clients during the given duration (closed loop).
+
+    Requests are successful if they obtain the expected status, or any status other than server errors by default.
+    """
+    samples: LoadSamples = {path: [] for path in paths}
+    deadline = time.perf_counter() + duration
+
+    async def client(offset: int) -> None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        index = offset
+        try:
+            while time.perf_counter() < deadline:
+                path = paths[index % len(paths)]
+                index += 1
+                start = time.perf_counter()
+                try:
+                    if writer.is_closing():
+                        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                    status, _ = await http_get(reader, writer, path)
+                    success = status == expected_status if expected_status else status < 500
+                except (OSError, ValueError, asyncio.IncompleteReadError):
+                    success = False
+                    writer.close()
+                samples[path].append((time.perf_counter() - start, success))
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(client(offset) for offset in range(concurrency)))
+    return samples
+
+
+@contextlib.contextmanager
+def serve_in_process(app: Callable) -> Iterator[int]:
+    """
+    Serve the WSGI application with a threaded HTTP/1.1 server in the current process.
+
+    Request logs are disabled meanwhile, such that they are not measured.
+
+    :returns: Port of the server.
+    """
+    loggers = [logging.getLogger("werkzeug"), getattr(app, "logger", logging.getLogger("canarieapi.app_object"))]
+    levels = [logger.level for logger in loggers]
+    for logger in loggers:
+        logger.setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name="canarieapi-load-server", daemon=True)
+    thread.start()
+    try:
+        yield server.server_port
+    finally:
+        server.shutdown()
+        thread.join()
+        server.server_close()
+        for logger, level in zip(loggers, levels):
+            logger.setLevel(level)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+
+def summarize(samples: Iterable[Tuple[float, bool]], duration: float) -> Dict[str, float]:
+    """
+    Obtain the throughput (requests per second), error count and latency percentiles (milliseconds) of samples.
+    """
+    samples = list(samples)
+    latencies = [latency * 1000 for latency, _ in samples]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, success in samples if not success),
+        "rps": len(samples) / duration,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+def find_max_sustainable_rate(port: int, paths: List[str], levels: List[int], duration: float,
+                              max_p99: float) -> Tuple[float, List[Dict[str, float]]]:
+    """
+    Increase the concurrency until requests fail or their 99th percentile latency (milliseconds) exceeds the limit.
+
+    :returns: The highest throughput reached within those limits, and the results of every concurrency level.
+    """
+    best = 0.0
+    results = []
+    for concurrency in levels:
+        samples = asyncio.run(generate_load(port, paths, concurrency, duration))
+        result = summarize((sample for path_samples in samples.values() for sample in path_samples), duration)
+        result["concurrency"] = concurrency
+        results.append(result)
+        if result["errors"] or result["p99"] > max_p99:
+            break
+        best = max(best, result["rps"])
+    return best, results
+
+
+def format_results(mode: str, results: List[Dict[str, float]], budget: Optional[float] = None) -> str:
+    lines = [f"[{mode}]" + (f" (p99 limit: {budget}ms)" if budget else "")]
+    lines.extend(
+        f"  concurrency={result['concurrency']:<4} rps={result['rps']:9.1f} errors={result['errors']:<4}"
+        f" p50={result['p50']:8.2f}ms p95={result['p95']:8.2f}ms p99={result['p99']:8.2f}ms"
+        for result in results
+    )
+    return "\n".join(lines)
+
+
+def calibration_app(_: Dict[str, str], start_response: Callable) -> List[bytes]:
+    """
+    Minimal WSGI application, whose results on the current host are the reference of the baseline.
+    """
+    start_response("200 OK", [("Content-Type", "application/json"), ("Content-Length", "2")])
+    return [b"{}"]
+
+
+def load_baseline(filename: str, calibration: Dict[str, float]) -> Dict[str, Dict[str, float]]:
+    """
+    Load the baseline stored relatively to the calibration, scaled to the calibration of the current host.
+    """
+    if not os.path.isfile(filename):
+        return {}
+    with open(filename, mode="r", encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    return {
+        name: dict({key: ratio * calibration[key] for key, ratio in relative.items() if key in BASELINE_METRICS},
+                   concurrency=relative["concurrency"])
+        for name, relative in baseline.get("routes", {}).items()
+    }
+
+
+def save_baseline(filename: str, results: Dict[str, Dict[str, float]], calibration: Dict[str, float]) -> None:
+    """
+    Store the results relatively to the calibration, such that the baseline applies to other hosts.
+
+    The calibration itself is stored for reference only.
+    """
+    baseline = {
+        "calibration": {key: round(calibration[key], 3) for key in ["concurrency"] + BASELINE_METRICS},
+        "routes": {
+            name: dict({key: round(result[key] / max(calibration[key], 1e-3), 4) for key in BASELINE_METRICS},
+                       concurrency=result["concurrency"])
+            for name, result in results.items()
+        },
+    }
+    with open(filename, mode="w", encoding="utf-8") as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write("\n")
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                          tolerance: float, latency_slack: float) -> List[str]:
+    """
+    Find regressions of endpoints results compared to their baseline obtained with the same concurrency.
+
+    Latency percentiles regress when they exceed their baseline multiplied by the tolerance, plus a slack (milliseconds)
+    ignoring the noise of very fast endpoints. Throughput regresses when it falls below its baseline divided by the
+    tolerance.
+
+    :returns: Description of every regression.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference or reference.get("concurrency") != result.get("concurrency"):
+            continue
+        for key in ["p50", "p95", "p99"]:
+            limit = reference[key] * tolerance + latency_slack
+            if result[key] > limit:
+                regressions.append(f"{name}: {key} {result[key]:.2f}ms > {limit:.2f}ms "
+                                   f"(baseline: {reference[key]:.2f}ms)")
+        limit = reference["rps"] / tolerance
+        if result["rps"] < limit:
+            regressions.append(f"{name}: {result['rps']:.1f} req/s < {limit:.1f} req/s "
+                               f"(baseline: {reference['rps']:.1f} req/s)")
+    return regressions
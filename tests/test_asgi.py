@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import os
+import sys
+
+import mock
+import pytest
+
+from tests import load
+
+# concurrency levels and duration (seconds) of each one to find the maximum sustainable request rate
+LOAD_LEVELS = [1, 4, 16, 64]
+LOAD_DURATION = 2.0
+LOAD_MAX_P99 = 250  # milliseconds
+
+
+def call_asgi(path, query_string=b"", headers=None):
+    """
+    Call the ASGI application with a GET request and obtain its response start message and body chunks.
+    """
+    from canarieapi.asgi import application
+
+    messages = []
+    received = []
+
+    async def receive():
+        if not received:
+            received.append(True)
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(3600)  # never disconnects
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query_string,
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    }
+    asyncio.run(application(scope, receive, send))
+    start, *bodies = messages
+    assert start["type"] == "http.response.start"
+    assert not bodies[-1].get("more_body", False), "response must be completed"
+    return start, bodies
+
+
+@pytest.mark.usefixtures("tmp_config")
+def test_asgi_routes():
+    """
+    Ensure the routes are the same when served through the ASGI application, including streamed responses.
+    """
+    from canarieapi.api import APP
+
+    web = APP.test_client()
+    for path in ["/", "/test-service-1/service/info", "/test-service-1/service/stats", "/status"]:
+        start, bodies = call_asgi(path, b"f=json")
+        expected = web.get(path, query_string={"f": "json"})
+        assert start["status"] == expected.status_code, path
+        assert json.loads(b"".join(body["body"] for body in bodies)) == expected.json, path
+
+    start, bodies = call_asgi("/unknown-service/service/info", headers={"Accept": "application/json"})
+    assert start["status"] == 404
+    assert json.loads(b"".join(body["body"] for body in bodies))
+
+    # streamed response is forwarded as its chunks are produced
+    start, bodies = call_asgi("/status", b"f=json")
+    assert start["status"] == 200
+    assert len(bodies) > 1
+
+
+def test_asgi_environ_headers():
+    """
+    Ensure repeated headers are combined as defined for each of them.
+    """
+    from canarieapi.asgi import make_environ
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(b"cookie", b"a=1"), (b"accept", b"text/html"), (b"cookie", b"b=2"), (b"accept", b"*/*")],
+    }
+    environ = make_environ(scope, b"")
+    assert environ["HTTP_COOKIE"] == "a=1; b=2"
+    assert environ["HTTP_ACCEPT"] == "text/html,*/*"
+
+
+@pytest.mark.usefixtures("tmp_config")
+def test_asgi_status_events(tmp_path):
+    """
+    Ensure event streams do not hold a thread of the pool, and are unsubscribed as soon as their client disconnects.
+    """
+    from canarieapi.api import APP
+    from canarieapi.asgi import WSGIToASGI
+    from canarieapi.status_events import STATUS_FEED
+
+    app = WSGIToASGI(APP, max_workers=1)
+    config = {
+        "DATABASE": {**APP.config["DATABASE"], "filename": str(tmp_path / "stats.db")},
+        "STATUS_EVENTS": {"interval": 0.01, "heartbeat": 60},
+    }
+
+    async def request(path, sent, disconnect):
+        messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await app({"type": "http", "method": "GET", "path": path, "query_string": b"f=json", "headers": []},
+                  receive, send)
+
+    async def run():
+        events = []
+        disconnect = asyncio.Event()
+        stream = asyncio.ensure_future(request("/status/events", events, disconnect))
+        while len(events) < 2:
+            await asyncio.sleep(0.01)
+        assert events[0]["status"] == 200
+        assert events[1]["body"].startswith(b"event: snapshot")
+        assert len(STATUS_FEED.subscriptions) == 1
+
+        # the only thread of the pool remains available while the stream is open
+        sent = []
+        await asyncio.wait_for(request("/status", sent, asyncio.Event()), timeout=10)
+        assert sent[0]["status"] == 200
+        assert not stream.done()
+
+        disconnect.set()
+        await asyncio.wait_for(stream, timeout=5)  # without waiting for the heartbeat
+        assert not STATUS_FEED.subscriptions
+
+    with mock.patch.dict(APP.config, config):
+        asyncio.run(run())
+
+
+def test_asgi_disconnect():
+    """
+    Ensure a request interrupted by its client only completes once its thread is released.
+    """
+    import threading
+
+    from canarieapi.asgi import WSGIToASGI
+
+    released = threading.Event()
+    closed = []
+
+    def wsgi_app(environ, start_response):
+        def generate():
+            try:
+                yield b"first"
+                released.wait(5)
+                yield b"second"
+            finally:
+                closed.append(True)
+
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return generate()
+
+    app = WSGIToASGI(wsgi_app, max_workers=1)
+    sent = []
+
+    async def run():
+        messages = [{"type": "http.request", "body": b"", "more_body": False}]
+        disconnect = asyncio.Event()
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        task = asyncio.ensure_future(app({"type": "http", "method": "GET", "path": "/", "headers": []}, receive, send))
+        while len(sent) < 2:
+            await asyncio.sleep(0.01)
+        disconnect.set()
+        await asyncio.sleep(0.1)
+        assert not task.done(), "request should wait for its thread"
+        released.set()
+        await asyncio.wait_for(task, timeout=5)
+        assert closed
+
+    asyncio.run(run())
+    assert [message.get("body") for message in sent[1:]] == [b"first"]
+
+
+def test_asgi_lifespan():
+    from canarieapi.asgi import WSGIToASGI
+
+    app = WSGIToASGI(lambda environ, start_response: [], max_workers=1)
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(app({"type": "lifespan"}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+
+
+@pytest.mark.performance
+@pytest.mark.skipif(not os.getenv("CANARIE_API_LOAD_TESTS"), reason="load tests are enabled by CANARIE_API_LOAD_TESTS")
+@pytest.mark.skipif(sys.platform == "win32", reason="gunicorn is not available on Windows")
+def test_serving_modes_load(tmp_path):
+    """
+    Compare the maximum sustainable request rate of the WSGI (gunicorn with a gevent worker) and ASGI (uvicorn) modes.
+    """
+    pytest.importorskip("gunicorn")
+    pytest.importorskip("gevent")
+    pytest.importorskip("uvicorn")
+
+    config_path = load.make_load_config(str(tmp_path), services=20)
+    paths = ["/?f=json", "/service-0/service/info?f=json", "/service-1/service/stats?f=json",
+             "/service-2/service/status?f=json", "/status?f=json"]
+    rates = {}
+    reports = []
+    for mode in ["wsgi", "asgi"]:
+        port = load.get_free_port()
+        proc = load.start_server(mode, config_path, port)
+        try:
+            rates[mode], results = load.find_max_sustainable_rate(
+                port, paths, LOAD_LEVELS, LOAD_DURATION, LOAD_MAX_P99,
+            )
+        finally:
+            load.stop_server(proc)
+        reports.append(load.format_results(mode, results, LOAD_MAX_P99))
+    print("\n".join(reports))
+
+    for mode, rate in rates.items():
+        assert rate > 0, f"Serving mode [{mode}] could not sustain any load.\n" + "\n".join(reports)
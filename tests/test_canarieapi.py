@@ -3,8 +3,17 @@
 """
 Tests for `canarieapi` module.
 """
+import copy
+import gzip
+import json
 import os
 import shutil
+import socket
+import stat
+import subprocess
+import sys
+import threading
+import time
 import unittest
 from datetime import datetime, timezone
 
@@ -15,10 +24,24 @@ from flask_webtest import TestApp
 
 from canarieapi.logparser import cron_job as cron_job_logparse
 from canarieapi.monitoring import cron_job as cron_job_monitor
+from canarieapi.monitoring import make_monitor_summary
 from canarieapi.utility_rest import get_db, init_db
 from tests import config as test_config
 
 
+def wait_self_test_job(web, job_id, timeout=10):
+    """
+    Wait until the self-test job is finished and return its last status.
+    """
+    deadline = time.perf_counter() + timeout
+    while True:
+        resp = web.get(f"/test/{job_id}", params={"f": "json"})
+        assert resp.status_code == 200
+        if resp.json["status"] not in ["queued", "running"] or time.perf_counter() > deadline:
+            return resp.json
+        time.sleep(0.05)
+
+
 class TestCanarieAPI(unittest.TestCase):
     app = None
     config = None
@@ -67,6 +90,8 @@ class TestCanarieAPI(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
+        responses.stop()  # let following tests reach real servers
+        responses.reset()
         path = cls.app.config.get("DATABASE", {}).get("filename", "")
         dir_path = os.path.dirname(path)
         if path and os.path.isdir(dir_path) and "tmp" in os.path.basename(dir_path):
@@ -87,12 +112,83 @@ class TestCanarieAPI(unittest.TestCase):
 
     def test_test_endpoint(self):
         resp = self.web.get("/test", params={"f": "json"})
-        while 300 < resp.status_code < 310:
-            resp = resp.follow()
+        assert resp.status_code == 202
+        assert resp.headers["Location"] == resp.json["location"] == f"/test/{resp.json['jobID']}"
+        job = wait_self_test_job(self.web, resp.json["jobID"])
+        assert job["status"] == "succeeded"
+        assert job["error"] is None
+        services = len(self.app.config["SERVICES"])
+        assert job["progress"] == {"completed": services, "total": services}
+        assert job["result"]["monitoring"]["status"] == {"ok": services}
+        assert all(svc in job["result"]["logs"]["invocations"] for svc in self.app.config["SERVICES"])
+
+        resp = self.web.get(f"/test/{job['jobID']}", headers={"Accept": "text/html"})
         assert resp.status_code == 200
-        assert "Platforms" in resp.json
-        assert "Services" in resp.json
-        assert all(svc in resp.json["Services"] for svc in self.app.config["SERVICES"])
+        assert resp.content_type == "text/html"
+
+        resp = self.web.get("/test/unknown", params={"f": "json"}, expect_errors=True)
+        assert resp.status_code == 404
+
+    def test_test_endpoint_coalesced(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocked_self_test(*_, **__):
+            started.set()
+            release.wait(timeout=10)
+            return {"monitoring": make_monitor_summary(), "logs": None}
+
+        with mock.patch("canarieapi.jobs.validate_config_schema", side_effect=blocked_self_test) as mock_test:
+            resp = self.web.get("/test", params={"f": "json"})
+            assert resp.status_code == 202
+            job_id = resp.json["jobID"]
+            assert started.wait(timeout=10)
+
+            # concurrent requests are handled by the in-flight job
+            resp = self.web.get("/test", params={"f": "json"})
+            assert resp.status_code == 202
+            assert resp.json["jobID"] == job_id
+            assert resp.json["status"] == "running"
+
+            release.set()
+            job = wait_self_test_job(self.web, job_id)
+            assert job["status"] == "succeeded"
+
+            # requests within the minimum interval report the latest job
+            with mock.patch.dict(self.app.config, {"SELF_TEST_JOBS": {"min_interval": 3600}}):
+                resp = self.web.get("/test", params={"f": "json"})
+                assert resp.status_code == 200
+                assert resp.json["jobID"] == job_id
+
+                # HTML requests are redirected to the job status
+                resp = self.web.get("/test", headers={"Accept": "text/html"})
+                assert resp.status_code == 303
+                assert resp.headers["Location"].endswith(f"/test/{job_id}")
+            assert mock_test.call_count == 1
+
+    def test_test_endpoint_heartbeat(self):
+        """
+        Ensure a job running longer than the maximum duration without reporting progress is not considered abandoned.
+        """
+        started = threading.Event()
+
+        def slow_self_test(*_, **__):
+            started.set()
+            time.sleep(1)
+            raise ValueError("log parsing failed")
+
+        settings = {"min_interval": 0, "max_duration": 0.3}
+        with mock.patch.dict(self.app.config, {"SELF_TEST_JOBS": settings}):
+            with mock.patch("canarieapi.jobs.validate_config_schema", side_effect=slow_self_test):
+                resp = self.web.get("/test", params={"f": "json"})
+                job_id = resp.json["jobID"]
+                assert started.wait(timeout=10)
+                time.sleep(0.6)
+                resp = self.web.get("/test", params={"f": "json"})
+                assert resp.json["jobID"] == job_id, "running job should not be abandoned"
+                job = wait_self_test_job(self.web, job_id)
+        assert job["status"] == "failed"
+        assert job["error"] == "log parsing failed"
 
     def test_service_info_json(self):
         name = list(self.app.config["SERVICES"])[0]
@@ -214,6 +310,223 @@ class TestCanarieAPI(unittest.TestCase):
         assert resp.json["monitoring"][monitor]["status"].upper() != "OK"
         assert "Expecting 200, Got 400" in resp.json["monitoring"][monitor]["message"]
 
+    def test_service_latency(self):
+        name = list(self.app.config["SERVICES"])[0]
+        resp = self.web.get(f"/{name}/service/stats", params={"f": "json"})
+        assert resp.status_code == 200
+        latency = resp.json["latency"]["Component"]
+        assert set(latency) == {"total", "connect", "tls", "ttfb", "bytes", "p50", "p95", "p99", "samples"}
+        assert latency["samples"] > 0
+        assert latency["p50"] <= latency["p95"] <= latency["p99"]
+
+        resp = self.web.get(f"/{name}/service/status", params={"f": "json"})
+        assert resp.json["latency"]["Component"]["samples"] == latency["samples"]
+        resp = self.web.get(f"/{name}/service/status")
+        assert "p95" in resp.text
+
+    def test_bulk_status_json(self):
+        names = sorted(self.app.config["SERVICES"])
+        resp = self.web.get("/status", params={"f": "json", "stats": "true"})
+        assert resp.status_code == 200
+        assert resp.content_type == "application/json"
+        assert resp.json["total"] == len(names)
+        assert resp.json["lastStatusUpdate"] != "Never"
+        assert [info["route"] for info in resp.json["routes"]] == names
+        for info in resp.json["routes"]:
+            assert info["type"] == "service"
+            component = info["monitoring"]["Component"]
+            assert (component["status"], component["message"]) == ("ok", "")
+            assert component["latency"]["samples"] > 0
+            assert info["stats"]["invocations"] == 0
+
+    def test_bulk_status_filter_pagination(self):
+        names = sorted(self.app.config["SERVICES"])
+        resp = self.web.get("/status", params={"f": "json", "limit": 1, "offset": 1})
+        assert resp.status_code == 200
+        assert resp.json["total"] == len(names)
+        assert [info["route"] for info in resp.json["routes"]] == names[1:2]
+        assert "stats" not in resp.json["routes"][0]
+
+        resp = self.web.get("/status", params={"f": "json", "route": names[0]})
+        assert [info["route"] for info in resp.json["routes"]] == names[:1]
+
+        resp = self.web.get("/status", params={"f": "json", "type": "platform"})
+        assert resp.json["total"] == 0
+        assert resp.json["routes"] == []
+
+        resp = self.web.get("/status", params={"f": "json", "limit": 0}, expect_errors=True)
+        assert resp.status_code == 400
+
+    def test_bulk_status_page(self):
+        resp = self.web.get("/status", params={"f": "html"})
+        assert resp.status_code == 200
+        assert resp.content_type == "text/html"
+        assert all(f"service/{name}" in resp.text for name in self.app.config["SERVICES"])
+        assert "Ok" in resp.text
+
+    def test_status_events(self):
+        from canarieapi.status_events import STATUS_FEED
+
+        name, other = list(self.app.config["SERVICES"])[:2]
+        client = self.app.test_client()
+        with mock.patch.dict(self.app.config, {"STATUS_EVENTS": {"interval": 0.01, "heartbeat": 0.05}}):
+            resp = client.get("/status/events", query_string={"route": name}, buffered=False)
+            assert resp.status_code == 200
+            assert resp.mimetype == "text/event-stream"
+            chunks = (chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in resp.response)
+
+            def next_event():
+                for chunk in chunks:
+                    if not chunk.startswith(":"):  # skip keep-alive comments
+                        lines = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+                        return lines["event"], json.loads(lines["data"])
+                raise AssertionError("stream ended")
+
+            event, data = next_event()
+            assert event == "snapshot"
+            assert data == [{"route": name, "service": "Component", "status": "ok", "message": ""}]
+
+            # changes committed before the watcher reads the statuses for the first time should not be missed
+            with self.app.app_context():
+                db = get_db()
+                for route in [other, name]:
+                    db.execute("update status set status = 'down', message = 'test' where route = ?", [route])
+                db.commit()
+
+            event, data = next_event()
+            assert event == "status"
+            assert data == {"route": name, "service": "Component", "status": "down", "message": "test"}
+            resp.close()
+
+        deadline = time.perf_counter() + 5
+        while STATUS_FEED.thread is not None and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        assert STATUS_FEED.thread is None, "watcher should stop without subscriptions"
+
+    def test_status_events_baseline(self):
+        """
+        Ensure subscribers obtain the changes since their snapshot, whichever statuses the watcher read before.
+        """
+        from canarieapi.status_events import StatusSubscription, StatusWatcher
+
+        name, other = list(self.app.config["SERVICES"])[:2]
+        with self.app.app_context():
+            db = get_db()
+            watcher = StatusWatcher()
+            try:
+                assert watcher.poll([]) == [], "first poll only establishes reference statuses"
+                snapshot = [{"route": name, "service": "Component", "status": "down", "message": "old"}]
+                subscription = StatusSubscription([name], snapshot=snapshot)
+                other_watcher = StatusWatcher()
+                other_watcher.poll([])
+                other_watcher.close()  # cleanup of another watcher does not affect this one
+                watcher.poll([subscription])
+                assert subscription.get(timeout=1) == [
+                    {"route": name, "service": "Component", "status": "ok", "message": ""},
+                ]
+
+                db.execute("update status set status = 'down', message = 'test' where route = ?", [other])
+                db.commit()
+                assert len(watcher.poll([subscription])) == 1
+                assert subscription.get(timeout=0.01) == [], "changes of other routes should be filtered"
+            finally:
+                watcher.close()
+
+    def test_metrics(self):
+        from canarieapi.metrics import reset_metrics_snapshot
+
+        reset_metrics_snapshot()
+        self.web.get("/", params={"f": "json"})
+        resp = self.web.get("/metrics")
+        assert resp.status_code == 200
+        assert resp.content_type == "text/plain"
+        name = sorted(self.app.config["SERVICES"])[0]
+        lines = resp.text.splitlines()
+        assert f"canarieapi_component_up{{route=\"{name}\",component=\"Component\"}} 1" in lines
+        assert any(line.startswith(f"canarieapi_component_probe_duration_seconds{{route=\"{name}\"") for line in lines)
+        assert any(line.startswith("canarieapi_cron_lag_seconds{job=\"status\"}") for line in lines)
+        assert any(line.startswith("canarieapi_cron_duration_seconds{job=\"log\"}") for line in lines)
+        assert any(
+            line.startswith("canarieapi_http_requests_total{endpoint=\"/\",method=\"GET\",code=\"200\"}")
+            for line in lines
+        )
+        assert any(
+            line.startswith("canarieapi_http_request_duration_seconds_bucket{endpoint=\"/\",le=\"+Inf\"}")
+            for line in lines
+        )
+
+    def test_metrics_aggregate_workers(self):
+        from canarieapi.metrics import REQUEST_LATENCY_BUCKETS, aggregate_request_metrics, get_metrics_directory
+        from canarieapi.snapshot import SHARED_FILE_MODE
+
+        with self.app.app_context():
+            current = aggregate_request_metrics()
+            other_worker = {
+                "count": {"/ GET 200": 3},
+                "latency": {"/": [3] + [0] * len(REQUEST_LATENCY_BUCKETS) + [0.003]},
+            }
+            exited = subprocess.Popen([sys.executable, "-c", "pass"])  # pylint: disable=R1732
+            exited.wait()
+            host = socket.gethostname()
+            other_fn = os.path.join(get_metrics_directory(), f"requests-{host}-{os.getppid()}-1.json")
+            exited_fn = os.path.join(get_metrics_directory(), f"requests-{host}-{exited.pid}-1.json")
+            for metrics_fn in [other_fn, exited_fn]:
+                with open(metrics_fn, mode="w", encoding="utf-8") as metrics_file:
+                    json.dump(other_worker, metrics_file)
+            try:
+                total = aggregate_request_metrics()
+            finally:
+                os.remove(other_fn)
+            assert total["count"]["/ GET 200"] == current["count"].get("/ GET 200", 0) + 6
+            assert total["latency"]["/"][0] == current["latency"].get("/", [0])[0] + 6
+            assert not os.path.exists(exited_fn), "file of exited workers should be removed"
+            archive_fn = os.path.join(get_metrics_directory(), "archived.json")
+            assert stat.S_IMODE(os.stat(archive_fn).st_mode) == SHARED_FILE_MODE
+            total_after = aggregate_request_metrics()
+        assert total_after["count"]["/ GET 200"] == total["count"]["/ GET 200"] - 3, (
+            "only the removed file of the running worker should be subtracted, exited ones remain archived"
+        )
+
+    def test_metrics_worker_exit(self):
+        from canarieapi.metrics import RequestMetricsRecorder, aggregate_request_metrics
+
+        with self.app.app_context():
+            current = aggregate_request_metrics()
+            recorder = RequestMetricsRecorder()
+            recorder.record("/exit", "GET", 200, 0.001)  # first record is flushed immediately
+            recorder.record("/exit", "GET", 200, 0.001)  # pending until the next flush interval
+            assert aggregate_request_metrics()["count"]["/exit GET 200"] == current["count"].get("/exit GET 200", 0) + 1
+            metrics_fn = recorder.filename
+            recorder.close()
+            assert not os.path.exists(metrics_fn)
+            recorder.close()  # once more by 'atexit', nothing left to archive
+            total = aggregate_request_metrics()
+        assert total["count"]["/exit GET 200"] == current["count"].get("/exit GET 200", 0) + 2, (
+            "pending requests of the exiting worker should be archived"
+        )
+
+    def test_instrumentation_server_timing(self):
+        name = list(self.app.config["SERVICES"])[0]
+        settings = {"enabled": True, "slow_request_threshold": 0, "window": 10}
+        with mock.patch.dict(self.app.config, {"INSTRUMENTATION": settings}):
+            with mock.patch.object(self.app.wsgi_app, "logger") as mock_logger:
+                resp = self.web.get(f"/{name}/service/stats")
+                metrics = self.web.get("/metrics")
+        assert resp.status_code == 200
+        timing = resp.headers["Server-Timing"]
+        assert all(f"{phase};dur=" in timing for phase in ["snapshot", "render", "total"])
+        assert "db_query" not in timing, "statuses should be served from the snapshot published by the cron jobs"
+        assert mock_logger.warning.call_count >= 1  # threshold 0, all requests are "slow"
+        assert "Slow request" in mock_logger.warning.call_args_list[0].args[0]
+
+        percentiles = self.app.wsgi_app.latency.percentiles()
+        stats_rule = "/<route_name>/<any(service,platform):api_type>/stats"
+        assert percentiles[stats_rule]["count"] >= 1
+        assert "canarieapi_http_request_latency_percentile_seconds" in metrics.text
+
+        resp = self.web.get(f"/{name}/service/info", params={"f": "json"})
+        assert "Server-Timing" not in resp.headers, "Instrumentation must be disabled by default"
+
     def test_service_redirect_json(self):
         name = list(self.app.config["SERVICES"])[0]
         cfg = self.app.config["SERVICES"][name]
@@ -221,6 +534,111 @@ class TestCanarieAPI(unittest.TestCase):
         resp = self.web.get(f"/{name}/service/doc", params={"f": "json"})
         assert resp.status_code == 302, "Expect redirect request to the service's doc redirect endpoint"
         assert resp.location == f"{url.rstrip('/')}/doc"
+        assert "max-age" in resp.headers["Cache-Control"]
+
+    def test_conditional_get_home(self):
+        resp = self.web.get("/", params={"f": "json"})
+        assert resp.status_code == 200
+        assert resp.etag
+        assert "max-age" in resp.headers["Cache-Control"]
+
+        resp = self.web.get("/", params={"f": "json"}, headers={"If-None-Match": f"\"{resp.etag}\""})
+        assert resp.status_code == 304
+        assert not resp.body
+
+        resp_html = self.web.get("/", params={"f": "html"})
+        assert resp_html.status_code == 200
+        assert resp_html.etag != resp.etag, "JSON and HTML representations must not share the same ETag"
+
+    def test_conditional_get_info(self):
+        name = list(self.app.config["SERVICES"])[0]
+        path = f"/{name}/service/info"
+        resp = self.web.get(path)
+        assert resp.status_code == 200
+        assert resp.etag
+        assert resp.last_modified
+        last_modified = resp.headers["Last-Modified"]
+
+        resp = self.web.get(path, headers={"If-None-Match": f"\"{resp.etag}\""})
+        assert resp.status_code == 304
+        resp = self.web.get(path, headers={"If-Modified-Since": last_modified})
+        assert resp.status_code == 304
+        resp = self.web.get(path, headers={"If-None-Match": "\"other\""})
+        assert resp.status_code == 200
+
+    def test_precompiled_info_gzip(self):
+        name = list(self.app.config["SERVICES"])[0]
+        path = f"/{name}/service/info"
+        client = self.app.test_client()  # raw client to obtain the body without automatic decoding
+        resp = client.get(path, query_string={"f": "json"})
+        resp_gzip = client.get(path, query_string={"f": "json"}, headers={"Accept-Encoding": "gzip"})
+        assert resp_gzip.status_code == 200
+        assert resp_gzip.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in resp_gzip.headers["Vary"]
+        assert gzip.decompress(resp_gzip.data) == resp.data
+        assert resp_gzip.headers["ETag"] != resp.headers["ETag"], "encodings should have distinct strong tags"
+        for etag in [resp.headers["ETag"], resp_gzip.headers["ETag"]]:
+            for encoding in ["gzip", "identity"]:
+                resp_cond = client.get(path, query_string={"f": "json"},
+                                       headers={"Accept-Encoding": encoding, "If-None-Match": etag})
+                assert resp_cond.status_code == 304, "either variant should be up-to-date"
+                assert resp_cond.headers["ETag"] == etag
+
+    def test_precompiled_config_replaced(self):
+        from canarieapi.precompiled import get_precompiled_responses
+
+        services = copy.deepcopy(self.app.config["SERVICES"])
+        name = list(services)[0]
+        services[name]["info"]["version"] = "9.9.9"
+        precompiled = get_precompiled_responses()
+        try:
+            with mock.patch.dict(self.app.config, {"SERVICES": services}):
+                resp = self.web.get(f"/{name}/service/info", params={"f": "json"})
+                assert resp.json["version"] == "9.9.9"
+                assert get_precompiled_responses() is not precompiled
+        finally:
+            get_precompiled_responses()  # restore for following tests
+
+    def test_conditional_get_status_changed(self):
+        name = list(self.app.config["SERVICES"])[0]
+        url = self.app.config["SERVICES"][name]["monitoring"]["Component"]["request"]["url"]
+        path = f"/{name}/service/status"
+        resp = self.web.get(path, params={"f": "json"})
+        assert resp.status_code == 200
+        assert resp.headers["Cache-Control"] == "no-cache"
+        etag = resp.etag
+
+        resp = self.web.get(path, params={"f": "json"}, headers={"If-None-Match": f"\"{etag}\""})
+        assert resp.status_code == 304
+
+        with responses.RequestsMock() as mock_responses:
+            mock_responses.get(url, json={}, status=400)
+            cron_job_monitor()  # status data modified, ETag must not match anymore
+            resp = self.web.get(path, params={"f": "json"}, headers={"If-None-Match": f"\"{etag}\""})
+        assert resp.status_code == 200
+        assert resp.etag != etag
+
+    def test_conditional_get_stats_latency_changed(self):
+        self.check_conditional_get_latency_changed("stats")
+
+    def test_conditional_get_status_latency_changed(self):
+        self.check_conditional_get_latency_changed("status")
+
+    def check_conditional_get_latency_changed(self, page):
+        name = list(self.app.config["SERVICES"])[0]
+        path = f"/{name}/service/{page}"
+        with mock.patch.dict(self.app.config, {"SNAPSHOT": {"enabled": False}}):
+            resp = self.web.get(path, params={"f": "json"})
+            assert resp.status_code == 200
+            etag = resp.etag
+
+            with self.app.app_context():
+                db = get_db()
+                db.execute("update status_latency set total = total + 1 where route = ?", [name])
+                db.commit()
+            resp = self.web.get(path, params={"f": "json"}, headers={"If-None-Match": f"\"{etag}\""})
+        assert resp.status_code == 200, "latency data modified, ETag must not match anymore"
+        assert resp.etag != etag
 
 
 class TestDatabaseErrorHandling(unittest.TestCase):
@@ -272,6 +690,8 @@ class TestDatabaseErrorHandling(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
+        responses.stop()  # let following tests reach real servers
+        responses.reset()
         path = cls.app.config.get("DATABASE", {}).get("filename", "")
         dir_path = os.path.dirname(path)
         if path and os.path.isdir(dir_path) and "tmp" in os.path.basename(dir_path):
@@ -287,18 +707,18 @@ class TestDatabaseErrorHandling(unittest.TestCase):
             cur.close()
 
         # perform a request that will lead to a database operation that needs the missing table
-        with mock.patch("canarieapi.utility_rest.init_db", side_effect=init_db) as mock_init_db:
+        with mock.patch("canarieapi.database.init_db", side_effect=init_db) as mock_init_db:
             assert mock_init_db.call_count == 0
             resp = self.web.get("/test", params={"f": "json"})
-            while 300 < resp.status_code < 310:
-                resp = resp.follow()
-            assert resp.status_code == 200
-            assert "Platforms" in resp.json
-            assert "Services" in resp.json
-            assert all(svc in resp.json["Services"] for svc in self.app.config["SERVICES"])
+            assert resp.status_code == 202
+            job = wait_self_test_job(self.web, resp.json["jobID"])
+            assert job["status"] == "succeeded"
             assert mock_init_db.call_count == 1
 
+        resp = self.web.get("/", params={"f": "json"})
+        assert resp.status_code == 200
+        assert all(svc in resp.json["Services"] for svc in self.app.config["SERVICES"])
+
 
 if __name__ == "__main__":
-    import sys
     sys.exit(unittest.main())
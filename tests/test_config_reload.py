@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import mock
+
+from canarieapi.config_reload import ConfigWatcher
+from canarieapi.settings import load_default_config
+from tests import config as test_config
+
+RELOADED_CONFIG = """
+import copy
+from tests.config import *  # noqa
+
+SERVICES = copy.deepcopy(SERVICES)
+SERVICES["reloaded-service"] = copy.deepcopy(SERVICES["test-service-1"])
+SERVICES["reloaded-service"]["info"]["name"] = "reloaded-service"
+RELOADED_SETTING = True
+"""
+
+DEFAULTS_CONFIG = """
+from canarieapi.default_configuration import *  # noqa
+
+SERVICES.pop(list(SERVICES)[0])  # configuration files commonly modify default values
+"""
+
+
+def test_config_reload(tmp_path, tmp_config):
+    """
+    Ensure a modified configuration file is applied with its derived state, unless it is invalid.
+    """
+    from canarieapi.api import APP
+    from canarieapi.precompiled import get_precompiled_responses
+
+    config_path = tmp_path / "config.py"
+    config_path.write_text("from tests.config import *  # noqa\n")
+    watcher = ConfigWatcher(APP, str(config_path))
+    web = APP.test_client()
+
+    try:
+        with mock.patch.dict(APP.config, {"CONFIG_RELOAD": {"enabled": True, "interval": 0}}):
+            assert not watcher.check(), "unmodified file should not be reloaded"
+
+            config_path.write_text(RELOADED_CONFIG)
+            os.utime(config_path, ns=(watcher.mtime + 10**9, watcher.mtime + 10**9))
+            assert watcher.check()
+            assert "reloaded-service" in APP.config["SERVICES"]
+            assert ("service", "reloaded-service") in get_precompiled_responses().info
+            assert watcher.last_modified is not None
+            resp = web.get("/", query_string={"f": "json"})
+            assert "reloaded-service" in resp.json["Services"]
+            resp = web.get("/reloaded-service/service/info", query_string={"f": "json"})
+            assert resp.status_code == 200
+
+            config_path.write_text(RELOADED_CONFIG + "\nSERVICES['reloaded-service']['redirect'] = {}\n")
+            os.utime(config_path, ns=(watcher.mtime + 10**9, watcher.mtime + 10**9))
+            assert not watcher.check(), "invalid configuration should not be applied"
+            assert APP.config["SERVICES"]["reloaded-service"]["redirect"]
+
+            watcher.request_reload()
+            config_path.write_text(RELOADED_CONFIG.replace("reloaded-service", "signaled-service"))
+            assert watcher.check(), "requested reload should be applied even if the file was not modified"
+            assert "signaled-service" in APP.config["SERVICES"]
+            assert APP.config["RELOADED_SETTING"]
+
+            # values removed from the file should not remain, and modified default values should not accumulate
+            defaults = {}
+            load_default_config(defaults)
+            config_path.write_text(DEFAULTS_CONFIG)
+            for _ in range(2):
+                watcher.request_reload()
+                assert watcher.check()
+                assert "RELOADED_SETTING" not in APP.config
+                assert len(APP.config["SERVICES"]) == len(defaults["SERVICES"]) - 1
+    finally:
+        APP.config.from_object(test_config)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cold-start benchmark of the application entry points, using the ``-X importtime`` report of the interpreter.
+
+Each entry point must be importable within its time budget and without loading its forbidden modules, such that
+regressions of cron jobs and workers startup time are caught. Budgets can be scaled for slower environments using the
+``CANARIE_API_IMPORT_BUDGET_FACTOR`` environment variable.
+"""
+import os
+import subprocess
+import sys
+from typing import Dict, Tuple
+
+import pytest
+
+from tests import config as test_config
+
+# entry point: (import time budget in milliseconds, modules that must not be loaded)
+IMPORT_BUDGETS = {
+    "canarieapi.logparser": (150, ["flask", "werkzeug", "jsonschema", "requests", "dateutil"]),
+    "canarieapi.monitoring": (150, ["flask", "werkzeug", "jsonschema", "requests", "dateutil"]),
+    "canarieapi.api": (500, ["jsonschema", "requests"]),
+}
+IMPORT_RUNS = 3  # best of many to reduce noise
+
+
+def measure_import(module: str) -> Tuple[float, Dict[str, float]]:
+    """
+    Import the module in a new interpreter and obtain its total import time and cumulative time of every module.
+
+    Times are in milliseconds.
+    """
+    env = dict(os.environ)
+    env.update({
+        "CANARIE_API_CONFIG_FN": os.path.abspath(test_config.__file__),
+        "CANARIE_API_SKIP_CHECK": "true",
+    })
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    total = 0.0
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        modules[name.strip()] = int(cumulative) / 1000
+        if not name.startswith("  "):  # top-level imports include their nested imports
+            total += int(cumulative) / 1000
+    return total, modules
+
+
+@pytest.mark.performance
+@pytest.mark.parametrize("module", list(IMPORT_BUDGETS))
+def test_import_time_budget(module):
+    budget, forbidden = IMPORT_BUDGETS[module]
+    budget *= float(os.getenv("CANARIE_API_IMPORT_BUDGET_FACTOR", "1"))
+
+    results = [measure_import(module) for _ in range(IMPORT_RUNS)]
+    total, modules = min(results, key=lambda result: result[0])
+
+    loaded = sorted(name for name in forbidden if name in modules)
+    assert not loaded, f"Importing [{module}] must not load {loaded}."
+    slowest = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:10]
+    report = "\n".join(f"  {duration:8.3f}ms {name}" for name, duration in slowest)
+    assert total <= budget, f"Importing [{module}] took {total:.3f}ms (budget: {budget}ms). Slowest:\n{report}"
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Latency regression suite of the application routes.
+
+Every endpoint is loaded in turn through HTTP by concurrent clients, against an application served in-process with a
+generated configuration of many services and a pre-populated database. Its latency percentiles and throughput are
+compared to the baseline stored in ``tests/load_baseline.json``.
+
+The baseline is stored relatively to the results of a minimal WSGI application served and loaded the same way
+(calibration), measured on every run, such that it applies to hosts of different performance.
+
+Environment variables:
+
+- ``CANARIE_API_LOAD_TESTS``: enable load tests.
+- ``CANARIE_API_LOAD_SERVICES``: number of generated services (default: 50).
+- ``CANARIE_API_LOAD_CONCURRENCY``: number of concurrent clients (default: 8).
+- ``CANARIE_API_LOAD_DURATION``: duration (seconds) of the load of each endpoint (default: 1).
+- ``CANARIE_API_LOAD_TOLERANCE``: factor of baseline values considered as regressions (default: 2).
+- ``CANARIE_API_LOAD_UPDATE_BASELINE``: store the results as the new baseline instead of comparing them.
+"""
+import asyncio
+import os
+
+import pytest
+
+from tests import config as test_config
+from tests import load
+
+BASELINE_FILENAME = os.path.join(os.path.dirname(__file__), "load_baseline.json")
+LATENCY_SLACK = 5  # milliseconds
+
+# name: (path, expected status)
+ENDPOINTS = {
+    "home": ("/?f=json", 200),
+    "home_html": ("/", 200),
+    "info": ("/service-0/service/info?f=json", 200),
+    "stats": ("/service-0/service/stats?f=json", 200),
+    "service_status": ("/service-0/service/status?f=json", 200),
+    "status": ("/status?f=json", 200),
+    "status_stats": ("/status?f=json&stats=true", 200),
+    "redirect": ("/service-0/service/doc", 302),
+    "error_unknown_route": ("/unknown/service/info?f=json", 404),
+    "error_handler": ("/404", 404),
+}
+
+
+@pytest.mark.performance
+@pytest.mark.skipif(not os.getenv("CANARIE_API_LOAD_TESTS"), reason="load tests are enabled by CANARIE_API_LOAD_TESTS")
+def test_routes_latency_regression(tmp_path):
+    from canarieapi.api import APP
+    from canarieapi.config_reload import ConfigWatcher
+    from canarieapi.precompiled import load_precompiled_responses
+
+    services = int(os.getenv("CANARIE_API_LOAD_SERVICES", "50"))
+    concurrency = int(os.getenv("CANARIE_API_LOAD_CONCURRENCY", "8"))
+    duration = float(os.getenv("CANARIE_API_LOAD_DURATION", "1"))
+    tolerance = float(os.getenv("CANARIE_API_LOAD_TOLERANCE", "2"))
+
+    config_path = load.make_load_config(str(tmp_path), services=services)
+    assert ConfigWatcher(APP, config_path).reload(), "generated configuration should be valid"
+    with load.serve_in_process(load.calibration_app) as port:
+        samples = asyncio.run(load.generate_load(port, ["/"], concurrency, duration, expected_status=200))
+    calibration = load.summarize(samples["/"], duration)
+    calibration["concurrency"] = concurrency
+    print(load.format_results("calibration", [calibration]))
+
+    results = {}
+    try:
+        with load.serve_in_process(APP) as port:
+            for name, (path, status) in ENDPOINTS.items():
+                samples = asyncio.run(load.generate_load(port, [path], concurrency, duration, expected_status=status))
+                results[name] = load.summarize(samples[path], duration)
+                results[name]["concurrency"] = concurrency
+    finally:
+        APP.config.from_object(test_config)
+        load_precompiled_responses()
+
+    for name, result in results.items():
+        print(load.format_results(name, [result]))
+    failed = {name: result["errors"] for name, result in results.items() if result["errors"]}
+    assert not failed, f"Requests did not obtain their expected status: {failed}"
+
+    if os.getenv("CANARIE_API_LOAD_UPDATE_BASELINE"):
+        load.save_baseline(BASELINE_FILENAME, results, calibration)
+        return
+    baseline = load.load_baseline(BASELINE_FILENAME, calibration)
+    regressions = load.compare_with_baseline(results, baseline, tolerance, LATENCY_SLACK)
+    assert not regressions, "Latency regressions:\n" + "\n".join(regressions)
@@ -62,3 +62,30 @@ def test_parse_log_datetime_tz(tmp_path, tmp_config):
     assert stats["test-service"]["last_access"] == "2023-09-18T17:00:00+00:00"
     assert stats["other-service"]["count"] == 3
     assert stats["other-service"]["last_access"] == "2023-09-18T18:00:00"
+
+
+def test_parse_log_tail(tmp_path, tmp_config):
+    from canarieapi.api import APP
+
+    db_path = tmp_path / "test.db"
+    APP.config.update({
+        "SERVICES": {"test-service": {"stats": {"method": "GET", "route": "/api/.*"}}},
+        "PLATFORMS": {},
+    })
+    APP.logger = DummyLogger()
+
+    line = "[2023-09-18T13:{:02d}:00+00:00] \"GET /api/test HTTP/1.1\" 200 1234\n"
+    log_file = tmp_path / "access.log"
+    log_file.write_text("".join(line.format(minute) for minute in range(50)))
+
+    try:
+        with APP.app_context():
+            conn = sqlite3.connect(db_path)
+            init_db(conn)
+        # tail ends in the middle of the 3rd line from the end, which must be skipped
+        stats = parse_log(str(log_file), database=conn, max_bytes=len(line.format(0)) * 2 + 10)
+    finally:
+        conn.close()
+
+    assert stats["test-service"]["count"] == 2
+    assert stats["test-service"]["last_access"] == "2023-09-18T13:49:00+00:00"
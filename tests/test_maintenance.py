@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Maintenance of the database: retention, incremental vacuum and statistics of the query planner.
+"""
+import sqlite3
+import time
+
+import pytest
+
+from canarieapi.database import SCHEMA_FILENAME
+from canarieapi.maintenance import AUTO_VACUUM_INCREMENTAL, maintain, prune_table, vacuum_database
+
+
+def make_database(tmp_path, legacy=False):
+    from canarieapi.api import APP
+
+    filename = str(tmp_path / "stats.db")
+    APP.config["DATABASE"] = dict(APP.config["DATABASE"], filename=filename)
+    database = sqlite3.connect(filename)
+    if legacy:
+        database.execute("create table legacy (value text)")  # auto_vacuum cannot be changed once tables exist
+    with open(SCHEMA_FILENAME, mode="r", encoding="utf-8") as schema:
+        database.executescript(schema.read())
+    now = time.time()
+    database.executemany(
+        "insert into self_test (id, status, created, result) values (?, 'succeeded', ?, ?)",
+        [[f"job-{index}", now - index * 86400, "x" * 4000] for index in range(100)],
+    )
+    database.execute("insert into monitor_worker (worker, renewed, expires) values ('gone', 0, 1)")
+    database.execute("insert into cron (job, last_execution) values ('log', '2000-01-01 00:00:00')")
+    database.execute("insert into cron (job, last_execution) values ('status', CURRENT_TIMESTAMP)")
+    database.commit()
+    return database
+
+
+def test_prune_table_chunks(tmp_config, tmp_path):
+    database = make_database(tmp_path)
+    try:
+        result = prune_table(database, "self_test", "created", 10 * 86400 - 60, chunk_size=25)
+        assert result == {"deleted": 90, "chunks": 4}
+        assert database.execute("select count(*) from self_test").fetchone()[0] == 10
+        assert not database.in_transaction, "every chunk should be committed"
+
+        result = prune_table(database, "cron", "last_execution", 86400, time_format="datetime")
+        assert result == {"deleted": 1, "chunks": 1}
+        assert database.execute("select job from cron").fetchall() == [("status",)]
+
+        with pytest.raises(ValueError, match="Unknown table"):
+            prune_table(database, "self_test; drop table stats", "created", 0)
+        with pytest.raises(ValueError, match="Unknown column"):
+            prune_table(database, "self_test", "missing", 0)
+    finally:
+        database.close()
+
+
+@pytest.mark.parametrize("legacy", [False, True])
+def test_maintain(tmp_config, tmp_path, legacy):
+    from canarieapi.api import APP
+
+    database = make_database(tmp_path, legacy=legacy)
+    expected_mode = 0 if legacy else AUTO_VACUUM_INCREMENTAL
+    assert database.execute("pragma auto_vacuum").fetchone()[0] == expected_mode
+    APP.config["MAINTENANCE"] = dict(APP.config["MAINTENANCE"], chunk_size=30, chunk_pause=0, convert=legacy)
+
+    summary = maintain(database=database)
+    assert summary["deleted"] == {"self_test": 70, "monitor_worker": 1}
+    assert summary["chunks"] == 4
+    assert summary["vacuumed_pages"] > 0
+    assert summary["reclaimed_bytes"] > 70 * 4000 * 0.9, "space of deleted rows should be released"
+    assert summary["duration"] >= summary["prune_duration"] + summary["vacuum_duration"]
+
+    database = sqlite3.connect(tmp_path / "stats.db")
+    try:
+        assert database.execute("pragma auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL
+        assert database.execute("pragma freelist_count").fetchone()[0] == 0
+        assert database.execute("select count(*) from self_test").fetchone()[0] == 30
+        assert database.execute("select count(*) from sqlite_stat1").fetchone()[0] > 0, "statistics should be updated"
+        cron = database.execute("select job from cron_duration").fetchall()
+        assert ("maintenance",) in cron
+    finally:
+        database.close()
+
+
+def test_maintain_no_convert(tmp_config, tmp_path):
+    """
+    Ensure legacy databases are not rewritten by a full VACUUM unless allowed.
+    """
+    from canarieapi.api import APP
+
+    database = make_database(tmp_path, legacy=True)
+    APP.config["MAINTENANCE"] = dict(APP.config["MAINTENANCE"], chunk_size=30, chunk_pause=0)
+    assert APP.config["MAINTENANCE"]["convert"] is False, "conversion should be disabled by default"
+
+    summary = maintain(database=database)
+    assert summary["deleted"] == {"self_test": 70, "monitor_worker": 1}
+    assert summary["vacuumed_pages"] == 0
+    assert summary["reclaimed_bytes"] == 0
+
+    database = sqlite3.connect(tmp_path / "stats.db")
+    try:
+        assert database.execute("pragma auto_vacuum").fetchone()[0] == 0
+        assert database.execute("pragma freelist_count").fetchone()[0] > 0
+    finally:
+        database.close()
+
+
+def test_vacuum_database_pages(tmp_config, tmp_path):
+    database = make_database(tmp_path)
+    try:
+        prune_table(database, "self_test", "created", 0)
+        free_pages = database.execute("pragma freelist_count").fetchone()[0]
+        assert free_pages > 10
+        assert vacuum_database(database, pages=10) == 10
+        assert database.execute("pragma freelist_count").fetchone()[0] == free_pages - 10
+        assert vacuum_database(database, pages=None) == free_pages - 10
+        assert database.execute("pragma freelist_count").fetchone()[0] == 0
+    finally:
+        database.close()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Versioned migrations of the database schema.
+"""
+import sqlite3
+import threading
+
+import pytest
+
+from canarieapi.database import connect_db
+from canarieapi.migrations import LATEST_SCHEMA_VERSION, add_column, get_schema_version, migrate_db
+
+
+def test_migrate_existing_database(tmp_config, tmp_path):
+    """
+    Ensure a database created before migrations existed is brought to the latest schema without losing its data.
+    """
+    from canarieapi.api import APP
+
+    filename = str(tmp_path / "stats.db")
+    legacy = sqlite3.connect(filename)
+    legacy.executescript(
+        "CREATE TABLE [stats] ([route] VARCHAR(32), [invocations] INTEGER, [last_access] DATETIME);"
+        "CREATE UNIQUE INDEX [stats_id] ON [stats] ([route]);"
+        "INSERT INTO [stats] VALUES ('service', 42, '2024-01-01T00:00:00+00:00');"
+    )
+    legacy.close()
+
+    APP.config["DATABASE"] = dict(APP.config["DATABASE"], filename=filename)
+    database = connect_db()
+    try:
+        assert get_schema_version(database) == LATEST_SCHEMA_VERSION
+        assert database.execute("select * from stats").fetchall() == [("service", 42, "2024-01-01T00:00:00+00:00")]
+        indexes = [row[1] for row in database.execute("pragma index_list(stats)")]
+        assert "stats_last_access" in indexes
+        assert database.execute("select count(*) from cron").fetchone()[0] == 0, "missing tables should be created"
+        assert migrate_db(database) == [], "migrations should only be applied once"
+    finally:
+        database.close()
+
+
+def test_migrate_steps(tmp_path):
+    database = sqlite3.connect(tmp_path / "test.db")
+    database.execute("create table items (name text)")
+    database.execute("insert into items values ('first')")
+    database.commit()
+    migrations = [
+        (2, "Add the size of items", [add_column("items", "size", "INTEGER DEFAULT 0")]),
+        (1, "Index the name of items", ["create index if not exists items_name on items (name)"]),
+        (3, "Broken", ["create table other (name text)", "insert into missing values (1)"]),
+    ]
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="no such table: missing"):
+            migrate_db(database, migrations)
+        assert get_schema_version(database) == 2, "migrations before the failing one should be kept"
+        assert database.execute("select name, size from items").fetchall() == [("first", 0)]
+        tables = [row[0] for row in database.execute("select name from sqlite_master where type = 'table'")]
+        assert "other" not in tables, "changes of the failing migration should be rolled back"
+
+        migrations[2] = (3, "Fixed", ["create table other (name text)", add_column("items", "size", "INTEGER")])
+        assert migrate_db(database, migrations) == [3]
+        assert migrate_db(database, migrations) == []
+        versions = database.execute("select version, description from schema_version order by version").fetchall()
+        assert versions == [(1, "Index the name of items"), (2, "Add the size of items"), (3, "Fixed")]
+    finally:
+        database.close()
+
+
+def test_migrate_concurrent(tmp_path):
+    """
+    Ensure migrations are applied once when several processes or threads migrate the same database at once.
+    """
+    filename = str(tmp_path / "test.db")
+    database = sqlite3.connect(filename)
+    database.execute("create table runs (version integer)")
+    database.commit()
+    database.close()
+    migrations = [(version, f"Run {version}", [f"insert into runs values ({version})"]) for version in range(1, 6)]
+    errors = []
+
+    def migrate():
+        connection = sqlite3.connect(filename, timeout=10)
+        try:
+            migrate_db(connection, migrations)
+        except Exception as exc:  # pragma: no cover
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=migrate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    database = sqlite3.connect(filename)
+    try:
+        assert database.execute("select version from runs order by version").fetchall() == [(v,) for v in range(1, 6)]
+    finally:
+        database.close()
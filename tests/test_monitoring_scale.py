@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Monitoring job against a farm of local fake backends.
+
+The benchmark measures the monitoring run time, probe throughput and database write time as the number of components
+grows. It is enabled by ``CANARIE_API_LOAD_TESTS``, and its component counts and backends behaviour can be adjusted
+with ``CANARIE_API_MONITOR_COMPONENTS`` (comma-separated), ``CANARIE_API_MONITOR_LATENCY`` (seconds),
+``CANARIE_API_MONITOR_ERROR_RATE``, ``CANARIE_API_MONITOR_BLACKHOLE_RATE`` and ``CANARIE_API_MONITOR_BODY_SIZE``.
+"""
+import json
+import os
+import sqlite3
+import time
+
+import mock
+import pytest
+
+from canarieapi.status import Status
+from tests.fake_backends import FakeBackendFarm, FakeComponent, count_expected_status, make_monitored_services
+
+
+def run_monitor(services, tmp_path, scheduler=None):
+    from canarieapi.api import APP
+    from canarieapi.monitoring import monitor
+
+    database = {"filename": str(tmp_path / "stats.db"), "access_log": str(tmp_path / "access.log")}
+    config = {"SERVICES": services, "PLATFORMS": {}, "DATABASE": database}
+    if scheduler is not None:
+        config["MONITORING"] = dict(APP.config["MONITORING"], scheduler=scheduler)
+    with mock.patch.dict(APP.config, config):
+        return monitor(update_db=True)
+
+
+@pytest.mark.usefixtures("tmp_config")
+def test_monitor_fake_backends(tmp_path):
+    """
+    Ensure the status of components that respond, fail or never respond is obtained and stored.
+    """
+    with FakeBackendFarm(hosts=2) as farm:
+        services = make_monitored_services(farm, 20, components_per_service=4, error_rate=0.2, blackhole_rate=0.1,
+                                           timeout=0.2, seed=1)
+        summary = run_monitor(services, tmp_path)
+        expected = count_expected_status(farm)
+
+    assert set(expected) == {Status.ok, Status.bad, Status.down}, "seed should produce every kind of component"
+    assert summary["probes"] == 20
+    assert summary["status"] == expected
+    assert summary["write_duration"] > 0
+    database = sqlite3.connect(tmp_path / "stats.db")
+    try:
+        rows = database.execute("select status, count(*) from status group by status").fetchall()
+    finally:
+        database.close()
+    assert dict(rows) == expected
+
+
+@pytest.mark.usefixtures("tmp_config")
+def test_monitor_connection_ownership(tmp_path):
+    """
+    Ensure the database connection given to the job remains open for the caller, while the one it opens is closed.
+    """
+    from canarieapi.api import APP
+    from canarieapi.database import connect_db
+    from canarieapi.monitoring import monitor
+
+    with FakeBackendFarm() as farm:
+        services = make_monitored_services(farm, 2)
+        database_config = {"filename": str(tmp_path / "stats.db"), "access_log": str(tmp_path / "access.log")}
+        config = {"SERVICES": services, "PLATFORMS": {}, "DATABASE": database_config}
+        with mock.patch.dict(APP.config, config):
+            database = connect_db()
+            try:
+                monitor(update_db=True, database=database)
+                assert database.execute("select count(*) from status").fetchone()[0] == 2
+            finally:
+                database.close()
+
+            connections = []
+            real_connect = sqlite3.connect
+
+            def connect(*args, **kwargs):
+                connections.append(real_connect(*args, **kwargs))
+                return connections[-1]
+
+            with mock.patch("sqlite3.connect", side_effect=connect):
+                monitor(update_db=True)
+    assert connections
+    for connection in connections:
+        with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+            connection.execute("select 1")
+
+
+@pytest.mark.usefixtures("tmp_config")
+def test_monitor_latency(tmp_path):
+    """
+    Ensure the timing breakdown of probes is recorded with rolling samples, and slow components are considered bad.
+    """
+    with FakeBackendFarm() as farm:
+        services = make_monitored_services(farm, 2, components_per_service=2, latency=0.05, body_size=100)
+        services["service-0"]["monitoring"]["Component-1"]["response"] = {"max_latency": 0.01}
+        run_monitor(services, tmp_path)
+        summary = run_monitor(services, tmp_path)
+    assert summary["status"] == {Status.ok: 1, Status.bad: 1}
+
+    database = sqlite3.connect(tmp_path / "stats.db")
+    try:
+        rows = database.execute(
+            "select service, total, connect, tls, ttfb, bytes, samples from status_latency order by service"
+        ).fetchall()
+        message = database.execute("select message from status where service = 'Component-1'").fetchone()[0]
+    finally:
+        database.close()
+    assert "Slow response" in message
+    assert len(rows) == 2
+    for _, total, connect, tls, ttfb, size, samples in rows:
+        assert 0 < connect <= ttfb <= total
+        assert ttfb >= 0.05
+        assert tls == 0
+        assert size == 100
+        assert len(json.loads(samples)) == 2
+
+
+@pytest.mark.usefixtures("tmp_config")
+def test_monitor_deduplicated_probes(tmp_path):
+    """
+    Ensure components monitored with equivalent requests are probed once and all obtain its result.
+    """
+    with FakeBackendFarm() as farm:
+        services = make_monitored_services(farm, 4, components_per_service=2)
+        url = services["service-0"]["monitoring"]["Component-0"]["request"]["url"]
+        scheme, address = url.split("://", 1)
+        host, path = address.split("/", 1)
+        services["service-0"]["monitoring"]["Component-1"]["request"] = {
+            "url": f"{scheme.upper()}://{host}/{path}", "method": "GET", "timeout": 1.0,
+        }
+        services["service-1"]["monitoring"]["Component-2"] = {
+            "request": {"url": url, "timeout": 1.0, "headers": {}}, "response": {"status_code": 200},
+        }
+        services["service-1"]["monitoring"]["Component-3"] = {  # different expected response, probed separately
+            "request": {"url": url, "timeout": 1.0}, "response": {"status_code": 404},
+        }
+        summary = run_monitor(services, tmp_path)
+        requests = farm.requests
+
+    assert summary["components"] == 4
+    assert summary["probes"] == 2
+    assert summary["deduplicated"] == 2
+    assert requests == 2
+    assert summary["status"] == {Status.ok: 3, Status.bad: 1}
+
+
+@pytest.mark.usefixtures("tmp_config")
+def test_monitor_scheduler_limits(tmp_path):
+    """
+    Ensure probes run in parallel without exceeding the limit of the host, and their queue wait is recorded.
+    """
+    with FakeBackendFarm(hosts=2) as farm:
+        services = make_monitored_services(farm, 8, components_per_service=4, latency=0.1)
+        start = time.perf_counter()
+        summary = run_monitor(services, tmp_path, scheduler={"max_workers": 8, "max_per_host": 2})
+        elapsed = time.perf_counter() - start
+    assert summary["status"] == {Status.ok: 8}
+    assert 0.2 <= elapsed < 0.8, "4 probes per host should run 2 at a time"
+    assert summary["queue_wait"] >= 0.1
+
+    database = sqlite3.connect(tmp_path / "stats.db")
+    try:
+        waits = [wait for wait, in database.execute("select wait from status_queue")]
+    finally:
+        database.close()
+    assert len(waits) == 8
+    assert sum(wait >= 0.1 for wait in waits) == 4
+
+
+@pytest.mark.usefixtures("tmp_config")
+def test_monitor_dependencies(tmp_path):
+    """
+    Ensure components depending on a component that is down are not probed, and others once their dependencies are.
+    """
+    with FakeBackendFarm() as farm:
+        services = make_monitored_services(farm, 6, components_per_service=3, timeout=5)
+        gateway = farm.add(FakeComponent(blackhole=True))
+        services["service-0"]["monitoring"]["Gateway"] = {"request": {"url": gateway, "timeout": 0.2}}
+        for name in ("Component-0", "Component-1"):
+            services["service-0"]["monitoring"][name] = {
+                "request": {"url": farm.add(FakeComponent(blackhole=True)), "timeout": 5}, "depends_on": ["Gateway"],
+            }
+        services["service-0"]["monitoring"]["Component-2"]["depends_on"] = ["Component-1"]
+        services["service-1"]["monitoring"]["Component-3"]["depends_on"] = ["service-1:Component-4",
+                                                                            "service-1:Component-5"]
+        start = time.perf_counter()
+        summary = run_monitor(services, tmp_path)
+        elapsed = time.perf_counter() - start
+
+    assert elapsed < 2, "components behind the gateway should not be probed until their timeout"
+    assert summary["probes"] == 4
+    assert summary["pruned"] == 3
+    assert summary["status"] == {Status.ok: 3, Status.down: 4}
+    database = sqlite3.connect(tmp_path / "stats.db")
+    try:
+        messages = dict(database.execute("select service, message from status where route = 'service-0'"))
+    finally:
+        database.close()
+    assert messages["Component-0"] == messages["Component-1"] == "Dependency down: service-0.Gateway"
+    assert messages["Component-2"] == "Dependency down: service-0.Component-1"
+
+
+@pytest.mark.usefixtures("tmp_config")
+def test_monitor_conditional_requests(tmp_path):
+    """
+    Ensure probes send the validators of their latest successful response, and unchanged components are not fetched.
+    """
+    with FakeBackendFarm() as farm:
+        services = make_monitored_services(farm, 2, components_per_service=2, body_size=1000)
+        component = farm.components["/component/0"]
+        component.etag = '"v1"'
+        services["service-0"]["monitoring"]["Component-0"]["response"] = {"text": "x+"}
+
+        def probe():
+            summary = run_monitor(services, tmp_path)
+            database = sqlite3.connect(tmp_path / "stats.db")
+            try:
+                size = database.execute("select bytes from status_latency where service = 'Component-0'").fetchone()
+                cached = database.execute("select count(*) from probe_cache").fetchone()
+            finally:
+                database.close()
+            return summary["not_modified"], summary["status"], size[0], cached[0]
+
+        assert probe() == (0, {Status.ok: 2}, 1000, 1), "only responses with validators should be cached"
+        assert probe() == (1, {Status.ok: 2}, 0, 1), "unchanged content should not be fetched again"
+        component.etag = '"v2"'
+        assert probe() == (0, {Status.ok: 2}, 1000, 1)
+        component.status = 500
+        assert probe() == (0, {Status.ok: 1, Status.bad: 1}, 1000, 0), "validators of failed probes should be dropped"
+        component.status = 200
+        assert probe() == (0, {Status.ok: 2}, 1000, 1)
+
+
+@pytest.mark.performance
+@pytest.mark.usefixtures("tmp_config")
+@pytest.mark.skipif(not os.getenv("CANARIE_API_LOAD_TESTS"), reason="load tests are enabled by CANARIE_API_LOAD_TESTS")
+def test_monitor_scale(tmp_path):
+    from canarieapi.api import APP
+
+    counts = [int(count) for count in os.getenv("CANARIE_API_MONITOR_COMPONENTS", "10,100,500").split(",")]
+    options = {
+        "latency": float(os.getenv("CANARIE_API_MONITOR_LATENCY", "0.005")),
+        "error_rate": float(os.getenv("CANARIE_API_MONITOR_ERROR_RATE", "0.05")),
+        "blackhole_rate": float(os.getenv("CANARIE_API_MONITOR_BLACKHOLE_RATE", "0")),
+        "body_size": int(os.getenv("CANARIE_API_MONITOR_BODY_SIZE", "1024")),
+        "timeout": 1.0,
+    }
+    level = APP.logger.level
+    APP.logger.setLevel("WARNING")  # probes logging is not measured
+    try:
+        reports = []
+        for count in counts:
+            with FakeBackendFarm(hosts=4) as farm:
+                services = make_monitored_services(farm, count, components_per_service=5, **options)
+                start = time.perf_counter()
+                summary = run_monitor(services, tmp_path)
+                elapsed = time.perf_counter() - start
+                expected = count_expected_status(farm)
+            assert summary["status"] == expected
+            reports.append(
+                f"  components={count:<5} total={elapsed:8.3f}s probes={summary['duration']:8.3f}s "
+                f"throughput={summary['probes'] / summary['duration']:8.1f} probes/s "
+                f"write={summary['write_duration'] * 1000:8.2f}ms"
+            )
+    finally:
+        APP.logger.setLevel(level)
+    print(f"[monitor] {options}\n" + "\n".join(reports))
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import copy
+import socket
+
+import jsonschema
+import pytest
+
+from canarieapi.monitoring import probe_service
+from canarieapi.status import Status
+from tests.fake_backends import TLS_CERTIFICATE, FakeBackendFarm, FakeComponent
+
+
+def get_closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.usefixtures("tmp_config")
+def test_probe_tcp():
+    with FakeBackendFarm() as farm:
+        url = farm.add(FakeComponent())
+        status, message, timing = probe_service({"url": url}, {}, kind="tcp")
+        requests = farm.requests
+    assert (status, message) == (Status.ok, "")
+    assert requests == 0, "connection probes should not send any request"
+    assert 0 < timing["connect"] == timing["total"]
+
+    status, message, timing = probe_service({"url": f"tcp://127.0.0.1:{get_closed_port()}"}, {}, kind="tcp")
+    assert status == Status.down
+    assert "Cannot reach" in message
+
+    status, message, _ = probe_service({"url": "tcp://127.0.0.1"}, {}, kind="tcp")
+    assert status == Status.down
+    assert "Cannot determine the host and port" in message
+
+
+@pytest.mark.usefixtures("tmp_config")
+def test_probe_tls():
+    with FakeBackendFarm(tls=True) as farm:
+        url = farm.add(FakeComponent())
+        status, message, timing = probe_service({"url": url, "verify": TLS_CERTIFICATE}, {}, kind="tls")
+        assert status == Status.ok
+        assert "Certificate expires on 2126" in message
+        assert timing["connect"] > 0
+        assert timing["tls"] > 0
+
+        status, message, _ = probe_service({"url": url, "verify": TLS_CERTIFICATE}, {"min_cert_days": 10**6},
+                                           kind="tls")
+        assert status == Status.bad
+        assert "expires in" in message
+
+        status, message, _ = probe_service({"url": url}, {}, kind="tls")
+        assert status == Status.bad, "self-signed certificate should not be trusted by default"
+        assert "Invalid certificate" in message
+
+        status, message, _ = probe_service({"url": url, "verify": False}, {}, kind="tls")
+        assert (status, message) == (Status.ok, "")
+
+
+@pytest.mark.usefixtures("tmp_config")
+def test_probe_http_head():
+    with FakeBackendFarm() as farm:
+        url = farm.add(FakeComponent(body_size=1000))
+        status, _, timing = probe_service({"url": url}, {"text": "unverified"}, kind="http-head")
+        assert status == Status.ok
+        assert timing["bytes"] == 0
+
+        status, message, _ = probe_service({"url": url}, {"text": "unverified"}, kind="http")
+        assert status == Status.bad
+        assert "Bad response content" in message
+
+
+@pytest.mark.usefixtures("tmp_config")
+def test_probe_kind_schema():
+    from canarieapi.api import APP
+    from canarieapi.schema import check_config_schema
+
+    config = dict(APP.config)
+    config["SERVICES"] = copy.deepcopy(APP.config["SERVICES"])
+    component = config["SERVICES"]["test-service-1"]["monitoring"]["Component"]
+    component["kind"] = "tls"
+    component["response"] = {"min_cert_days": 30}
+    check_config_schema(config)
+
+    component["kind"] = "ftp"
+    with pytest.raises(jsonschema.ValidationError):
+        check_config_schema(config)
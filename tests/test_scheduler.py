@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pytest
+
+from canarieapi.scheduler import ProbeScheduler, TokenBucket
+
+
+def test_token_bucket():
+    now = [0.0]
+    bucket = TokenBucket(rate=2, burst=2, clock=lambda: now[0])
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+    now[0] = 10.0
+    assert bucket.reserve() == 0, "tokens should be replenished up to the burst"
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.5)
+
+
+def test_scheduler_max_per_host():
+    lock = threading.Lock()
+    in_flight = {}
+    highest = {}
+
+    def probe(item):
+        host = item[0]
+        with lock:
+            in_flight[host] = in_flight.get(host, 0) + 1
+            highest[host] = max(highest.get(host, 0), in_flight[host])
+        time.sleep(0.02)
+        with lock:
+            in_flight[host] -= 1
+        return item
+
+    probes = [(host, (host, index)) for host in ("a", "b") for index in range(6)]
+    scheduler = ProbeScheduler(max_workers=8, max_per_host=2)
+    results = list(scheduler.run(probes, probe))
+    assert sorted(result for _, result, _, _ in results) == sorted(item for _, item in probes)
+    assert highest == {"a": 2, "b": 2}
+    assert all(duration >= 0.02 for _, _, _, duration in results)
+    assert max(waited for _, _, waited, _ in results) >= 0.04, "probes above the host limit should wait their turn"
+
+
+def test_scheduler_fair_across_hosts():
+    probes = [("busy", f"busy-{index}") for index in range(4)] + [("other", "other-0"), ("quiet", "quiet-0")]
+    scheduler = ProbeScheduler(max_workers=1)
+    order = [item for item, _, _, _ in scheduler.run(probes, lambda item: item)]
+    assert order == ["busy-0", "other-0", "quiet-0", "busy-1", "busy-2", "busy-3"]
+
+
+def test_scheduler_rate_and_budget():
+    scheduler = ProbeScheduler(max_workers=4, rate=20, burst=2)
+    start = time.perf_counter()
+    results = list(scheduler.run([(str(index), index) for index in range(6)], lambda item: item))
+    elapsed = time.perf_counter() - start
+    assert elapsed >= 0.18, "4 probes above the burst should be started at the rate of 20 per second"
+    assert sorted(waited for _, _, waited, _ in results)[-1] >= 0.18
+
+    scheduler = ProbeScheduler(max_workers=4)
+    results = list(scheduler.run([("a", 1), ("b", 2)], lambda item: item, budget=0))
+    assert [result for _, result, _, _ in results] == [None, None], "probes should be skipped beyond the budget"
+
+
+def test_scheduler_error():
+    def probe(item):
+        if item == 2:
+            raise RuntimeError("probe failed")
+        return item
+
+    scheduler = ProbeScheduler(max_workers=2)
+    with pytest.raises(RuntimeError, match="probe failed"):
+        list(scheduler.run([("a", 1), ("a", 2), ("a", 3)], probe))
+
+
+def test_scheduler_dependencies():
+    started = []
+
+    def probe(item):
+        started.append(item)
+        time.sleep(0.01)
+        return "down" if item == "gateway" else "ok"
+
+    def prune(item, parent, result):
+        return f"pruned by {parent}" if result.startswith(("down", "pruned")) else None
+
+    probes = [("a", "app"), ("b", "gateway"), ("c", "behind"), ("c", "deeper"), ("d", "other"), ("a", "database")]
+    dependencies = {0: [5], 2: [1], 3: [2]}
+    scheduler = ProbeScheduler(max_workers=4)
+    results = {item: result for item, result, _, _ in scheduler.run(probes, probe, dependencies=dependencies,
+                                                                    prune=prune)}
+    assert results == {"app": "ok", "gateway": "down", "behind": "pruned by gateway", "deeper": "pruned by behind",
+                       "other": "ok", "database": "ok"}
+    assert sorted(started) == ["app", "database", "gateway", "other"]
+    assert started.index("database") < started.index("app")
+
+
+def test_scheduler_dependencies_cycle():
+    scheduler = ProbeScheduler(max_workers=2)
+    results = list(scheduler.run([("a", 1), ("b", 2), ("c", 3)], lambda item: item, dependencies={0: [1], 1: [0]}))
+    assert sorted(result for _, result, _, _ in results) == [1, 2, 3], "probes in a cycle should still be performed"
+
+
+def test_scheduler_dependencies_queue_wait():
+    """
+    Ensure the time spent waiting for dependencies is neither reported as queue wait nor counted in the budget.
+    """
+    def probe(item):
+        time.sleep(0.1 if item == "slow" else 0)
+        return item
+
+    scheduler = ProbeScheduler(max_workers=2)
+    results = list(scheduler.run([("a", "slow"), ("b", "child")], probe, budget=0.05, dependencies={1: [0]}))
+    waited = {item: waited for item, _, waited, _ in results}
+    assert [result for _, result, _, _ in results] == ["slow", "child"]
+    assert waited["child"] < 0.05
@@ -1,8 +1,11 @@
+import copy
 
 import jsonschema
+import mock
 import pytest
 
-from canarieapi.schema import validate_config_schema
+from canarieapi.monitoring import make_monitor_summary
+from canarieapi.schema import get_config_validators, start_self_test, validate_config_schema
 
 
 def test_validate_error_wrong_schema(tmp_config):
@@ -27,6 +30,8 @@ def test_validate_schema_no_parse_logs(tmp_config):
     from canarieapi.api import APP
 
     APP.config["PARSE_LOGS"] = False
+    APP.config["SERVICES"] = copy.deepcopy(APP.config["SERVICES"])  # avoid modifying the shared test configuration
+    APP.config["PLATFORMS"] = copy.deepcopy(APP.config["PLATFORMS"])
 
     for val in APP.config["SERVICES"].values():
         val.pop("stats")
@@ -35,3 +40,94 @@ def test_validate_schema_no_parse_logs(tmp_config):
         val.pop("stats")
 
     validate_config_schema(False, run_jobs=False)
+
+
+def test_validate_schema_incremental(tmp_config):
+    """
+    Ensure validators are compiled once and only modified services or platforms entries are validated again.
+    """
+    from canarieapi.api import APP
+
+    APP.config["SERVICES"] = copy.deepcopy(APP.config["SERVICES"])  # avoid modifying the shared test configuration
+    validate_config_schema(False, run_jobs=False)
+    assert get_config_validators(True) is get_config_validators(True)
+
+    entry_validator = get_config_validators(True)[1]["SERVICES"]
+    validator_cls = type(entry_validator)
+    validate = validator_cls.validate
+    with mock.patch.object(validator_cls, "validate", autospec=True, side_effect=validate) as mock_validate:
+        def count_entry_validations():
+            return sum(1 for call in mock_validate.call_args_list if call.args[0] is entry_validator)
+
+        validate_config_schema(False, run_jobs=False)
+        assert count_entry_validations() == 0
+
+        service = list(APP.config["SERVICES"])[0]
+        APP.config["SERVICES"][service]["info"]["synopsis"] = "modified"
+        validate_config_schema(False, run_jobs=False)
+        assert count_entry_validations() == 1
+
+        APP.config["SERVICES"][service]["redirect"] = {}
+        with pytest.raises(jsonschema.ValidationError, match=rf"\[SERVICES\.{service}\]"):
+            validate_config_schema(False, run_jobs=False)
+
+
+def test_validate_schema_dependencies(tmp_config):
+    """
+    Ensure dependencies between monitored components must reference existing components without cycles.
+    """
+    from canarieapi.api import APP
+    from canarieapi.schema import check_config_schema
+
+    APP.config["SERVICES"] = copy.deepcopy(APP.config["SERVICES"])
+    monitoring = APP.config["SERVICES"]["test-service-1"]["monitoring"]
+    monitoring["Gateway"] = copy.deepcopy(monitoring["Component"])
+    monitoring["Component"]["depends_on"] = ["Gateway", "test-service-2:Component"]
+    check_config_schema()
+
+    monitoring["Component"]["depends_on"] = ["Unknown"]
+    with pytest.raises(jsonschema.ValidationError, match="unknown component"):
+        check_config_schema()
+
+    monitoring["Component"]["depends_on"] = ["Gateway"]
+    monitoring["Gateway"]["depends_on"] = ["Component"]
+    with pytest.raises(jsonschema.ValidationError, match="cycle"):
+        check_config_schema()
+
+
+def test_start_self_test_background(tmp_config):
+    """
+    Ensure the startup self-test runs in background within its time budget.
+    """
+    from canarieapi.api import APP
+
+    summary = make_monitor_summary(components=1)
+    summary["skipped"] = 1
+    with mock.patch.dict(APP.config, {"STARTUP_SELF_TEST": {"enabled": True, "budget": 0, "log_tail_bytes": 10}}):
+        with mock.patch("canarieapi.monitoring.monitor", return_value=summary) as mock_monitor:
+            with mock.patch("canarieapi.logparser.parse_log", return_value={}) as mock_parse_log:
+                thread = start_self_test()
+                assert thread is not None
+                thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert mock_monitor.call_args.kwargs == {"update_db": False, "budget": 0, "progress": None}
+    assert mock_parse_log.call_args.kwargs == {"max_bytes": 10}
+
+    with mock.patch.dict(APP.config, {"STARTUP_SELF_TEST": {"enabled": False}}):
+        assert start_self_test() is None
+
+
+def test_monitor_budget_exceeded(tmp_path, tmp_config):
+    """
+    Ensure components are not probed once the monitoring time budget is exceeded.
+    """
+    from canarieapi.api import APP
+    from canarieapi.monitoring import monitor
+
+    database = {"filename": str(tmp_path / "stats.db"), "access_log": str(tmp_path / "access.log")}
+    with mock.patch.dict(APP.config, {"DATABASE": database}):
+        with mock.patch("canarieapi.monitoring.probe_service") as mock_check:
+            summary = monitor(update_db=False, budget=0)
+    assert mock_check.call_count == 0
+    assert summary["probes"] == 0
+    assert summary["skipped"] > 0
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Sharded monitoring, with several worker processes sharing the components of the same configuration and database.
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+from canarieapi.database import SCHEMA_FILENAME
+from canarieapi.sharding import HashRing
+from tests.fake_backends import FakeBackendFarm, make_monitored_services
+
+SHARDING_CONFIG = """
+from canarieapi.default_configuration import *  # noqa
+
+DATABASE = {{"filename": {database!r}, "access_log": {access_log!r}}}
+PARSE_LOGS = False
+SERVICES = {services!r}
+PLATFORMS = {{}}
+MONITORING["sharding"] = {{"enabled": True, "lease": 60, "virtual_nodes": 64}}
+"""
+
+
+def test_hash_ring_consistency():
+    keys = [f"service-{index}/Component-{index}" for index in range(1000)]
+    ring = HashRing(["w0", "w1", "w2"])
+    owners = {key: ring.get_node(key) for key in keys}
+    counts = {worker: list(owners.values()).count(worker) for worker in ["w0", "w1", "w2"]}
+    assert all(200 < count < 500 for count in counts.values()), f"keys should be balanced: {counts}"
+    assert HashRing(["w2", "w1", "w0"]).get_node(keys[0]) == owners[keys[0]], "order of nodes should not matter"
+
+    ring = HashRing(["w0", "w2"])
+    for key, owner in owners.items():
+        if owner != "w1":
+            assert ring.get_node(key) == owner, "only keys of the removed node should be moved"
+
+
+@pytest.mark.usefixtures("tmp_config")
+def test_probe_shard_keys():
+    from canarieapi.monitoring import get_probe_shard_keys
+
+    probes = {
+        "gateway": ({}, {}, "http", [("b", "Gateway")]),
+        "app": ({}, {}, "http", [("c", "App"), ("a", "Shared")]),
+        "database": ({}, {}, "http", [("d", "Database")]),
+        "other": ({}, {}, "http", [("e", "Other")]),
+    }
+    probe_keys = {component: key for key, (_, _, _, components) in probes.items() for component in components}
+    dependencies = {("c", "App"): [("b", "Gateway")], ("d", "Database"): [("c", "App")]}
+    shard_keys = get_probe_shard_keys(probes, probe_keys, dependencies)
+    assert shard_keys == {"gateway": "a/Shared", "app": "a/Shared", "database": "a/Shared", "other": "e/Other"}
+
+
+def run_workers(config_path, workers, *args):
+    env = dict(os.environ, CANARIE_API_CONFIG_FN=config_path)
+    processes = [
+        subprocess.Popen([sys.executable, "-m", "canarieapi.monitoring", "--worker", worker, *args], env=env,
+                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        for worker in workers
+    ]
+    outputs = [process.communicate(timeout=60)[0] for process in processes]
+    assert all(process.returncode == 0 for process in processes), "\n".join(outputs)
+    return outputs
+
+
+def test_monitor_sharded_workers(tmp_path):
+    """
+    Ensure every component is probed by exactly one of the workers, including once a worker disappeared.
+    """
+    database = str(tmp_path / "stats.db")
+    db = sqlite3.connect(database)
+    with open(SCHEMA_FILENAME, mode="r", encoding="utf-8") as schema:
+        db.executescript(schema.read())
+    db.close()
+
+    with FakeBackendFarm(hosts=2) as farm:
+        services = make_monitored_services(farm, 30, components_per_service=3)
+        config_path = str(tmp_path / "config.py")
+        with open(config_path, mode="w", encoding="utf-8") as config_file:
+            config_file.write(SHARDING_CONFIG.format(
+                database=database, access_log=str(tmp_path / "access.log"), services=services,
+            ))
+
+        run_workers(config_path, ["w0", "w1", "w2"])  # workers registering concurrently can overlap once
+        requests = farm.requests
+        outputs = run_workers(config_path, ["w0", "w1", "w2"])
+        assert farm.requests - requests == 30
+        for output in outputs:
+            assert "among 3 workers" in output
+            assert " 0 of 30 probes" not in output
+
+        db = sqlite3.connect(database)
+        try:
+            db.execute("update monitor_worker set expires = ? where worker = 'w1'", [time.time() - 1])
+            db.commit()
+        finally:
+            db.close()
+        requests = farm.requests
+        outputs = run_workers(config_path, ["w0", "w2"])
+        assert farm.requests - requests == 30, "components of the expired worker should be taken over"
+        assert all("among 2 workers" in output for output in outputs)
+
+        run_workers(config_path, ["w2"], "--release")
+        requests = farm.requests
+        outputs = run_workers(config_path, ["w0"])
+        assert farm.requests - requests == 30
+        assert "among 1 workers: 30 of 30 probes" in outputs[0]
+
+    db = sqlite3.connect(database)
+    try:
+        assert db.execute("select count(*) from status where status = 'ok'").fetchone()[0] == 30
+        assert [row[0] for row in db.execute("select worker from monitor_worker")] == ["w0"]
+    finally:
+        db.close()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Status snapshot published by the cron jobs, from which the status and stats routes are served.
+"""
+import json
+import os
+import stat
+
+import mock
+import pytest
+from flask_webtest import TestApp
+
+from canarieapi.database import connect_db, init_db
+from canarieapi.snapshot import (
+    SHARED_FILE_MODE,
+    StatusSnapshot,
+    get_snapshot_filename,
+    get_status_snapshot,
+    publish_snapshot,
+    read_snapshot_generation
+)
+
+
+@pytest.fixture()
+def snapshot_db(tmp_config, tmp_path):
+    from canarieapi.api import APP
+
+    APP.config["DATABASE"] = dict(APP.config["DATABASE"], filename=str(tmp_path / "stats.db"))
+    APP.config["SNAPSHOT"] = {"enabled": True, "filename": "", "check_interval": 0}
+    db = connect_db()
+    init_db(db)
+    services = list(APP.config["SERVICES"])
+    cur = db.cursor()
+    cur.executemany("insert into status (route, service, status, message) values (?, ?, ?, ?)", [
+        [services[0], "Component", "ok", ""],
+        [services[0], "Backend", "down", "Expecting 200, Got 500"],
+        [services[1], "Component", "bad", "Expecting 200, Got 400"],
+    ])
+    cur.execute("insert into status_latency (route, service, total, connect, tls, ttfb, bytes, samples) "
+                "values (?, 'Component', 12.5, 1.0, 0.0, 10.0, 42, '[12.5, 10.0]')", [services[0]])
+    cur.execute("insert into stats (route, invocations, last_access) values (?, 3, '2024-01-02T03:04:05+00:00')",
+                [services[0]])
+    cur.execute("insert into cron (job, last_execution) values ('status', '2024-01-02 03:04:05')")
+    db.commit()
+    yield db
+    db.close()
+
+
+def test_snapshot_records(snapshot_db):
+    from canarieapi.api import APP, query_route_records
+
+    generation = publish_snapshot(snapshot_db)
+    assert generation is not None
+    assert get_snapshot_filename().startswith(APP.config["DATABASE"]["filename"].rsplit("/", 1)[0])
+    assert read_snapshot_generation(get_snapshot_filename()) == generation
+    mode = stat.S_IMODE(os.stat(get_snapshot_filename()).st_mode)
+    assert mode == SHARED_FILE_MODE, "snapshot should be readable by workers running as other users"
+
+    snapshot = StatusSnapshot(get_snapshot_filename())
+    for route in list(APP.config["SERVICES"]) + ["unknown"]:
+        assert snapshot.get_route_records(route) == query_route_records(route, database=snapshot_db)
+
+
+def test_snapshot_reloaded(snapshot_db):
+    assert get_status_snapshot() is None, "database should be queried until a snapshot is published"
+    generation = publish_snapshot(snapshot_db)
+    snapshot = get_status_snapshot()
+    assert snapshot.generation == generation
+    assert get_status_snapshot() is snapshot, "snapshot should be reused until a new one is published"
+
+    snapshot_db.execute("update status set status = 'ok', message = ''")
+    snapshot_db.commit()
+    generation = publish_snapshot(snapshot_db)
+    assert get_status_snapshot().generation == generation
+    route = list(snapshot.routes)[0]
+    records = get_status_snapshot().get_route_records(route)
+    assert all(status == "ok" for _, status, _ in records["status"])
+    assert snapshot.get_route_records(route)["status"] != records["status"], (
+        "previous snapshot should remain readable by lookups still using it"
+    )
+
+
+def test_snapshot_routes(snapshot_db):
+    """
+    Ensure responses served from the snapshot are identical to the ones obtained from the database, without querying it.
+    """
+    from canarieapi.api import APP
+
+    web = TestApp(APP)
+    paths = [f"/{service}/service/{page}" for service in APP.config["SERVICES"] for page in ("stats", "status")]
+
+    def get_responses():
+        return [
+            (resp.status_code, resp.headers.get("ETag"), resp.text)
+            for path in paths
+            for resp in [web.get(path, params={"f": "json"}, expect_errors=True), web.get(path, expect_errors=True)]
+        ]
+
+    expected = get_responses()
+    assert expected[0][0] == 503, "stats of a service with a component down should be an error"
+    assert json.loads(expected[2][2])["latency"]["Component"]["samples"] == 2
+    publish_snapshot(snapshot_db)
+    with mock.patch("canarieapi.api.query_route_records", side_effect=AssertionError("database queried")):
+        assert get_responses() == expected
+
+    APP.config["SNAPSHOT"]["enabled"] = False
+    assert get_status_snapshot() is None
+    assert get_responses() == expected
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Storage backends of the access statistics, monitoring statuses and cron jobs bookkeeping.
+"""
+import sqlite3
+import threading
+
+import mock
+import pytest
+from flask_webtest import TestApp
+
+from canarieapi.storage import RedisError, RedisPool, RedisStorage, SQLiteStorage
+from canarieapi.utility_rest import init_db
+from tests.fake_backends import FakeBackendFarm, FakeRedisServer, make_monitored_services
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def storage(request, tmp_path):
+    if request.param == "sqlite":
+        database = sqlite3.connect(tmp_path / "stats.db")
+        init_db(database)
+        yield SQLiteStorage(database)
+        database.close()
+    else:
+        with FakeRedisServer() as server:
+            pool = RedisPool(server.url, timeout=5)
+            yield RedisStorage(pool, prefix="test:")
+            pool.close()
+
+
+@pytest.mark.usefixtures("tmp_config")
+def test_storage_operations(storage):
+    assert storage.get_stats() == []
+    assert storage.get_last_access() is None
+    assert storage.get_statuses() == []
+    assert storage.get_cron() == []
+    assert storage.get_latency() == []
+    assert storage.get_timings() == []
+
+    storage.increment_stats({"b": (2, "2024-01-01T10:00:00+00:00"), "a": (1, "2024-01-01T09:00:00+00:00")})
+    storage.commit()
+    storage.increment_stats({"b": (3, "2024-01-02T10:00:00+00:00")})
+    storage.commit()
+    assert [tuple(record) for record in storage.get_stats()] == [
+        ("a", 1, "2024-01-01T09:00:00+00:00"),
+        ("b", 5, "2024-01-02T10:00:00+00:00"),
+    ]
+    assert [tuple(record) for record in storage.get_stats(["b", "c"])] == [("b", 5, "2024-01-02T10:00:00+00:00")]
+    assert storage.get_last_access() == "2024-01-02T10:00:00+00:00"
+
+    storage.update_statuses([("b", "Web", "ok", ""), ("a", "Web", "bad", "Expecting 200, Got 500"),
+                             ("b", "Api", "down", "Timeout")])
+    storage.commit()
+    storage.update_statuses([("b", "Web", "down", "Refused")])
+    storage.commit()
+    assert [tuple(record) for record in storage.get_statuses()] == [
+        ("a", "Web", "bad", "Expecting 200, Got 500"),
+        ("b", "Api", "down", "Timeout"),
+        ("b", "Web", "down", "Refused"),
+    ]
+    assert [tuple(record) for record in storage.get_statuses(["a"])] == [("a", "Web", "bad", "Expecting 200, Got 500")]
+
+    storage.update_cron("status", 1.5)
+    storage.update_cron("log")
+    storage.commit()
+    cron = storage.get_cron()
+    assert [(job, duration) for job, _, duration in cron] == [("log", None), ("status", 1.5)]
+    assert all(len(last_execution) == len("2024-01-01 00:00:00") for _, last_execution, _ in cron)
+
+    storage.update_latency([("b", "Web", 0.5, 0.1, 0.2, 0.3, 100, "[0.5]"), ("a", "Web", 1.5, 0.0, 0.0, 1.0, 0, "[]")])
+    storage.update_timings([("b", "Web", 0.5), ("a", "Web", 1.5)])
+    storage.commit()
+    storage.update_latency([("b", "Web", 0.25, 0.1, 0.0, 0.2, 10, "[0.5, 0.25]")])
+    storage.commit()
+    assert [tuple(record) for record in storage.get_latency()] == [
+        ("a", "Web", 1.5, 0.0, 0.0, 1.0, 0, "[]"),
+        ("b", "Web", 0.25, 0.1, 0.0, 0.2, 10, "[0.5, 0.25]"),
+    ]
+    assert [tuple(record) for record in storage.get_latency(["a"])] == [("a", "Web", 1.5, 0.0, 0.0, 1.0, 0, "[]")]
+    assert sorted(tuple(record) for record in storage.get_timings()) == [("a", "Web", 1.5), ("b", "Web", 0.5)]
+
+
+def test_redis_storage_pipelined():
+    with FakeRedisServer(password="secret") as server:
+        storage = RedisStorage(RedisPool(server.url), prefix="test:")
+        storage.increment_stats({f"route-{index}": (index + 1, "2024-01-01T00:00:00") for index in range(50)})
+        storage.update_statuses([(f"route-{index}", "Web", "ok", "") for index in range(50)])
+        storage.update_cron("log", 0.5)
+        assert server.commands == [], "modifications should be queued until committed"
+        storage.commit()
+        assert server.round_trips == 2, "connection setup and all modifications should each take a single round-trip"
+        assert [command[0] for command in server.commands[:3]] == ["AUTH", "SELECT", "MULTI"]
+        assert server.commands[-1] == ["EXEC"]
+
+        round_trips = server.round_trips
+        assert len(storage.get_stats()) == 50
+        assert server.round_trips == round_trips + 2, "routes should be listed, then all read at once"
+
+        version = storage.get_status_version()
+        storage.update_statuses([("route-0", "Web", "down", "Refused")])
+        storage.commit()
+        assert storage.get_status_version() != version
+
+        assert len(storage.pool.idle) == 1, "connection should be reused by following operations"
+        for _ in range(3):
+            thread = threading.Thread(target=storage.get_cron)
+            thread.start()
+            thread.join()
+        assert [command[0] for command in server.commands].count("AUTH") == 1, "threads should share connections"
+        server.password = "changed"
+        storage.pool.close()
+        with pytest.raises(RedisError, match="invalid password"):
+            storage.get_cron()
+
+    with pytest.raises(RedisError, match="Failed to communicate"):
+        storage.get_cron()
+
+
+def test_redis_storage_routes(tmp_config, tmp_path):
+    """
+    Ensure jobs store their results with the configured backend, from which routes are served.
+    """
+    from canarieapi.api import APP
+    from canarieapi.logparser import update_db
+    from canarieapi.monitoring import monitor
+
+    with FakeRedisServer() as server, FakeBackendFarm() as farm:
+        services = make_monitored_services(farm, 2)
+        name = list(services)[0]
+        APP.config.update({
+            "SERVICES": services,
+            "PLATFORMS": {},
+            "DATABASE": {"filename": str(tmp_path / "stats.db"), "access_log": str(tmp_path / "access.log")},
+            "STORAGE": {"backend": "redis", "url": server.url, "prefix": "test:", "timeout": 5},
+            "SNAPSHOT": {"enabled": False},
+        })
+        for last_access in ["2024-01-01T00:00:00+00:00", "2024-01-02T00:00:00+00:00"]:
+            update_db({name: {"count": 2, "last_access": last_access}}, duration=0.1)
+        summary = monitor(update_db=True)
+        assert summary["status"] == {"ok": 2}
+
+        web = TestApp(APP)
+        resp = web.get(f"/{name}/service/stats", params={"f": "json"})
+        assert resp.status_code == 200, "statuses from the storage should be ok"
+        assert resp.json["invocations"] == 4
+        assert resp.json["monitoring"]["lastAccess"] == "2024-01-02T00:00:00Z"
+        assert "Component-0" in resp.json["latency"], "latency should be obtained from the storage"
+        resp = web.get("/status", params={"f": "json", "stats": "true"})
+        assert [route["stats"]["invocations"] for route in resp.json["routes"]] == [4, 0]
+
+        with mock.patch.dict(APP.config, {"SNAPSHOT": {"enabled": True}}):
+            from canarieapi.snapshot import publish_snapshot
+            database = sqlite3.connect(tmp_path / "stats.db")
+            publish_snapshot(database)
+            database.close()
+            assert web.get(f"/{name}/service/stats", params={"f": "json"}).json["invocations"] == 4
+
+    # unreachable server: routes fall back to the published snapshot, or are reported unavailable without it
+    with mock.patch.dict(APP.config, {"SNAPSHOT": {"enabled": True}}):
+        database = sqlite3.connect(tmp_path / "stats.db")
+        assert publish_snapshot(database) is None, "snapshot should not be published without the storage"
+        database.close()
+        assert web.get(f"/{name}/service/stats", params={"f": "json"}).json["invocations"] == 4
+    resp = web.get(f"/{name}/service/stats", params={"f": "json"}, expect_errors=True)
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "30"
+    assert resp.json["status"] == 503
+
+    database = sqlite3.connect(tmp_path / "stats.db")
+    try:
+        for table in ["stats", "status", "status_latency", "status_timing", "cron"]:
+            assert database.execute(f"select count(*) from {table}").fetchone()[0] == 0
+    finally:
+        database.close()